@@ -1,3 +1,27 @@
 from django.contrib import admin
+from .models import Analysis, AnalysisJob, Match, TeamFormSnapshot
 
-# Register your models here.
+
+@admin.register(AnalysisJob)
+class AnalysisJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'status', 'attempts', 'worker', 'created_at', 'finished_at')
+    list_filter = ('status',)
+
+
+@admin.register(Match)
+class MatchAdmin(admin.ModelAdmin):
+    list_display = ('id', 'home_team', 'away_team', 'sport_key', 'commence_time')
+    search_fields = ('id', 'home_team', 'away_team')
+
+
+@admin.register(Analysis)
+class AnalysisAdmin(admin.ModelAdmin):
+    list_display = ('id', 'team1', 'team2', 'match', 'commence_time', 'aggregator_tier', 'created_at')
+    search_fields = ('team1', 'team2', 'match__id')
+    raw_id_fields = ('match',)
+
+
+@admin.register(TeamFormSnapshot)
+class TeamFormSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('team_name', 'team_id', 'parser_path', 'captured_at')
+    search_fields = ('team_name', 'team_id')
@@ -3,49 +3,225 @@ Main Aggregator
 
 The powerful AI agent that synthesizes all specialized analyses
 into a final comprehensive prediction.
+
+The synthesis runs on one of three tiers:
+- "thinking": Gemini Thinking, the slow and most careful model
+- "fast": Gemini Flash with the same prompt
+- "template": no LLM call; the final analysis is assembled from the
+  three analyses
+
+In "auto" mode the tier is routed per request: analyses that contradict
+each other (winner vs score, score vs expected goals) get the thinking
+model, other analyses get the fast model, and agreeing low-priority
+requests (e.g. pre-warming) get the template. Clients that want the
+thinking model regardless ask for aggregator_tier="thinking".
+The chosen tier is recorded in aggregator_route.
 """
 
 import os
-from langchain_google_genai import ChatGoogleGenerativeAI
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from api.agent.clients import get_llm
+from api.agent.compaction import research_for
+from api.agent.scheduler import UpstreamError, ainvoke_llm, invoke_llm
 from api.agent.state import GraphState
+from api.agent.teams import fold
+from api.agent.timings import record_counter, record_error
+from api.agent.tracing import set_attributes
 
 
-def aggregate_analysis(state: GraphState) -> GraphState:
+# Gemini model used for the final synthesis
+AGGREGATOR_MODEL = "gemini-2.0-flash-thinking-exp"
+
+# Gemini model of the "fast" tier
+AGGREGATOR_FAST_MODEL = "gemini-2.0-flash-exp"
+
+# Aggregator tiers from cheapest to most careful; "auto" routes per request
+AGGREGATOR_TIERS = ("template", "fast", "thinking")
+AGGREGATOR_TIER = os.getenv("AGGREGATOR_TIER", "auto")
+
+# Tier -> Gemini model (the template tier makes no call)
+TIER_MODELS = {"fast": AGGREGATOR_FAST_MODEL, "thinking": AGGREGATOR_MODEL}
+
+# Prediction lines the analyzer prompts ask for (matched on folded text)
+WINNER_RE = re.compile(r"wird gewinnen")
+DRAW_RE = re.compile(r"unentschieden")
+SCORE_RE = re.compile(r"ergebnis:?\s*([^\n]*?)(\d{1,2})\s?[-–:]\s?(\d{1,2})")
+GOALS_RE = re.compile(r"erwartete tore:?\s*([^\n]*)")
+
+
+def resolve_aggregator_tier(tier: Optional[str] = None) -> str:
     """
-    Aggregates all specialized analyses into a final prediction.
+    Returns the aggregator tier for a run: the requested one, or AGGREGATOR_TIER.
     
-    Uses Gemini 2.0 Flash Thinking (powerful model) to synthesize
-    all information and provide a well-reasoned final analysis.
+    Raises:
+        ValueError: If the tier is neither "auto" nor one of AGGREGATOR_TIERS
+    """
+    tier = (tier or AGGREGATOR_TIER).strip().lower()
+    if tier != "auto" and tier not in AGGREGATOR_TIERS:
+        raise ValueError(f"aggregator_tier must be one of: auto, {', '.join(AGGREGATOR_TIERS)}")
+    return tier
+
+
+def _predicted_winner(text: str, team1: str, team2: str) -> Optional[str]:
+    """Returns "1", "X" or "2" from the winner analysis' closing prediction, if found."""
+    # Only the closing prediction; earlier sentences may mention past draws
+    text = fold(text)[-200:]
+    matches = list(WINNER_RE.finditer(text))
+    draw = text.rfind("unentschieden") if DRAW_RE.search(text) else -1
+    if not matches:
+        return "X" if draw != -1 else None
+    end = matches[-1].start()
+    if draw > end:
+        return "X"
+    # The team named closest before the last "wird gewinnen"
+    before = text[max(0, end - 80):end]
+    positions = {"1": before.rfind(fold(team1)), "2": before.rfind(fold(team2))}
+    side, position = max(positions.items(), key=lambda item: item[1])
+    return side if position != -1 else None
+
+
+def _predicted_score(text: str, team1: str, team2: str) -> Optional[Tuple[int, int]]:
+    """Returns (team1 goals, team2 goals) from the score analysis' closing prediction, if found."""
+    matches = list(SCORE_RE.finditer(fold(text)))
+    if not matches:
+        return None
+    prefix, first, second = matches[-1].groups()
+    score = (int(first), int(second))
+    # The prompt asks for "team1 X-Y team2"; only a leading team2 flips it
+    if fold(team2) in prefix and fold(team1) not in prefix:
+        score = (score[1], score[0])
+    return score
+
+
+def _predicted_goals(text: str) -> Optional[Tuple[float, float]]:
+    """
+    Returns the (min, max) total goals of the goals analysis' closing
+    prediction, if it commits to a range ("Über/Unter 2.5" does not).
+    """
+    matches = list(GOALS_RE.finditer(fold(text)))
+    if not matches:
+        return None
+    line = matches[-1].group(1)
+    if "uber/unter" in line or "over/under" in line:
+        return None
+    over = re.search(r"(?:uber|over)\s*(\d+(?:[.,]5)?)", line)
+    if over:
+        return float(over.group(1).replace(",", ".")), float("inf")
+    under = re.search(r"(?:unter|under)\s*(\d+(?:[.,]5)?)", line)
+    if under:
+        return 0.0, float(under.group(1).replace(",", "."))
+    at_least = re.search(r"(\d+)\s*\+", line)
+    if at_least:
+        return float(at_least.group(1)), float("inf")
+    between = re.search(r"(\d+)\s*[-–]\s*(\d+)", line)
+    if between:
+        return float(between.group(1)), float(between.group(2))
+    return None
+
+
+def _outcome(score: Tuple[int, int]) -> str:
+    return "1" if score[0] > score[1] else "2" if score[0] < score[1] else "X"
+
+
+def assess_agreement(state: GraphState) -> Dict[str, Any]:
+    """
+    Compares the closing predictions of the three analyses.
+    
+    Returns:
+        Dict with the parsed predictions ("winner", "score", "goals"),
+        "conflicts" (list of contradictions, e.g. "winner/score") and
+        "complete" (True if all three predictions were found)
+    """
+    team1 = state.get("team1", "")
+    team2 = state.get("team2", "")
+    winner = _predicted_winner(state.get("winner_analysis") or "", team1, team2)
+    score = _predicted_score(state.get("score_analysis") or "", team1, team2)
+    goals = _predicted_goals(state.get("goals_analysis") or "")
+    
+    conflicts: List[str] = []
+    if winner and score and winner != _outcome(score):
+        conflicts.append("winner/score")
+    if score and goals and not goals[0] <= sum(score) <= goals[1]:
+        conflicts.append("score/goals")
+    
+    return {
+        "winner": winner,
+        "score": list(score) if score else None,
+        # [min, max] total goals; an open range has max None (JSON has no infinity)
+        "goals": [goals[0], None if goals[1] == float("inf") else goals[1]] if goals else None,
+        "conflicts": conflicts,
+        "complete": bool(winner and score and goals),
+    }
+
+
+def route_aggregator(state: GraphState) -> Dict[str, Any]:
+    """
+    Picks the aggregator tier for a run.
+    
+    A tier requested by the client (or configured with AGGREGATOR_TIER)
+    is used as is. In "auto" mode: conflicting analyses -> thinking;
+    agreeing analyses of a low-priority request -> template; everything
+    else (including high priority) -> fast.
     
-    Args:
-        state: Current graph state with all analyses completed
-        
     Returns:
-        Updated state with final_analysis populated
+        The aggregator_route entry: tier, model (None for the template),
+        reason and the agreement assessment
     """
+    requested = resolve_aggregator_tier(state.get("aggregator_tier"))
+    priority = state.get("priority") or "normal"
+    agreement = assess_agreement(state)
+    
+    if requested != "auto":
+        tier, reason = requested, "requested"
+    elif agreement["conflicts"]:
+        tier, reason = "thinking", "conflict"
+    elif agreement["complete"] and priority == "low":
+        tier, reason = "template", "agreement"
+    elif agreement["complete"]:
+        tier, reason = "fast", "agreement"
+    else:
+        tier, reason = "fast", "incomplete"
+    
+    set_attributes(tier=tier, route_reason=reason, conflicts=agreement["conflicts"])
+    record_counter("tipster_aggregator_tier_total", {"tier": tier, "reason": reason})
+    return {"tier": tier, "model": TIER_MODELS.get(tier), "reason": reason, "agreement": agreement}
+
+
+def _template_analysis(state: GraphState, agreement: Dict[str, Any]) -> str:
+    """Assembles the final analysis from the three analyses without an LLM call."""
+    team1 = state.get("team1", "")
+    team2 = state.get("team2", "")
+    
+    winner = {"1": f"{team1} wird gewinnen", "2": f"{team2} wird gewinnen",
+              "X": "Wahrscheinlich wird es ein Unentschieden"}.get(agreement["winner"])
+    score = agreement["score"]
+    confidence = "Mittel" if agreement["complete"] and not agreement["conflicts"] else "Niedrig"
+    
+    lines = [f"Zusammenfassung der Analysen für {team1} vs {team2}:", ""]
+    lines.append(f"Tore: {state.get('goals_analysis') or '-'}")
+    lines.append(f"Sieger: {state.get('winner_analysis') or '-'}")
+    lines.append(f"Ergebnis: {state.get('score_analysis') or '-'}")
+    lines.append("")
+    if winner:
+        lines.append(f"Finale Prognose für den Gewinner: {winner}")
+    if score:
+        lines.append(f"Finale Prognose für das Ergebnis: {team1} {score[0]}-{score[1]} {team2}")
+    lines.append(f"Vertrauensniveau: {confidence} (die drei Analysen {'stimmen überein' if confidence == 'Mittel' else 'sind nicht eindeutig'})")
+    return "\n".join(lines)
+
+
+def _build_aggregator_prompt(state: GraphState) -> str:
+    """Builds the final synthesis prompt from the research data and all analyses."""
     team1 = state.get("team1", "")
     team2 = state.get("team2", "")
-    research_data = state.get("research_data", "")
+    research_data = research_for(state, "aggregate")
     goals_analysis = state.get("goals_analysis", "")
     winner_analysis = state.get("winner_analysis", "")
     score_analysis = state.get("score_analysis", "")
     
-    google_api_key = os.getenv("GOOGLE_API_KEY")
-    
-    if not google_api_key:
-        state["final_analysis"] = "Error: Google API key not configured."
-        return state
-    
-    try:
-        # Initialize the powerful Gemini model
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash-thinking-exp",
-            google_api_key=google_api_key,
-            temperature=0.7  # Higher temperature for creative synthesis
-        )
-        
-        # Comprehensive prompt for final aggregation
-        prompt = f"""You are an expert football analyst tasked with providing a FINAL, COMPREHENSIVE match prediction.
+    # Comprehensive prompt for final aggregation
+    return f"""You are an expert football analyst tasked with providing a FINAL, COMPREHENSIVE match prediction.
 
 IMPORTANT: You MUST respond ENTIRELY in GERMAN language. All your analysis, predictions, and explanations must be in German.
 
@@ -89,22 +265,91 @@ Your response IN GERMAN should include:
 
 Be bold with predictions when recent data shows clear dominance. Focus on actionable insights. REMEMBER: Write EVERYTHING in GERMAN!
 """
+
+
+def _store_final_analysis(state: GraphState, response) -> None:
+    """Stores the aggregator's LLM response as the final analysis."""
+    # Ensure content is string
+    content = response.content if isinstance(response.content, str) else str(response.content)
+    state["final_analysis"] = content
+    set_attributes(analysis_chars=len(content))
+
+
+def _store_template_analysis(state: GraphState, route: Dict[str, Any]) -> None:
+    """Stores the template synthesis as the final analysis."""
+    content = _template_analysis(state, route["agreement"])
+    state["final_analysis"] = content
+    set_attributes(analysis_chars=len(content))
+
+
+def aggregate_analysis(state: GraphState) -> GraphState:
+    """
+    Aggregates all specialized analyses into a final prediction.
+    
+    Routes the synthesis to a tier (see route_aggregator): Gemini 2.0
+    Flash Thinking when the analyses conflict or the client asks for it,
+    Gemini Flash or a template otherwise.
+    
+    Args:
+        state: Current graph state with all analyses completed
+        
+    Returns:
+        Updated state with final_analysis and aggregator_route populated
+    """
+    google_api_key = os.getenv("GOOGLE_API_KEY")
+    
+    if not google_api_key:
+        state["final_analysis"] = "Error: Google API key not configured."
+        return state
+    
+    try:
+        route = route_aggregator(state)
+        state["aggregator_route"] = route
+        if route["tier"] == "template":
+            _store_template_analysis(state, route)
+            return state
         
-        print("="*80)
-        print("[MAIN AGGREGATOR] Gemini 2.0 Flash Thinking: Processing...")
-        print("="*80)
+        # Shared Gemini model of the chosen tier
+        llm = get_llm(route["model"], 0.7, google_api_key)  # Higher temperature for creative synthesis
+        prompt = _build_aggregator_prompt(state)
+        
+        response = invoke_llm(llm, route["model"], prompt)
+        _store_final_analysis(state, response)
+        
+    except (ValueError, KeyError, AttributeError, UpstreamError) as e:
+        record_error(e)
+        error_msg = f"Error in final analysis aggregation: {str(e)}"
+        state["final_analysis"] = error_msg
+        print(f"[ERROR] {error_msg}\n")
+    
+    return state
+
+
+async def aaggregate_analysis(state: GraphState) -> GraphState:
+    """
+    Async version of aggregate_analysis.
+    """
+    google_api_key = os.getenv("GOOGLE_API_KEY")
+    
+    if not google_api_key:
+        state["final_analysis"] = "Error: Google API key not configured."
+        return state
+    
+    try:
+        route = route_aggregator(state)
+        state["aggregator_route"] = route
+        if route["tier"] == "template":
+            _store_template_analysis(state, route)
+            return state
         
-        response = llm.invoke(prompt)
-        # Ensure content is string
-        content = response.content if isinstance(response.content, str) else str(response.content)
-        state["final_analysis"] = content
+        llm = get_llm(route["model"], 0.7, google_api_key)
+        prompt = _build_aggregator_prompt(state)
         
-        print("[FINAL ANALYSIS]")
-        print("="*80)
-        print(content)
-        print("="*80 + "\n")
+        response = await ainvoke_llm(llm, route["model"], prompt)
+        _store_final_analysis(state, response)
         
-    except (ValueError, KeyError, AttributeError) as e:
+    except (ValueError, KeyError, AttributeError, UpstreamError) as e:
+        record_error(e)
         error_msg = f"Error in final analysis aggregation: {str(e)}"
         state["final_analysis"] = error_msg
         print(f"[ERROR] {error_msg}\n")
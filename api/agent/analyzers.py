@@ -5,45 +5,42 @@ Three focused analyzers using Gemini Flash for:
 - Goals prediction
 - Winner prediction  
 - Score prediction
+
+Each analyzer has a sync node (used by analysis_graph.invoke) and an
+async node (used by analysis_graph.ainvoke) sharing the same prompt.
+
+The combined analyzer makes all three predictions in a single structured
+call and fills the same state keys. It is used instead of the three
+analyzers when the run's analyzer_mode is "combined" (set per request, or
+per deployment through ANALYZER_MODE), trading some depth for one Gemini
+call instead of three.
 """
 
+import json
 import os
-from langchain_google_genai import ChatGoogleGenerativeAI
+from typing import Any, Callable, Dict, Optional
+from api.agent.clients import get_llm
+from api.agent.compaction import research_for
+from api.agent.scheduler import UpstreamError, ainvoke_llm, invoke_llm
 from api.agent.state import GraphState
+from api.agent.timings import record_error
+from api.agent.tracing import set_attributes
 
 
-def analyze_goals(state: GraphState) -> GraphState:
-    """
-    Analyzes the expected number of goals in the match.
-    
-    Uses Gemini Flash (cheap, fast model) with a specialized prompt.
-    
-    Args:
-        state: Current graph state with research_data
-        
-    Returns:
-        Updated state with goals_analysis populated
-    """
-    team1 = state.get("team1", "")
-    team2 = state.get("team2", "")
-    research_data = state.get("research_data", "")
-    
-    google_api_key = os.getenv("GOOGLE_API_KEY")
-    
-    if not google_api_key:
-        state["goals_analysis"] = "Error: Google API key not configured."
-        return state
-    
-    try:
-        # Initialize Gemini Pro (higher rate limits)
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash-exp",
-            google_api_key=google_api_key,
-            temperature=0.3
-        )
-        
-        # Craft specialized prompt
-        prompt = f"""You are a football match analyst specializing in GOAL PREDICTIONS.
+# Gemini model shared by the three analyzers
+ANALYZER_MODEL = "gemini-2.0-flash-exp"
+
+# "separate": three analyzer calls in parallel; "combined": one call for all three
+ANALYZER_MODES = ("separate", "combined")
+ANALYZER_MODE = os.getenv("ANALYZER_MODE", "separate")
+
+# State key -> analyzer name of the predictions the combined analyzer fills
+COMBINED_KEYS = {"goals_analysis": "goals", "winner_analysis": "winner", "score_analysis": "score"}
+
+
+def _goals_prompt(team1: str, team2: str, research_data: str) -> str:
+    """Builds the prompt for the goals analyzer."""
+    return f"""You are a football match analyst specializing in GOAL PREDICTIONS.
 
 IMPORTANT: You must respond in GERMAN language.
 
@@ -73,59 +70,11 @@ If recent matches show high-scoring games (4+ goals), predict accordingly. Don't
 Provide your analysis in GERMAN in 2-3 concise sentences, ending with a specific prediction:
 "Erwartete Tore: Über/Unter 2.5" or "Erwartete Tore: 2-3 insgesamt" or "Erwartete Tore: 4+ insgesamt" (adapt based on recent form!)
 """
-        
-        print("="*80)
-        print("[GOALS ANALYZER] Gemini Flash: Processing...")
-        print("="*80)
-        
-        response = llm.invoke(prompt)
-        # Ensure content is string (LangChain can return str or list)
-        content = response.content if isinstance(response.content, str) else str(response.content)
-        state["goals_analysis"] = content
-        
-        print("[GOALS ANALYSIS RESULT]")
-        print("-" * 80)
-        print(content)
-        print("-" * 80 + "\n")
-        
-    except (ValueError, KeyError, AttributeError) as e:
-        error_msg = f"Error in goals analysis: {str(e)}"
-        state["goals_analysis"] = error_msg
-        print(f"[ERROR] {error_msg}\n")
-    
-    return state
 
 
-def analyze_winner(state: GraphState) -> GraphState:
-    """
-    Analyzes which team is likely to win the match.
-    
-    Uses Gemini Flash with a specialized prompt for match outcome.
-    
-    Args:
-        state: Current graph state with research_data
-        
-    Returns:
-        Updated state with winner_analysis populated
-    """
-    team1 = state.get("team1", "")
-    team2 = state.get("team2", "")
-    research_data = state.get("research_data", "")
-    
-    google_api_key = os.getenv("GOOGLE_API_KEY")
-    
-    if not google_api_key:
-        state["winner_analysis"] = "Error: Google API key not configured."
-        return state
-    
-    try:
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash-exp",
-            google_api_key=google_api_key,
-            temperature=0.3
-        )
-        
-        prompt = f"""You are a football match analyst specializing in MATCH OUTCOME predictions.
+def _winner_prompt(team1: str, team2: str, research_data: str) -> str:
+    """Builds the prompt for the winner analyzer."""
+    return f"""You are a football match analyst specializing in MATCH OUTCOME predictions.
 
 IMPORTANT: You must respond in GERMAN language.
 
@@ -146,59 +95,11 @@ Consider:
 Provide your analysis in GERMAN in 2-3 concise sentences, ending with a clear prediction:
 "{team1} wird gewinnen", "{team2} wird gewinnen", oder "Wahrscheinlich wird es ein Unentschieden"
 """
-        
-        print("="*80)
-        print("[WINNER ANALYZER] Gemini Flash: Processing...")
-        print("="*80)
-        
-        response = llm.invoke(prompt)
-        # Ensure content is string
-        content = response.content if isinstance(response.content, str) else str(response.content)
-        state["winner_analysis"] = content
-        
-        print("[WINNER ANALYSIS RESULT]")
-        print("-" * 80)
-        print(content)
-        print("-" * 80 + "\n")
-        
-    except (ValueError, KeyError, AttributeError) as e:
-        error_msg = f"Error in winner analysis: {str(e)}"
-        state["winner_analysis"] = error_msg
-        print(f"[ERROR] {error_msg}\n")
-    
-    return state
 
 
-def analyze_score(state: GraphState) -> GraphState:
-    """
-    Predicts the exact score of the match.
-    
-    Uses Gemini Flash for precise score prediction.
-    
-    Args:
-        state: Current graph state with research_data
-        
-    Returns:
-        Updated state with score_analysis populated
-    """
-    team1 = state.get("team1", "")
-    team2 = state.get("team2", "")
-    research_data = state.get("research_data", "")
-    
-    google_api_key = os.getenv("GOOGLE_API_KEY")
-    
-    if not google_api_key:
-        state["score_analysis"] = "Error: Google API key not configured."
-        return state
-    
-    try:
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash-exp",
-            google_api_key=google_api_key,
-            temperature=0.3
-        )
-        
-        prompt = f"""You are a football match analyst specializing in EXACT SCORE predictions.
+def _score_prompt(team1: str, team2: str, research_data: str) -> str:
+    """Builds the prompt for the score analyzer."""
+    return f"""You are a football match analyst specializing in EXACT SCORE predictions.
 
 IMPORTANT: You must respond in GERMAN language.
 
@@ -229,24 +130,260 @@ Provide your analysis in GERMAN in 2-3 concise sentences, ending with a specific
 "Vorhergesagtes Ergebnis: {team1} 2-1 {team2}" (use real team names)
 Adapt the score based on recent form - don't hesitate to predict 3-0, 4-1, etc. if data supports it!
 """
+
+
+def resolve_analyzer_mode(mode: Optional[str] = None) -> str:
+    """
+    Returns the analyzer mode for a run: the requested one, or ANALYZER_MODE.
+    
+    Raises:
+        ValueError: If the mode is not one of ANALYZER_MODES
+    """
+    mode = (mode or ANALYZER_MODE).strip().lower()
+    if mode not in ANALYZER_MODES:
+        raise ValueError(f"analyzer_mode must be one of: {', '.join(ANALYZER_MODES)}")
+    return mode
+
+
+def _combined_prompt(team1: str, team2: str, research_data: str) -> str:
+    """Builds the prompt for the combined analyzer (all three predictions in one call)."""
+    return f"""You are a football match analyst. Make three predictions for one match: TOTAL GOALS, WINNER and EXACT SCORE.
+
+IMPORTANT: All analysis texts must be in GERMAN language.
+
+Match: {team1} vs {team2}
+
+Research Data:
+{research_data}
+
+CRITICAL: Pay special attention to:
+- RECENT actual match results (last 3-5 games for each team) - these show CURRENT form!
+- Head-to-head historical results and goal patterns
+- Large score differences in recent matches (e.g., 6-1, 5-0) indicate current dominance
+- Defensive records - teams conceding many goals recently will likely continue
+- Home advantage, team morale and key player availability
+
+Don't predict conservatively if recent results show high-scoring dominant wins.
+The three predictions must be consistent with each other.
+
+Return ONLY valid JSON (no markdown, no explanations) in this exact format:
+{{
+  "goals_analysis": "2-3 concise sentences in GERMAN ending with e.g. \\"Erwartete Tore: Über/Unter 2.5\\" or \\"Erwartete Tore: 4+ insgesamt\\"",
+  "winner_analysis": "2-3 concise sentences in GERMAN ending with \\"{team1} wird gewinnen\\", \\"{team2} wird gewinnen\\" or \\"Wahrscheinlich wird es ein Unentschieden\\"",
+  "score_analysis": "2-3 concise sentences in GERMAN ending with \\"Vorhergesagtes Ergebnis: {team1} 2-1 {team2}\\" (use real team names, adapt the score)"
+}}
+"""
+
+
+def _run_analyzer(state: GraphState, key: str, name: str,
+                  build_prompt: Callable[[str, str, str], str]) -> Dict[str, Any]:
+    """
+    Runs one analyzer synchronously.
+    
+    Args:
+        state: Current graph state with research_data (and its compacted versions)
+        key: State key the analysis is written to (e.g. "goals_analysis")
+        name: Analyzer name used in logs, error messages and as the
+            research_context key (e.g. "goals")
+        build_prompt: Prompt builder for this analyzer
         
-        print("="*80)
-        print("[SCORE ANALYZER] Gemini Flash: Processing...")
-        print("="*80)
+    Returns:
+        Partial state update containing only key
+    """
+    google_api_key = os.getenv("GOOGLE_API_KEY")
+    
+    if not google_api_key:
+        return {key: "Error: Google API key not configured."}
+    
+    try:
+        # Shared Gemini Flash client (reused across requests)
+        llm = get_llm(ANALYZER_MODEL, 0.3, google_api_key)
+        prompt = build_prompt(state.get("team1", ""), state.get("team2", ""), research_for(state, name))
+        
+        response = invoke_llm(llm, ANALYZER_MODEL, prompt)
+        return _analysis_result(key, name, response)
+        
+    except (ValueError, KeyError, AttributeError, UpstreamError) as e:
+        return _analysis_error(key, name, e)
+
+
+async def _arun_analyzer(state: GraphState, key: str, name: str,
+                         build_prompt: Callable[[str, str, str], str]) -> Dict[str, Any]:
+    """
+    Async version of _run_analyzer.
+    """
+    google_api_key = os.getenv("GOOGLE_API_KEY")
+    
+    if not google_api_key:
+        return {key: "Error: Google API key not configured."}
+    
+    try:
+        llm = get_llm(ANALYZER_MODEL, 0.3, google_api_key)
+        prompt = build_prompt(state.get("team1", ""), state.get("team2", ""), research_for(state, name))
+        
+        response = await ainvoke_llm(llm, ANALYZER_MODEL, prompt)
+        return _analysis_result(key, name, response)
+        
+    except (ValueError, KeyError, AttributeError, UpstreamError) as e:
+        return _analysis_error(key, name, e)
+
+
+def _analysis_result(key: str, name: str, response: Any) -> Dict[str, Any]:
+    """Turns an LLM response into the analyzer's partial state update."""
+    # Ensure content is string (LangChain can return str or list)
+    content = response.content if isinstance(response.content, str) else str(response.content)
+    set_attributes(analyzer=name, analysis_chars=len(content))
+    return {key: content}
+
+
+def _analysis_error(key: str, name: str, error: Exception) -> Dict[str, Any]:
+    """Turns an analyzer failure into an error message in the state."""
+    record_error(error)
+    error_msg = f"Error in {name} analysis: {str(error)}"
+    print(f"[ERROR] {error_msg}\n")
+    return {key: error_msg}
+
+
+def analyze_goals(state: GraphState) -> Dict[str, Any]:
+    """
+    Analyzes the expected number of goals in the match.
+    
+    Uses Gemini Flash (cheap, fast model) with a specialized prompt.
+    
+    Args:
+        state: Current graph state with research_data
+        
+    Returns:
+        Partial state update with only goals_analysis, so this node
+        can run in parallel with the other analyzers
+    """
+    return _run_analyzer(state, "goals_analysis", "goals", _goals_prompt)
+
+
+async def aanalyze_goals(state: GraphState) -> Dict[str, Any]:
+    """Async version of analyze_goals."""
+    return await _arun_analyzer(state, "goals_analysis", "goals", _goals_prompt)
+
+
+def analyze_winner(state: GraphState) -> Dict[str, Any]:
+    """
+    Analyzes which team is likely to win the match.
+    
+    Uses Gemini Flash with a specialized prompt for match outcome.
+    
+    Args:
+        state: Current graph state with research_data
+        
+    Returns:
+        Partial state update with only winner_analysis, so this node
+        can run in parallel with the other analyzers
+    """
+    return _run_analyzer(state, "winner_analysis", "winner", _winner_prompt)
+
+
+async def aanalyze_winner(state: GraphState) -> Dict[str, Any]:
+    """Async version of analyze_winner."""
+    return await _arun_analyzer(state, "winner_analysis", "winner", _winner_prompt)
+
+
+def analyze_score(state: GraphState) -> Dict[str, Any]:
+    """
+    Predicts the exact score of the match.
+    
+    Uses Gemini Flash for precise score prediction.
+    
+    Args:
+        state: Current graph state with research_data
         
-        response = llm.invoke(prompt)
-        # Ensure content is string
-        content = response.content if isinstance(response.content, str) else str(response.content)
-        state["score_analysis"] = content
+    Returns:
+        Partial state update with only score_analysis, so this node
+        can run in parallel with the other analyzers
+    """
+    return _run_analyzer(state, "score_analysis", "score", _score_prompt)
+
+
+async def aanalyze_score(state: GraphState) -> Dict[str, Any]:
+    """Async version of analyze_score."""
+    return await _arun_analyzer(state, "score_analysis", "score", _score_prompt)
+
+
+def _combined_result(response: Any) -> Dict[str, Any]:
+    """
+    Parses the combined analyzer's JSON response into the three analysis keys.
+    
+    Raises:
+        ValueError: If the response is not a JSON object with all three keys
+            (json.JSONDecodeError is a ValueError)
+    """
+    content = response.content if isinstance(response.content, str) else str(response.content)
+    response_text = content.strip()
+    
+    # Sometimes LLM wraps JSON in markdown code blocks
+    if "```json" in response_text:
+        response_text = response_text.split("```json")[1].split("```")[0].strip()
+    elif "```" in response_text:
+        response_text = response_text.split("```")[1].split("```")[0].strip()
+    
+    parsed = json.loads(response_text)
+    if not isinstance(parsed, dict):
+        raise ValueError("Combined analysis is not a JSON object")
+    
+    update = {}
+    for key, name in COMBINED_KEYS.items():
+        text = parsed.get(key)
+        if not isinstance(text, str) or not text.strip():
+            raise ValueError(f"Combined analysis has no {key}")
+        update[key] = text.strip()
+    set_attributes(analyzer="combined", analysis_chars=sum(len(text) for text in update.values()))
+    return update
+
+
+def _combined_error(error: Exception) -> Dict[str, Any]:
+    """Writes a combined analyzer failure to all three analysis keys."""
+    update = _analysis_error("goals_analysis", "combined", error)
+    return {key: update["goals_analysis"] for key in COMBINED_KEYS}
+
+
+def analyze_combined(state: GraphState) -> Dict[str, Any]:
+    """
+    Makes the goals, winner and score predictions in one Gemini Flash call.
+    
+    Args:
+        state: Current graph state with research_data
         
-        print("[SCORE ANALYSIS RESULT]")
-        print("-" * 80)
-        print(content)
-        print("-" * 80 + "\n")
+    Returns:
+        Partial state update with goals_analysis, winner_analysis and
+        score_analysis, like the three separate analyzers together
+    """
+    google_api_key = os.getenv("GOOGLE_API_KEY")
+    
+    if not google_api_key:
+        return {key: "Error: Google API key not configured." for key in COMBINED_KEYS}
+    
+    try:
+        llm = get_llm(ANALYZER_MODEL, 0.3, google_api_key)
+        prompt = _combined_prompt(state.get("team1", ""), state.get("team2", ""), research_for(state, "combined"))
+        
+        response = invoke_llm(llm, ANALYZER_MODEL, prompt)
+        return _combined_result(response)
         
-    except (ValueError, KeyError, AttributeError) as e:
-        error_msg = f"Error in score analysis: {str(e)}"
-        state["score_analysis"] = error_msg
-        print(f"[ERROR] {error_msg}\n")
+    except (ValueError, KeyError, AttributeError, UpstreamError) as e:
+        return _combined_error(e)
+
+
+async def aanalyze_combined(state: GraphState) -> Dict[str, Any]:
+    """Async version of analyze_combined."""
+    google_api_key = os.getenv("GOOGLE_API_KEY")
     
-    return state
+    if not google_api_key:
+        return {key: "Error: Google API key not configured." for key in COMBINED_KEYS}
+    
+    try:
+        llm = get_llm(ANALYZER_MODEL, 0.3, google_api_key)
+        prompt = _combined_prompt(state.get("team1", ""), state.get("team2", ""), research_for(state, "combined"))
+        
+        response = await ainvoke_llm(llm, ANALYZER_MODEL, prompt)
+        return _combined_result(response)
+        
+    except (ValueError, KeyError, AttributeError, UpstreamError) as e:
+        return _combined_error(e)
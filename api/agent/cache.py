@@ -0,0 +1,328 @@
+"""
+Persistent Cache
+
+A small SQLite-backed key/value cache with per-entry TTLs and
+size-bounded LRU eviction. Entries live on disk, so they survive
+worker restarts and are shared by all worker processes on the host.
+Leases in the same database let processes agree on who computes an
+entry, so identical work is not started twice.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+# Default location of the cache database (project root, next to db.sqlite3)
+DEFAULT_CACHE_PATH = Path(__file__).resolve().parent.parent.parent / "tipster_cache.sqlite3"
+
+
+def get_cache_path() -> str:
+    """Returns the cache database path (TIPSTER_CACHE_PATH overrides the default)."""
+    return os.getenv("TIPSTER_CACHE_PATH", str(DEFAULT_CACHE_PATH))
+
+
+def make_cache_key(*parts: Any) -> str:
+    """
+    Builds a stable cache key from JSON-serializable parts.
+
+    Args:
+        *parts: Values identifying the cached item
+
+    Returns:
+        Hex digest of the canonical JSON encoding of the parts
+    """
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class PersistentCache:
+    """
+    SQLite-backed TTL cache for JSON-serializable values.
+
+    Each cache has its own namespace inside the shared database file and
+    keeps at most max_entries rows; when the limit is exceeded the least
+    recently used entries are evicted. Database errors never propagate:
+    a failing read is a miss and a failing write is skipped.
+    """
+
+    def __init__(self, namespace: str, default_ttl: float, max_entries: int, path: Optional[str] = None):
+        """
+        Args:
+            namespace: Name separating this cache's entries from other caches
+            default_ttl: Time-to-live in seconds for entries set without a TTL
+            max_entries: Maximum number of entries kept in this namespace
+            path: Database file path (defaults to get_cache_path())
+        """
+        self.namespace = namespace
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.path = path or get_cache_path()
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Returns this thread's connection, creating the schema on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )
+            """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS cache_entries_lru ON cache_entries (namespace, last_access)"
+            )
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_leases (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    owner TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )
+            """)
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    @property
+    def enabled(self) -> bool:
+        """A cache with a non-positive TTL or size is disabled."""
+        return self.default_ttl > 0 and self.max_entries > 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Returns the cached value for key, or None on a miss or expired entry.
+        """
+        if not self.enabled:
+            return None
+
+        now = time.time()
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                conn.execute(
+                    "DELETE FROM cache_entries WHERE namespace = ? AND key = ?",
+                    (self.namespace, key)
+                )
+                conn.commit()
+                return None
+            conn.execute(
+                "UPDATE cache_entries SET last_access = ? WHERE namespace = ? AND key = ?",
+                (now, self.namespace, key)
+            )
+            conn.commit()
+            return json.loads(row[0])
+        except (sqlite3.Error, ValueError) as e:
+            print(f"[WARNING] Cache read failed ({self.namespace}): {str(e)}")
+            return None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Stores value under key and evicts least recently used entries
+        beyond max_entries.
+
+        Args:
+            key: Cache key (see make_cache_key)
+            value: JSON-serializable value
+            ttl: Time-to-live in seconds (defaults to default_ttl)
+        """
+        if not self.enabled:
+            return
+
+        ttl = self.default_ttl if ttl is None else ttl
+        now = time.time()
+        try:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (self.namespace, key, json.dumps(value, ensure_ascii=False), now + ttl, now)
+            )
+            conn.execute(
+                """
+                DELETE FROM cache_entries WHERE namespace = ? AND key IN (
+                    SELECT key FROM cache_entries WHERE namespace = ?
+                    ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.namespace, self.namespace, self.max_entries)
+            )
+            conn.commit()
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            print(f"[WARNING] Cache write failed ({self.namespace}): {str(e)}")
+
+    def delete(self, key: str) -> None:
+        """Removes key from the cache if present."""
+        try:
+            conn = self._connect()
+            conn.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key)
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"[WARNING] Cache delete failed ({self.namespace}): {str(e)}")
+
+    def acquire_lease(self, key: str, ttl: float, owner: Optional[str] = None) -> bool:
+        """
+        Tries to take the cross-process lease for computing key.
+
+        Only one thread in one process holds a lease at a time. An expired
+        lease (e.g. its holder crashed) can be taken over by anyone. If the
+        database is unavailable the lease is granted, so callers never block
+        on a broken cache.
+
+        Args:
+            key: Cache key being computed
+            ttl: Seconds after which the lease expires if not released
+            owner: Lease owner id (defaults to the current process and thread;
+                async callers pass their own since they may hop threads)
+
+        Returns:
+            True if the caller now holds the lease
+        """
+        now = time.time()
+        try:
+            conn = self._connect()
+            conn.execute(
+                "DELETE FROM cache_leases WHERE namespace = ? AND key = ? AND expires_at <= ?",
+                (self.namespace, key, now)
+            )
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO cache_leases (namespace, key, owner, expires_at) VALUES (?, ?, ?, ?)",
+                (self.namespace, key, owner or self._owner(), now + ttl)
+            )
+            conn.commit()
+            return cursor.rowcount == 1
+        except sqlite3.Error as e:
+            print(f"[WARNING] Cache lease failed ({self.namespace}): {str(e)}")
+            return True
+
+    def release_lease(self, key: str, owner: Optional[str] = None) -> None:
+        """Releases a lease taken with acquire_lease() by the same owner."""
+        try:
+            conn = self._connect()
+            conn.execute(
+                "DELETE FROM cache_leases WHERE namespace = ? AND key = ? AND owner = ?",
+                (self.namespace, key, owner or self._owner())
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"[WARNING] Cache lease release failed ({self.namespace}): {str(e)}")
+
+    @staticmethod
+    def _owner() -> str:
+        """Identifies the current process and thread as a lease owner."""
+        return f"{os.getpid()}:{threading.get_ident()}"
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key within this process.
+
+    The first caller runs the function; callers arriving while it is still
+    running wait for and share its result (or exception).
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Runs fn once per key among concurrent callers.
+
+        Args:
+            key: Identifies identical work
+            fn: Function computing the value
+
+        Returns:
+            (value, shared) where shared is True if another caller computed it
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._calls[key] = future
+
+        if not is_leader:
+            return future.result(), True
+
+        try:
+            value = fn()
+            future.set_result(value)
+            return value, False
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+
+class AsyncSingleFlight:
+    """
+    Async version of SingleFlight: coalesces concurrent coroutines for
+    the same key on one event loop.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Tuple[int, str], asyncio.Future] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Awaits fn() once per key among concurrent callers.
+
+        Args:
+            key: Identifies identical work
+            fn: Coroutine function computing the value
+
+        Returns:
+            (value, shared) where shared is True if another caller computed it
+        """
+        loop = asyncio.get_running_loop()
+        call_key = (id(loop), key)  # Futures belong to one loop
+        future = self._calls.get(call_key)
+        if future is not None:
+            # shield: a cancelled follower must not cancel the leader's work
+            return await asyncio.shield(future), True
+
+        # No lock needed: the event loop runs one coroutine step at a time
+        future = loop.create_future()
+        # Marks an exception nobody waited for as retrieved (no "never retrieved" warning)
+        future.add_done_callback(lambda done: done.cancelled() or done.exception())
+        self._calls[call_key] = future
+        try:
+            value = await fn()
+            future.set_result(value)
+            return value, False
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self._calls.pop(call_key, None)
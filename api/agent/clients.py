@@ -0,0 +1,116 @@
+"""
+Shared API Clients
+
+Process-wide registry of long-lived Gemini and Tavily clients.
+Nodes fetch their clients from here instead of building new ones on
+every invocation, so HTTP connections and client setup are reused
+across requests, nodes and threads.
+
+The client classes can be swapped with use_backends() (the offline
+benchmark uses the stubs in api.agent.stubs).
+"""
+
+import threading
+from typing import Any, Dict, Optional, Tuple
+from langchain_google_genai import ChatGoogleGenerativeAI
+from tavily import AsyncTavilyClient, TavilyClient
+
+
+_llms: Dict[Tuple[str, float, str], ChatGoogleGenerativeAI] = {}
+_tavily_clients: Dict[str, TavilyClient] = {}
+_async_tavily_clients: Dict[str, AsyncTavilyClient] = {}
+_lock = threading.Lock()
+
+# Classes the clients are built from
+_backends: Dict[str, Any] = {
+    "llm": ChatGoogleGenerativeAI,
+    "tavily": TavilyClient,
+    "async_tavily": AsyncTavilyClient,
+}
+
+
+def use_backends(llm: Optional[Any] = None, tavily: Optional[Any] = None,
+                 async_tavily: Optional[Any] = None) -> None:
+    """
+    Replaces the client classes and drops all shared clients.
+
+    Args:
+        llm: Class used instead of ChatGoogleGenerativeAI
+        tavily: Class used instead of TavilyClient
+        async_tavily: Class used instead of AsyncTavilyClient
+    """
+    with _lock:
+        for name, backend in (("llm", llm), ("tavily", tavily), ("async_tavily", async_tavily)):
+            if backend is not None:
+                _backends[name] = backend
+        _llms.clear()
+        _tavily_clients.clear()
+        _async_tavily_clients.clear()
+
+
+def get_llm(model: str, temperature: float, google_api_key: str) -> ChatGoogleGenerativeAI:
+    """
+    Returns the shared Gemini chat model for a model name and temperature.
+
+    Args:
+        model: Gemini model name (e.g. "gemini-2.0-flash-exp")
+        temperature: Sampling temperature
+        google_api_key: Google API key (a new key gets its own client)
+
+    Returns:
+        ChatGoogleGenerativeAI instance shared by all callers with the same key
+    """
+    key = (model, float(temperature), google_api_key)
+    llm = _llms.get(key)
+    if llm is None:
+        with _lock:
+            llm = _llms.get(key)
+            if llm is None:
+                llm = _backends["llm"](
+                    model=model,
+                    google_api_key=google_api_key,
+                    temperature=temperature,
+                    max_retries=0,  # Retries are left to the upstream scheduler
+                )
+                _llms[key] = llm
+    return llm
+
+
+def get_tavily_client(tavily_api_key: str) -> TavilyClient:
+    """
+    Returns the shared Tavily client for an API key.
+
+    Args:
+        tavily_api_key: Tavily API key
+
+    Returns:
+        TavilyClient instance shared by all callers
+    """
+    client = _tavily_clients.get(tavily_api_key)
+    if client is None:
+        with _lock:
+            client = _tavily_clients.get(tavily_api_key)
+            if client is None:
+                client = _backends["tavily"](api_key=tavily_api_key)
+                _tavily_clients[tavily_api_key] = client
+    return client
+
+
+def get_async_tavily_client(tavily_api_key: str) -> AsyncTavilyClient:
+    """
+    Returns the shared async Tavily client for an API key.
+
+    Args:
+        tavily_api_key: Tavily API key
+
+    Returns:
+        AsyncTavilyClient instance shared by all callers
+    """
+    client = _async_tavily_clients.get(tavily_api_key)
+    if client is None:
+        with _lock:
+            client = _async_tavily_clients.get(tavily_api_key)
+            if client is None:
+                client = _backends["async_tavily"](api_key=tavily_api_key)
+                _async_tavily_clients[tavily_api_key] = client
+    return client
@@ -0,0 +1,321 @@
+"""
+Research Compaction
+
+Shrinks the Tavily research before it is pasted into the LLM prompts.
+The raw research_data is kept for the API response; every prompt
+(parser, analyzers, aggregator) gets its own compacted version:
+
+1. Duplicate URLs and duplicate / near-duplicate passages are dropped
+2. Boilerplate (cookie banners, newsletter prompts, navigation) is removed
+3. Passages are ranked by relevance to the prompt's question
+4. The best passages are kept until the prompt's token budget is reached
+
+Token counts are estimates (about 4 characters per token); the
+before/after sizes of every prompt are stored in research_compaction.
+"""
+
+import asyncio
+import os
+import re
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+from api.agent.state import GraphState
+from api.agent.teams import fold
+from api.agent.tracing import set_attributes
+
+
+# Research token budget per prompt (0 or less: no limit, only deduplication)
+RESEARCH_TOKEN_BUDGETS = {
+    "parser": int(os.getenv("RESEARCH_TOKEN_BUDGET_PARSER", "3000")),
+    "goals": int(os.getenv("RESEARCH_TOKEN_BUDGET_GOALS", "1200")),
+    "winner": int(os.getenv("RESEARCH_TOKEN_BUDGET_WINNER", "1200")),
+    "score": int(os.getenv("RESEARCH_TOKEN_BUDGET_SCORE", "1200")),
+    "combined": int(os.getenv("RESEARCH_TOKEN_BUDGET_COMBINED", "1800")),
+    "aggregate": int(os.getenv("RESEARCH_TOKEN_BUDGET_AGGREGATE", "800")),
+}
+
+# Analyzer prompts used by each analyzer mode; the other mode's prompts are not compacted
+MODE_PROMPTS = {
+    "separate": ("goals", "winner", "score"),
+    "combined": ("combined",),
+}
+
+# Rough characters per token of English news text
+CHARS_PER_TOKEN = 4
+
+# Long source texts are split into passages of at most this many characters
+PASSAGE_CHARS = 400
+
+# Passages sharing at least this fraction of their word pairs count as duplicates
+NEAR_DUPLICATE_RATIO = 0.8
+
+# What each prompt asks, as weighted keywords (matched as substrings, so "scor"
+# covers score, scored and scorer)
+QUESTION_TERMS = {
+    "parser": {"beat": 1, "won": 1, "lost": 1, "draw": 1, "drew": 1, "result": 1, "head-to-head": 2, "h2h": 2},
+    "goals": {"goal": 3, "scor": 2, "conced": 2, "attack": 1, "defen": 1, "clean sheet": 2, "striker": 1,
+              "injur": 1},
+    "winner": {"win": 2, "won": 2, "beat": 2, "defeat": 2, "lost": 1, "draw": 1, "form": 2, "home": 1,
+               "injur": 2, "suspend": 2, "head-to-head": 2, "morale": 1, "favourite": 1, "favorite": 1},
+    "score": {"goal": 2, "scor": 2, "conced": 2, "result": 2, "head-to-head": 2, "beat": 1, "won": 1,
+              "prediction": 1},
+    "combined": {"goal": 3, "scor": 2, "conced": 2, "win": 2, "won": 2, "beat": 2, "defeat": 2, "result": 2,
+                 "form": 2, "head-to-head": 2, "injur": 2, "suspend": 1, "home": 1, "clean sheet": 1},
+    "aggregate": {"form": 2, "injur": 2, "suspend": 2, "head-to-head": 2, "prediction": 2, "win": 1,
+                  "goal": 1, "lineup": 1},
+}
+
+# Recent results are the most useful evidence for every prompt
+SCORELINE_RE = re.compile(r"(?<![\d\-/.:])\d{1,2}\s?[-–:]\s?\d{1,2}(?![\d\-/.:])")
+SCORELINE_WEIGHT = 3
+TEAM_WEIGHT = 2
+
+BOILERPLATE_RE = re.compile(
+    r"\b(?:cookies?|privacy policy|terms of (?:use|service)|all rights reserved|subscribe|newsletter|"
+    r"sign up|log ?in|download (?:the|our) app|advertisement|enable javascript|skip to (?:main )?content|"
+    r"click here|share (?:this|on)|follow us|read more|related articles)\b|©",
+    re.IGNORECASE
+)
+
+# Passages shorter than this without a digit are navigation fragments
+MIN_PASSAGE_CHARS = 40
+
+SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'])")
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Estimates the token count of text."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN if text else 0
+
+
+def _normalize_url(url: str) -> str:
+    """Drops scheme, "www.", query, fragment and trailing slash, so mirrors of a page compare equal."""
+    parts = urlsplit(url.strip().lower())
+    host = parts.netloc[4:] if parts.netloc.startswith("www.") else parts.netloc
+    return host + parts.path.rstrip("/")
+
+
+def _words(text: str) -> frozenset:
+    return frozenset(re.findall(r"\w+", fold(text)))
+
+
+def _shingles(text: str) -> frozenset:
+    """Adjacent word pairs; unlike a word set they tell "A 1-0 B" from "B 1-0 A"."""
+    tokens = re.findall(r"\w+", fold(text))
+    return frozenset(zip(tokens, tokens[1:])) if len(tokens) > 1 else frozenset(tokens)
+
+
+def _split_passages(content: str) -> List[str]:
+    """Splits a source text into lines, and long lines into sentence groups."""
+    passages = []
+    for line in content.splitlines():
+        line = line.strip()
+        if len(line) <= PASSAGE_CHARS:
+            if line:
+                passages.append(line)
+            continue
+        current = ""
+        for sentence in SENTENCE_SPLIT_RE.split(line):
+            if current and len(current) + len(sentence) + 1 > PASSAGE_CHARS:
+                passages.append(current)
+                current = sentence
+            else:
+                current = f"{current} {sentence}".strip()
+        if current:
+            passages.append(current)
+    return passages
+
+
+def _is_boilerplate(passage: str) -> bool:
+    if BOILERPLATE_RE.search(passage):
+        return True
+    return len(passage) < MIN_PASSAGE_CHARS and not any(char.isdigit() for char in passage)
+
+
+def collect_passages(sources: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Turns Tavily results into deduplicated, boilerplate-free passages.
+
+    Args:
+        sources: Tavily results (title, url, content) in search order
+
+    Returns:
+        List of {"source", "title", "url", "text", "words", "shingles"} in source order;
+        "source" numbers the distinct URLs from 1
+    """
+    passages: List[Dict[str, Any]] = []
+    seen_urls = set()
+    seen_texts = set()
+    source_index = 0
+
+    for result in sources:
+        url = result.get("url") or ""
+        normalized_url = _normalize_url(url)
+        if normalized_url and normalized_url in seen_urls:
+            continue
+        seen_urls.add(normalized_url)
+        source_index += 1
+
+        for text in _split_passages(result.get("content") or ""):
+            if _is_boilerplate(text):
+                continue
+            shingles = _shingles(text)
+            key = " ".join(re.findall(r"\w+", fold(text)))
+            if not shingles or key in seen_texts:
+                continue
+            # Near duplicates: syndicated copies of the same report with small edits
+            if any(
+                len(shingles & other["shingles"]) >= NEAR_DUPLICATE_RATIO * min(len(shingles), len(other["shingles"]))
+                for other in passages
+            ):
+                continue
+            seen_texts.add(key)
+            passages.append({
+                "source": source_index,
+                "title": result.get("title", "N/A"),
+                "url": url or "N/A",
+                "text": text,
+                "words": _words(text),
+                "shingles": shingles,
+            })
+    return passages
+
+
+def _relevance(passage: Dict[str, Any], prompt: str, team_words: List[frozenset]) -> float:
+    """Scores a passage against a prompt's question terms and the two teams."""
+    text = fold(passage["text"])
+    score = sum(weight for term, weight in QUESTION_TERMS[prompt].items() if term in text)
+    score += SCORELINE_WEIGHT * min(len(SCORELINE_RE.findall(passage["text"])), 3)
+    score += TEAM_WEIGHT * sum(1 for words in team_words if words and words <= passage["words"])
+    # Earlier searches (match-specific) break ties
+    return score - passage["source"] * 0.01
+
+
+def _format_passages(team1: str, team2: str, passages: List[Dict[str, Any]]) -> str:
+    """Formats passages like _format_research_data, grouped by source."""
+    formatted = f"=== Research Data for {team1} vs {team2} ===\n\n"
+    if not passages:
+        return formatted + "No relevant information found.\n"
+
+    current = None
+    for passage in passages:
+        if passage["source"] != current:
+            if current is not None:
+                formatted += "\n"
+            current = passage["source"]
+            formatted += f"{passage['source']}. {passage['title']}\n"
+            formatted += f"   Source: {passage['url']}\n"
+        formatted += f"   {passage['text']}\n"
+    return formatted + "\n"
+
+
+def compact_for_prompt(team1: str, team2: str, passages: List[Dict[str, Any]],
+                       prompt: str, budget: int) -> str:
+    """
+    Builds the research text for one prompt within its token budget.
+
+    Args:
+        team1: Name of the first team
+        team2: Name of the second team
+        passages: Output of collect_passages
+        prompt: Prompt name (a RESEARCH_TOKEN_BUDGETS key)
+        budget: Token budget (0 or less: keep every passage)
+
+    Returns:
+        Research text with the most relevant passages in source order
+    """
+    if budget <= 0:
+        return _format_passages(team1, team2, passages)
+
+    team_words = [_words(team1), _words(team2)]
+    scores = {id(passage): _relevance(passage, prompt, team_words) for passage in passages}
+    # Passages without a question term, scoreline or team name are not worth budget
+    ranked = sorted(
+        (passage for passage in passages if scores[id(passage)] > 0),
+        key=lambda passage: scores[id(passage)],
+        reverse=True
+    )
+
+    selected = []
+    used = estimate_tokens(_format_passages(team1, team2, []))
+    sources = set()
+    for passage in ranked:
+        cost = estimate_tokens(passage["text"]) + 1
+        if passage["source"] not in sources:
+            cost += estimate_tokens(f"{passage['source']}. {passage['title']}\n   Source: {passage['url']}\n")
+        if used + cost > budget:
+            continue
+        selected.append(passage)
+        sources.add(passage["source"])
+        used += cost
+
+    positions = {id(passage): index for index, passage in enumerate(passages)}
+    selected.sort(key=lambda passage: positions[id(passage)])
+    return _format_passages(team1, team2, selected)
+
+
+def _compact(state: GraphState) -> Dict[str, Any]:
+    """Builds the research_context and research_compaction updates."""
+    team1 = state.get("team1", "")
+    team2 = state.get("team2", "")
+    research_data = state.get("research_data") or ""
+    sources = state.get("research_sources") or []
+
+    # Errors and empty searches are passed on unchanged
+    if not sources:
+        return {"research_context": None, "research_compaction": None}
+
+    passages = collect_passages(sources)
+    tokens_before = estimate_tokens(research_data)
+    mode = state.get("analyzer_mode") or "separate"
+    unused = {prompt for other, prompts in MODE_PROMPTS.items() if other != mode for prompt in prompts}
+
+    context: Dict[str, str] = {}
+    report: Dict[str, Dict[str, int]] = {}
+    for prompt, budget in RESEARCH_TOKEN_BUDGETS.items():
+        if prompt in unused:
+            continue
+        text = compact_for_prompt(team1, team2, passages, prompt, budget)
+        context[prompt] = text
+        report[prompt] = {
+            "tokens_before": tokens_before,
+            "tokens_after": estimate_tokens(text),
+            "budget": budget,
+        }
+
+    set_attributes(
+        compaction_sources=len(sources),
+        compaction_passages=len(passages),
+        compaction_tokens_before=tokens_before,
+        compaction_tokens_after={prompt: sizes["tokens_after"] for prompt, sizes in report.items()},
+    )
+
+    return {"research_context": context, "research_compaction": report}
+
+
+def compact_research(state: GraphState) -> Dict[str, Any]:
+    """
+    Compacts research_data into one research text per prompt.
+
+    Args:
+        state: Current graph state with research_data and research_sources
+
+    Returns:
+        Partial state update with research_context (prompt name -> text)
+        and research_compaction (prompt name -> estimated token sizes)
+    """
+    return _compact(state)
+
+
+async def acompact_research(state: GraphState) -> Dict[str, Any]:
+    """Async version of compact_research (runs the CPU work in a thread)."""
+    return await asyncio.to_thread(_compact, state)
+
+
+def research_for(state: GraphState, prompt: str) -> str:
+    """
+    Returns the research text for a prompt: its compacted version if the
+    compaction stage produced one, otherwise the raw research_data.
+    """
+    context = state.get("research_context") or {}
+    return context.get(prompt) or state.get("research_data", "")
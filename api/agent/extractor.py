@@ -0,0 +1,294 @@
+"""
+Rule-Based Match Extractor
+
+Deterministic fast path for parse_structured_data. Finds plainly
+formatted scorelines ("Turkey 6-1 Bulgaria", "Turkey vs Bulgaria: 6-1")
+in the research text together with nearby dates and home/away markers,
+and builds the same structured data the LLM parser returns. The LLM is
+only needed when this finds too few matches.
+"""
+
+import os
+import re
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+from api.agent.stats import head_to_head_summary, team_summary
+from api.agent.teams import fold, same_team
+
+
+# Minimum recent matches per team for the fast path to be used
+FAST_PATH_MIN_MATCHES = int(os.getenv("FAST_PATH_MIN_MATCHES", "3"))
+
+# Recent matches kept per team / head-to-head (same as the LLM prompt)
+MAX_MATCHES = 10
+
+# "6-1", "6 – 1", "2:1"; not part of a longer number or a date like 2025-10-11
+SCORE_RE = re.compile(r"(?<![\d\-–/.:])(\d{1,2})\s?[-–:]\s?(\d{1,2})(?![\d\-–/.:])")
+
+# Separator between team names in "A vs B 2-1" layouts
+VERSUS_RE = re.compile(r"^(.*?)\s+(?:vs\.?|v\.?|-|–)\s+(.*?)[\s:,(]*$", re.IGNORECASE)
+
+# Explicit venue marker after a scoreline, from the first-named team's view:
+# "Turkey 6-1 Bulgaria (A)" means Turkey played away
+HOME_AWAY_RE = re.compile(r"^[\s,]*\((H|A|home|away)\)", re.IGNORECASE)
+
+MONTHS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+_MONTH = r"(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?"
+DATE_PATTERNS = [
+    (re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b"), ("y", "m", "d")),
+    (re.compile(r"\b(\d{1,2})[./](\d{1,2})[./](\d{4})\b"), ("d", "m", "y")),
+    (re.compile(r"\b(\d{1,2})(?:st|nd|rd|th)?\s+" + _MONTH + r",?\s+(\d{4})\b", re.IGNORECASE), ("d", "mon", "y")),
+    (re.compile(r"\b" + _MONTH + r"\s+(\d{1,2})(?:st|nd|rd|th)?,?\s+(\d{4})\b", re.IGNORECASE), ("mon", "d", "y")),
+]
+
+# Words allowed inside a team name even though they are lowercase
+NAME_CONNECTORS = {"de", "del", "la", "of", "and", "&", "y", "do", "da"}
+
+# Capitalized words that end a team name ("Spain 3-0 Bulgaria Sept 4, 2025")
+NAME_STOPWORDS = set(MONTHS) | {
+    "january", "february", "march", "april", "june", "july", "august",
+    "sept", "september", "october", "november", "december",
+    "on", "in", "at", "the", "after", "before", "with", "for",
+}
+
+# End of a sentence: stops date lookup from crossing into a neighbouring sentence
+SENTENCE_END_RE = re.compile(r"[.!?;]\s+(?=[A-Z(])")
+
+# Wording of predictions, tips and betting previews: a scoreline in such a
+# sentence (or under such a heading) has not been played
+PREDICTION_RE = re.compile(
+    r"\b(predict\w*|prognos\w*|forecast\w*|tips?|tipsters?|odds|expect\w*|bets?|betting|preview\w*|likely|could|would|will)\b",
+    re.IGNORECASE,
+)
+
+# Characters of context searched around a scoreline
+CONTEXT_CHARS = 60
+DATE_CONTEXT_CHARS = 80
+
+
+def _is_name_token(token: str) -> bool:
+    if not token or token.lower() in NAME_STOPWORDS:
+        return False
+    return token[0].isupper() or token.lower() in NAME_CONNECTORS
+
+
+def _trailing_name(text: str) -> str:
+    """Returns the capitalized words at the end of text (a team name before a score)."""
+    tokens = text.split()
+    name: List[str] = []
+    for token in reversed(tokens):
+        # Punctuation at the end of an earlier token ends the name (e.g. "... won. Turkey")
+        if name and token[-1] in ".,;:!?)" or token[0] == "(":
+            break
+        token = token.strip(".,;:!?()\"'")
+        if not _is_name_token(token) or len(name) == 4:
+            break
+        name.insert(0, token)
+    while name and name[0].lower() in NAME_CONNECTORS:
+        name.pop(0)
+    return " ".join(name)
+
+
+def _leading_name(text: str) -> str:
+    """Returns the capitalized words at the start of text (a team name after a score)."""
+    tokens = text.split()
+    name: List[str] = []
+    for token in tokens:
+        # A bracket starts a marker or a note, not a name (e.g. "Turkey (A)")
+        if token[0] == "(":
+            break
+        stripped = token.strip(".,;:!?()\"'")
+        if not _is_name_token(stripped) or len(name) == 4:
+            break
+        name.append(stripped)
+        # Punctuation after a token ends the name (e.g. "Bulgaria, ...")
+        if token[-1] in ".,;:!?)":
+            break
+    while name and name[-1].lower() in NAME_CONNECTORS:
+        name.pop()
+    return " ".join(name)
+
+
+def _parse_date(text: str, start: int, end: int) -> Optional[str]:
+    """
+    Returns the date in text closest to the span [start, end) (the
+    scoreline) as YYYY-MM-DD, or None if text has no valid date.
+    """
+    best: Optional[Tuple[int, str]] = None
+    for pattern, order in DATE_PATTERNS:
+        for found in pattern.finditer(text):
+            parts = dict(zip(order, found.groups()))
+            month = MONTHS[parts["mon"][:3].lower()] if "mon" in parts else int(parts["m"])
+            try:
+                value = date(int(parts["y"]), month, int(parts["d"])).isoformat()
+            except ValueError:
+                continue
+            distance = max(start - found.end(), found.start() - end, 0)
+            if best is None or distance < best[0]:
+                best = (distance, value)
+    return best[1] if best else None
+
+
+def _in_prediction(line: str, start: int, end: int) -> bool:
+    """Checks whether the sentence of line[start:end] has prediction wording."""
+    sentence_start = 0
+    for boundary in SENTENCE_END_RE.finditer(line, 0, start):
+        sentence_start = boundary.end()
+    sentence_end = SENTENCE_END_RE.search(line, end)
+    return PREDICTION_RE.search(line, sentence_start, sentence_end.start() if sentence_end else len(line)) is not None
+
+
+def find_scorelines(text: str) -> List[Dict[str, Any]]:
+    """
+    Finds played scorelines with both team names in text.
+
+    The first-named team is taken as the home side unless an explicit
+    "(A)" marker follows the scoreline. Scorelines in sentences with
+    prediction wording ("Prediction: Turkey 2-1 Bulgaria", tips, odds,
+    "we expect ...") or under a heading with such wording are skipped.
+
+    Returns:
+        List of {"home", "away", "home_goals", "away_goals", "date"}
+        in order of appearance
+    """
+    scorelines = []
+    heading = ""
+    for line in text.splitlines():
+        # "Our prediction:" on its own line covers the scorelines below it
+        predicted_block = heading.endswith(":") and PREDICTION_RE.search(heading) is not None
+        if line.strip():
+            heading = line.strip()
+        for found in SCORE_RE.finditer(line):
+            if predicted_block or _in_prediction(line, found.start(), found.end()):
+                continue
+            before = line[max(0, found.start() - CONTEXT_CHARS):found.start()]
+            after = line[found.end():found.end() + CONTEXT_CHARS]
+
+            home, away = _trailing_name(before), _leading_name(after)
+            if not away:
+                # "A vs B 2-1" layout: both names precede the score
+                versus = VERSUS_RE.match(before.strip())
+                if versus:
+                    home, away = _trailing_name(versus.group(1)), _trailing_name(versus.group(2))
+            if not home or not away or fold(home) == fold(away):
+                continue
+
+            first_goals, second_goals = int(found.group(1)), int(found.group(2))
+            away_end = after.find(away)
+            marker = HOME_AWAY_RE.match(after[away_end + len(away):] if away_end != -1 else after)
+            if marker and marker.group(1).lower().startswith("a"):
+                # The first-named team was the away side
+                home, away = away, home
+                first_goals, second_goals = second_goals, first_goals
+
+            # Dates are looked up in the scoreline's own sentence only
+            offset = max(0, found.start() - DATE_CONTEXT_CHARS)
+            for boundary in SENTENCE_END_RE.finditer(line, offset, found.start()):
+                offset = boundary.end()
+            next_boundary = SENTENCE_END_RE.search(line, found.end(), found.end() + DATE_CONTEXT_CHARS)
+            nearby = line[offset:next_boundary.start() if next_boundary else found.end() + DATE_CONTEXT_CHARS]
+            scorelines.append({
+                "home": home,
+                "away": away,
+                "home_goals": first_goals,
+                "away_goals": second_goals,
+                "date": _parse_date(nearby, found.start() - offset, found.end() - offset),
+            })
+    return scorelines
+
+
+def _sort_recent(matches: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Dated matches newest first, then undated ones in order of appearance."""
+    dated = sorted((m for m in matches if m.get("date")), key=lambda m: m["date"], reverse=True)
+    undated = [m for m in matches if not m.get("date")]
+    return (dated + undated)[:MAX_MATCHES]
+
+
+def _team_matches(team: str, scorelines: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Builds the recent_matches list of one team from the scorelines."""
+    matches = []
+    seen = set()
+    for line in scorelines:
+        if same_team(line["home"], team):
+            opponent, scored, conceded, home_away = line["away"], line["home_goals"], line["away_goals"], "home"
+        elif same_team(line["away"], team):
+            opponent, scored, conceded, home_away = line["home"], line["away_goals"], line["home_goals"], "away"
+        else:
+            continue
+
+        key = (fold(opponent), scored, conceded, line["date"])
+        if key in seen:
+            continue
+        seen.add(key)
+
+        matches.append({
+            "date": line["date"],
+            "opponent": opponent,
+            "score": f"{scored}-{conceded}",
+            "home_away": home_away,
+            "goals_scored": scored,
+            "goals_conceded": conceded,
+        })
+    return _sort_recent(matches)
+
+
+def _head_to_head(team1: str, team2: str, scorelines: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Builds the head-to-head recent_matches list from the scorelines."""
+    matches = []
+    seen = set()
+    for line in scorelines:
+        if same_team(line["home"], team1) and same_team(line["away"], team2):
+            home_team, away_team = team1, team2
+        elif same_team(line["home"], team2) and same_team(line["away"], team1):
+            home_team, away_team = team2, team1
+        else:
+            continue
+
+        key = (home_team, line["home_goals"], line["away_goals"], line["date"])
+        if key in seen:
+            continue
+        seen.add(key)
+
+        matches.append({
+            "date": line["date"],
+            "home_team": home_team,
+            "away_team": away_team,
+            "score": f"{line['home_goals']}-{line['away_goals']}",
+        })
+    return _sort_recent(matches)
+
+
+def extract_structured_data(team1: str, team2: str, research_data: str) -> Tuple[Dict[str, Any], Dict[str, int]]:
+    """
+    Extracts team stats and head-to-head data from research text with rules.
+
+    Args:
+        team1: Name of the first team
+        team2: Name of the second team
+        research_data: Research text from gather_data
+
+    Returns:
+        (data, coverage): data has the LLM parser's structure
+        ("team1_stats", "team2_stats", "head_to_head"); coverage counts the
+        matches found for "team1", "team2" and "head_to_head"
+    """
+    scorelines = find_scorelines(research_data or "")
+    team1_matches = _team_matches(team1, scorelines)
+    team2_matches = _team_matches(team2, scorelines)
+    h2h_matches = _head_to_head(team1, team2, scorelines)
+
+    # Results, winners and summary statistics are derived by the stats module
+    data = {
+        "team1_stats": team_summary(team1, team1_matches),
+        "team2_stats": team_summary(team2, team2_matches),
+        "head_to_head": head_to_head_summary(team1, team2, h2h_matches),
+    }
+    coverage = {
+        "team1": len(team1_matches),
+        "team2": len(team2_matches),
+        "head_to_head": len(h2h_matches),
+    }
+    return data, coverage
@@ -4,12 +4,39 @@ LangGraph Workflow Assembly
 Creates and compiles the complete workflow for football match analysis.
 """
 
+from typing import List
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, END
 from api.agent.state import GraphState
-from api.agent.tools import search_web_tavily
-from api.agent.parser import parse_structured_data
-from api.agent.analyzers import analyze_goals, analyze_winner, analyze_score
-from api.agent.aggregator import aggregate_analysis
+from api.agent.tools import search_web_tavily, asearch_web_tavily
+from api.agent.compaction import compact_research, acompact_research
+from api.agent.parser import parse_structured_data, aparse_structured_data
+from api.agent.analyzers import (
+    analyze_goals, analyze_winner, analyze_score, analyze_combined,
+    aanalyze_goals, aanalyze_winner, aanalyze_score, aanalyze_combined
+)
+from api.agent.aggregator import aggregate_analysis, aaggregate_analysis
+from api.agent.timings import timed_node
+
+
+# Independent analyzer nodes that run in parallel between parse_data and aggregate
+ANALYZER_NODES = ("analyze_goals", "analyze_winner", "analyze_score")
+
+# Single node replacing ANALYZER_NODES in "combined" analyzer mode
+COMBINED_ANALYZER_NODE = "analyze_combined"
+
+
+def _node(name, func, afunc) -> RunnableLambda:
+    """Builds a graph node from its sync and async implementations, with timing."""
+    timed, atimed = timed_node(name, func, afunc)
+    return RunnableLambda(timed, afunc=atimed)
+
+
+def _route_analyzers(state: GraphState) -> List[str]:
+    """Picks the analyzer node(s) to run after parse_data from the state's analyzer_mode."""
+    if state.get("analyzer_mode") == "combined":
+        return [COMBINED_ANALYZER_NODE]
+    return list(ANALYZER_NODES)
 
 
 def create_analysis_graph():
@@ -18,11 +45,18 @@ def create_analysis_graph():
     
     Workflow:
     1. Gather data from web (Tavily)
-    2. Parse structured data (recent matches, H2H) (Gemini Flash)
-    3. Analyze goals (Gemini Flash)
-    4. Analyze winner (Gemini Flash)
-    5. Analyze score (Gemini Flash)
-    6. Aggregate all analyses (Gemini Thinking)
+    2. Compact the research into one token-budgeted text per prompt
+    3. Parse structured data (recent matches, H2H) (Gemini Flash)
+    4. In parallel (Gemini Flash):
+       - Analyze goals
+       - Analyze winner
+       - Analyze score
+       or, in "combined" analyzer mode, all three in one call
+    5. Aggregate all analyses (Gemini Thinking) once the analyzers finish
+    
+    Every node has a sync and an async implementation: analysis_graph.invoke()
+    runs the sync ones, analysis_graph.ainvoke() the async ones. Both are
+    timed (see api.agent.timings).
     
     Returns:
         Compiled LangGraph ready to be invoked
@@ -31,20 +65,28 @@ def create_analysis_graph():
     workflow = StateGraph(GraphState)
     
     # Add all nodes
-    workflow.add_node("gather_data", search_web_tavily)
-    workflow.add_node("parse_data", parse_structured_data)  # NEW: Parse structured data
-    workflow.add_node("analyze_goals", analyze_goals)
-    workflow.add_node("analyze_winner", analyze_winner)
-    workflow.add_node("analyze_score", analyze_score)
-    workflow.add_node("aggregate", aggregate_analysis)
-    
-    # Define the flow (sequential execution)
+    workflow.add_node("gather_data", _node("gather_data", search_web_tavily, asearch_web_tavily))
+    workflow.add_node("compact_research", _node("compact_research", compact_research, acompact_research))
+    workflow.add_node("parse_data", _node("parse_data", parse_structured_data, aparse_structured_data))  # NEW: Parse structured data
+    workflow.add_node("analyze_goals", _node("analyze_goals", analyze_goals, aanalyze_goals))
+    workflow.add_node("analyze_winner", _node("analyze_winner", analyze_winner, aanalyze_winner))
+    workflow.add_node("analyze_score", _node("analyze_score", analyze_score, aanalyze_score))
+    workflow.add_node(COMBINED_ANALYZER_NODE, _node(COMBINED_ANALYZER_NODE, analyze_combined, aanalyze_combined))
+    workflow.add_node("aggregate", _node("aggregate", aggregate_analysis, aaggregate_analysis))
+    
+    # Define the flow
     workflow.set_entry_point("gather_data")
-    workflow.add_edge("gather_data", "parse_data")  # NEW: Parse after gathering
-    workflow.add_edge("parse_data", "analyze_goals")  # Continue to analysis
-    workflow.add_edge("analyze_goals", "analyze_winner")
-    workflow.add_edge("analyze_winner", "analyze_score")
-    workflow.add_edge("analyze_score", "aggregate")
+    workflow.add_edge("gather_data", "compact_research")
+    workflow.add_edge("compact_research", "parse_data")  # NEW: Parse after gathering
+    
+    # Fan out: the analyzers only read research_data, so they run in parallel
+    # (or the combined analyzer runs alone, depending on analyzer_mode)
+    workflow.add_conditional_edges("parse_data", _route_analyzers, [*ANALYZER_NODES, COMBINED_ANALYZER_NODE])
+    
+    # Fan in: the routed analyzers run in the same step, so aggregate runs
+    # once, in the step after all of them have written their results
+    for analyzer in (*ANALYZER_NODES, COMBINED_ANALYZER_NODE):
+        workflow.add_edge(analyzer, "aggregate")
     workflow.add_edge("aggregate", END)
     
     # Compile and return
@@ -0,0 +1,339 @@
+"""
+Fleet Metrics
+
+Prometheus-style counters, histograms and gauges shared by all worker
+processes on a host. Values live in the metric_values table of the
+cache database, so every process adds to the same series and a scrape
+of /metrics from any worker sees the totals of all of them:
+
+- counters and histogram buckets are incremented in place
+- gauges (in-flight work) are kept per process id; rows of processes
+  that no longer exist are dropped when the metrics are rendered
+
+Recording a metric only adds to an in-memory buffer; a background
+thread writes the buffered deltas in one transaction every
+TIPSTER_METRICS_FLUSH_INTERVAL seconds (and at exit), so the request
+path never waits for SQLite. A scrape flushes its own process first;
+the other workers' values may lag by up to one interval.
+
+Database errors never propagate; a failed flush is logged and skipped.
+"""
+
+import atexit
+import contextlib
+import json
+import math
+import os
+import sqlite3
+import threading
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from api.agent.cache import get_cache_path
+
+
+# Set TIPSTER_METRICS=0 to stop recording metrics
+METRICS_ENABLED = os.getenv("TIPSTER_METRICS", "1") != "0"
+
+# Seconds between writes of the buffered metric updates (and node timings)
+METRICS_FLUSH_INTERVAL = float(os.getenv("TIPSTER_METRICS_FLUSH_INTERVAL", "1.0"))
+
+# Latency histogram buckets in seconds (Gemini Thinking calls can take tens of seconds)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+# name -> (type, help) of every exported metric
+METRICS = {
+    "tipster_node_duration_seconds": ("histogram", "Wall time of analysis graph nodes."),
+    "tipster_upstream_duration_seconds": ("histogram", "Latency of upstream API calls (Tavily, each Gemini model)."),
+    "tipster_node_errors_total": ("counter", "Errors handled or raised in graph nodes, by exception type."),
+    "tipster_upstream_errors_total": ("counter", "Failed upstream API calls, by exception type."),
+    "tipster_cache_lookups_total": ("counter", "Cache lookups by cache and result (hit/miss)."),
+    "tipster_cache_hit_ratio": ("gauge", "Share of cache lookups that were hits."),
+    "tipster_aggregator_tier_total": ("counter", "Aggregator runs by tier (template/fast/thinking) and routing reason."),
+    "tipster_upstream_queue_depth": ("gauge", "Upstream calls waiting for a rate limit token, by upstream and lane."),
+    "tipster_upstream_queue_wait_seconds": ("histogram", "Time upstream calls waited for a rate limit token, by upstream and lane."),
+    "tipster_upstream_retries_total": ("counter", "Retried upstream calls by upstream and reason (429/5xx/connection)."),
+    "tipster_inflight_analyses": ("gauge", "Analyses currently running, by entry point."),
+    "tipster_inflight_nodes": ("gauge", "Graph nodes currently running."),
+}
+
+
+def _labels_key(labels: Dict[str, str]) -> str:
+    return json.dumps(sorted(labels.items()), ensure_ascii=False)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(pairs: List[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+METRIC_VALUES_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS metric_values (
+        name TEXT NOT NULL,
+        labels TEXT NOT NULL,
+        pid INTEGER NOT NULL,
+        value REAL NOT NULL,
+        PRIMARY KEY (name, labels, pid)
+    )
+"""
+
+
+class BufferedStore:
+    """
+    Base of the SQLite stores that buffer their writes in memory and
+    flush them from a background thread every METRICS_FLUSH_INTERVAL.
+
+    Subclasses implement _connect(), _clear() (empties the buffer) and
+    flush(), which takes the buffer under _buffer_lock and writes it
+    outside of it.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or get_cache_path()
+        self._local = threading.local()
+        self._buffer_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        # The flush thread does not survive fork(), and the child must not write the parent's buffer again
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _connect(self) -> sqlite3.Connection:
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        """Writes the buffered updates now."""
+        raise NotImplementedError
+
+    def _after_fork(self) -> None:
+        self._buffer_lock = threading.Lock()
+        self._thread = None
+        self._clear()
+
+    def _clear(self) -> None:
+        raise NotImplementedError
+
+    def _schedule(self) -> None:
+        """Starts the flush thread on first use."""
+        if self._thread is None and not self._stopped.is_set():
+            with self._buffer_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name=f"{type(self).__name__}-flush", daemon=True)
+                    self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(METRICS_FLUSH_INTERVAL):
+            self.flush()
+
+    def shutdown(self) -> None:
+        """Stops the flush thread and writes what is left (called at exit)."""
+        self._stopped.set()
+        self.flush()
+
+
+class MetricsStore(BufferedStore):
+    """Metric values shared by the processes using one cache database, written in batches."""
+
+    def __init__(self, path: Optional[str] = None):
+        # (name, labels key, pid) -> delta not written yet
+        self._pending: Dict[Tuple[str, str, int], float] = {}
+        super().__init__(path)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Returns this thread's connection, creating the schema on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(METRIC_VALUES_SCHEMA)
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def _clear(self) -> None:
+        self._pending = {}
+
+    def add(self, updates: List[Tuple[str, Dict[str, str], float]], per_process: bool = False) -> None:
+        """
+        Buffers deltas to metric series until the next flush.
+
+        Args:
+            updates: (name, labels, delta) tuples
+            per_process: Keep the values per process id (gauges)
+        """
+        if not METRICS_ENABLED or not updates:
+            return
+        pid = os.getpid() if per_process else 0
+        with self._buffer_lock:
+            for name, labels, delta in updates:
+                key = (name, _labels_key(labels), pid)
+                self._pending[key] = self._pending.get(key, 0) + delta
+        self._schedule()
+
+    def flush(self) -> None:
+        """Writes the buffered deltas in one transaction."""
+        with self._buffer_lock:
+            pending, self._pending = self._pending, {}
+        # A gauge raised and lowered within one interval needs no write
+        rows = [(name, labels, pid, delta) for (name, labels, pid), delta in pending.items() if delta]
+        if not rows:
+            return
+        try:
+            conn = self._connect()
+            with conn:  # Commits, or rolls back on error
+                conn.executemany(
+                    "INSERT INTO metric_values (name, labels, pid, value) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (name, labels, pid) DO UPDATE SET value = value + excluded.value",
+                    rows
+                )
+        except sqlite3.Error as e:
+            print(f"[WARNING] Metrics update failed: {str(e)}")
+
+    def _drop_dead_processes(self, conn: sqlite3.Connection) -> None:
+        """Deletes gauge rows of processes that have exited (e.g. crashed mid-request)."""
+        for (pid,) in conn.execute("SELECT DISTINCT pid FROM metric_values WHERE pid != 0").fetchall():
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                conn.execute("DELETE FROM metric_values WHERE pid = ?", (pid,))
+            except OSError:
+                pass  # Exists but belongs to another user
+        conn.commit()
+
+    def values(self) -> Dict[str, List[Tuple[List[Tuple[str, str]], float]]]:
+        """
+        Returns the current value of every series summed over processes,
+        after writing this process's buffered updates.
+
+        Returns:
+            Metric name (including _bucket/_sum/_count suffixes) -> list of
+            (label pairs, value)
+        """
+        self.flush()
+        try:
+            conn = self._connect()
+            self._drop_dead_processes(conn)
+            rows = conn.execute(
+                "SELECT name, labels, SUM(value) FROM metric_values GROUP BY name, labels"
+            ).fetchall()
+        except sqlite3.Error as e:
+            print(f"[WARNING] Metrics read failed: {str(e)}")
+            return {}
+
+        series: Dict[str, List[Tuple[List[Tuple[str, str]], float]]] = {}
+        for name, labels, value in rows:
+            series.setdefault(name, []).append(([tuple(pair) for pair in json.loads(labels)], value))
+        return series
+
+
+metrics_store = MetricsStore()
+atexit.register(metrics_store.shutdown)
+
+
+def histogram_updates(name: str, labels: Dict[str, str], seconds: float) -> List[Tuple[str, Dict[str, str], float]]:
+    """Returns the MetricsStore.add() updates recording one histogram observation."""
+    updates = [
+        (f"{name}_bucket", {**labels, "le": _format_value(bound)}, 1)
+        for bound in LATENCY_BUCKETS if seconds <= bound
+    ]
+    updates.append((f"{name}_bucket", {**labels, "le": "+Inf"}, 1))
+    updates.append((f"{name}_sum", labels, seconds))
+    updates.append((f"{name}_count", labels, 1))
+    return updates
+
+
+def cache_lookup_update(cache: str, hit: bool) -> Tuple[str, Dict[str, str], float]:
+    """Returns the MetricsStore.add() update counting one cache lookup."""
+    return "tipster_cache_lookups_total", {"cache": cache, "result": "hit" if hit else "miss"}, 1
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    """Counts a cache lookup made outside a graph node."""
+    metrics_store.add([cache_lookup_update(cache, hit)])
+
+
+def set_inflight(name: str, labels: Dict[str, str], delta: int) -> None:
+    """Raises (delta=1) or lowers (delta=-1) this process's in-flight gauge."""
+    metrics_store.add([(name, labels, delta)], per_process=True)
+
+
+@contextlib.contextmanager
+def track_inflight(name: str, labels: Dict[str, str]) -> Iterator[None]:
+    """Raises an in-flight gauge for the duration of the with block."""
+    set_inflight(name, labels, 1)
+    try:
+        yield
+    finally:
+        set_inflight(name, labels, -1)
+
+
+@contextlib.asynccontextmanager
+async def atrack_inflight(name: str, labels: Dict[str, str]) -> AsyncIterator[None]:
+    """Async version of track_inflight."""
+    set_inflight(name, labels, 1)
+    try:
+        yield
+    finally:
+        set_inflight(name, labels, -1)
+
+
+def _cache_hit_ratios(series) -> List[Tuple[List[Tuple[str, str]], float]]:
+    lookups: Dict[str, Dict[str, float]] = {}
+    for labels, value in series.get("tipster_cache_lookups_total", []):
+        label_map = dict(labels)
+        lookups.setdefault(label_map.get("cache", ""), {})[label_map.get("result", "")] = value
+    return [
+        ([("cache", cache)], counts.get("hit", 0) / (counts.get("hit", 0) + counts.get("miss", 0)))
+        for cache, counts in sorted(lookups.items())
+        if counts.get("hit", 0) + counts.get("miss", 0)
+    ]
+
+
+def _without_le(labels: List[Tuple[str, str]]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(pair for pair in labels if pair[0] != "le")
+
+
+def _histogram_lines(name: str, series) -> List[str]:
+    """Renders every label set of a histogram with all of its buckets, its sum and its count."""
+    buckets: Dict[Tuple, Dict[str, float]] = {}
+    for labels, value in series.get(f"{name}_bucket", []):
+        buckets.setdefault(_without_le(labels), {})[dict(labels)["le"]] = value
+    sums = {_without_le(labels): value for labels, value in series.get(f"{name}_sum", [])}
+    counts = {_without_le(labels): value for labels, value in series.get(f"{name}_count", [])}
+
+    lines = []
+    for label_set in sorted(counts):
+        bounds = [_format_value(bound) for bound in LATENCY_BUCKETS] + ["+Inf"]
+        for bound in bounds:
+            value = buckets.get(label_set, {}).get(bound, 0)
+            lines.append(f"{name}_bucket{_format_labels(list(label_set) + [('le', bound)])} {_format_value(value)}")
+        lines.append(f"{name}_sum{_format_labels(list(label_set))} {_format_value(sums.get(label_set, 0))}")
+        lines.append(f"{name}_count{_format_labels(list(label_set))} {_format_value(counts[label_set])}")
+    return lines
+
+
+def render_metrics() -> str:
+    """
+    Renders all metrics in the Prometheus text exposition format.
+    """
+    series = metrics_store.values()
+    series["tipster_cache_hit_ratio"] = _cache_hit_ratios(series)
+
+    lines = []
+    for name, (metric_type, help_text) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        if metric_type == "histogram":
+            lines.extend(_histogram_lines(name, series))
+            continue
+        for labels, value in sorted(series.get(name, [])):
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
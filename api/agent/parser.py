@@ -5,55 +5,101 @@ Extracts structured data from raw research text using LLM-based parsing.
 Converts unstructured Tavily search results into structured JSON for frontend visualization.
 """
 
+import asyncio
 import os
 import json
-from langchain_google_genai import ChatGoogleGenerativeAI
+from typing import Any, Dict, Optional, Tuple
+from api.agent.clients import get_llm
+from api.agent.compaction import research_for
+from api.agent.extractor import FAST_PATH_MIN_MATCHES, extract_structured_data
+from api.agent.scheduler import UpstreamError, ainvoke_llm, invoke_llm
 from api.agent.state import GraphState
+from api.agent.stats import recompute_head_to_head, recompute_team_stats
+from api.agent.team_form import get_team_stats, is_valid_team_stats, set_team_stats
+from api.agent.timings import record_cache, record_error
+from api.agent.tracing import set_attributes
 
 
-def parse_structured_data(state: GraphState) -> GraphState:
+# Gemini model used for extraction
+PARSER_MODEL = "gemini-2.0-flash-exp"
+
+
+def _set_stats_error(state: GraphState, message: str) -> None:
+    """Marks all three structured data sections with the same error."""
+    state["team1_stats"] = {"error": message}
+    state["team2_stats"] = {"error": message}
+    state["head_to_head"] = {"error": message}
+
+
+def _has_research_data(state: GraphState) -> bool:
     """
-    Parses research_data to extract structured information:
-    - Team1 recent matches (last 10)
-    - Team2 recent matches (last 10)
-    - Head-to-head history (last 10)
+    Checks that there is research data to parse, filling the state with errors if not.
     
-    Uses Gemini Flash to convert text to structured JSON.
+    Looks at the raw search results: research_data is formatted text and
+    holds an error message when the search failed or was not configured.
     """
-    team1 = state.get("team1", "")
-    team2 = state.get("team2", "")
-    research_data = state.get("research_data", "")
-    
-    google_api_key = os.getenv("GOOGLE_API_KEY")
+    if not state.get("research_sources"):
+        print("[WARNING] No research data available for parsing")
+        _set_stats_error(state, "Няма достатъчно информация")
+        return False
     
+    return True
+
+
+def _has_api_key(state: GraphState, google_api_key: str) -> bool:
+    """
+    Checks that the LLM parser can run, filling the state with errors if not.
+    """
     if not google_api_key:
         print("[ERROR] Google API key not configured for parsing")
-        state["team1_stats"] = {"error": "API key not configured"}
-        state["team2_stats"] = {"error": "API key not configured"}
-        state["head_to_head"] = {"error": "API key not configured"}
-        return state
+        _set_stats_error(state, "API key not configured")
+        return False
     
-    if not research_data or research_data == "No relevant information found.":
-        print("[WARNING] No research data available for parsing")
-        state["team1_stats"] = {"error": "Няма достатъчно информация"}
-        state["team2_stats"] = {"error": "Няма достатъчно информация"}
-        state["head_to_head"] = {"error": "Няма достатъчно информация"}
-        return state
+    return True
+
+
+def _apply_fast_path(state: GraphState, cached_stats) -> bool:
+    """
+    Tries the rule-based extractor before the LLM.
     
-    try:
-        print("\n" + "="*80)
-        print("[PARSER] Extracting structured data with Gemini Flash...")
-        print("="*80)
-        
-        # Initialize Gemini for parsing
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash-exp",
-            google_api_key=google_api_key,
-            temperature=0.1  # Low temperature for factual extraction
-        )
-        
-        # Parsing prompt
-        prompt = f"""You are a data extraction specialist. Extract structured football match data from the provided research text.
+    The fast path is used when every team has either cached stats or at
+    least FAST_PATH_MIN_MATCHES extracted matches, and the research text
+    has at least one head-to-head match. Without one the LLM is asked
+    (head-to-head only when both teams' stats are cached).
+    
+    Returns:
+        True if the state was filled without the LLM
+    """
+    team1 = state.get("team1", "")
+    team2 = state.get("team2", "")
+    data, coverage = extract_structured_data(team1, team2, research_for(state, "parser"))
+    
+    set_attributes(
+        rules_team1_matches=coverage["team1"], rules_team2_matches=coverage["team2"],
+        rules_h2h_matches=coverage["head_to_head"]
+    )
+    
+    teams = (("team1_stats", "team1", team1, cached_stats[0]), ("team2_stats", "team2", team2, cached_stats[1]))
+    if not coverage["head_to_head"]:
+        return False
+    if not all(cached or coverage[side] >= FAST_PATH_MIN_MATCHES for _, side, _, cached in teams):
+        return False
+    
+    for key, side, team, cached in teams:
+        if coverage[side] >= FAST_PATH_MIN_MATCHES:
+            state[key] = data[key]
+            set_team_stats(team, data[key])
+        else:
+            state[key] = cached
+    state["head_to_head"] = data["head_to_head"]
+    state["parser_path"] = "rules"
+    set_attributes(parser_path="rules")
+    return True
+
+
+def _build_parser_prompt(team1: str, team2: str, research_data: str) -> str:
+    """Builds the structured data extraction prompt."""
+    return f"""You are a data extraction specialist. Extract structured football match data from the provided research text.
 
 Match: {team1} vs {team2}
 
@@ -62,17 +108,14 @@ Research Data:
 
 Your task: Extract and format the following information as valid JSON:
 
-1. **{team1} Recent Matches** (last 10 if available):
-   - Each match should have: date, opponent, score, home_away, result (win/loss/draw), goals_scored, goals_conceded
+1. **{team1} Recent Matches** (last 10 if available, most recent first):
+   - Each match should have: date, opponent, score, home_away
    
-2. **{team2} Recent Matches** (last 10 if available):
+2. **{team2} Recent Matches** (last 10 if available, most recent first):
    - Same structure as above
 
 3. **Head-to-Head History** (last 10 matches between {team1} and {team2}):
-   - Each match: date, home_team, away_team, score, winner
-
-4. **Summary Statistics**:
-   - For each team: form (e.g., "WWLDW"), total goals scored in last matches, total goals conceded, average goals
+   - Each match: date, home_team, away_team, score
 
 CRITICAL INSTRUCTIONS:
 - Extract ONLY information that is EXPLICITLY stated in the research data
@@ -80,9 +123,10 @@ CRITICAL INSTRUCTIONS:
 - If fewer than 10 matches are found, return only what's available
 - Dates should be in YYYY-MM-DD format if possible, otherwise use the format provided
 - Scores should be in "X-Y" format (e.g., "3-1")
+- In recent matches, the score is from that team's perspective (its own goals first)
+- In head-to-head matches, the score is home team goals first
 - For home_away use "home" or "away"
-- For result use "win", "loss", or "draw"
-- Form should be a string like "WWLDW" (W=win, L=loss, D=draw) based on most recent to oldest
+- Do NOT compute results, form, totals or averages (they are calculated separately)
 
 Return ONLY valid JSON in this exact structure (no markdown, no explanations):
 
@@ -94,41 +138,21 @@ Return ONLY valid JSON in this exact structure (no markdown, no explanations):
         "date": "2025-10-11",
         "opponent": "Opponent Name",
         "score": "2-1",
-        "home_away": "home",
-        "result": "win",
-        "goals_scored": 2,
-        "goals_conceded": 1
+        "home_away": "home"
       }}
-    ],
-    "form": "WWLDW",
-    "total_goals_scored": 15,
-    "total_goals_conceded": 5,
-    "avg_goals_scored": 1.5,
-    "avg_goals_conceded": 0.5,
-    "matches_analyzed": 10
+    ]
   }},
   "team2_stats": {{
     "name": "{team2}",
-    "recent_matches": [ /* same structure */ ],
-    "form": "LLDWL",
-    "total_goals_scored": 8,
-    "total_goals_conceded": 20,
-    "avg_goals_scored": 0.8,
-    "avg_goals_conceded": 2.0,
-    "matches_analyzed": 10
+    "recent_matches": [ /* same structure */ ]
   }},
   "head_to_head": {{
-    "total_matches": 5,
-    "team1_wins": 3,
-    "draws": 1,
-    "team2_wins": 1,
     "recent_matches": [
       {{
         "date": "2025-10-11",
         "home_team": "{team1}",
         "away_team": "{team2}",
-        "score": "2-1",
-        "winner": "{team1}"
+        "score": "2-1"
       }}
     ]
   }}
@@ -140,57 +164,208 @@ If insufficient data exists for a section, use:
   "available_data": /* any partial data found */
 }}
 """
-        
-        print("[PARSER] Sending extraction request to Gemini...")
-        response = llm.invoke(prompt)
-        # Ensure content is string before calling .strip()
-        content = response.content if isinstance(response.content, str) else str(response.content)
-        response_text = content.strip()
-        
-        # Try to extract JSON from response
-        # Sometimes LLM wraps JSON in markdown code blocks
-        if "```json" in response_text:
-            response_text = response_text.split("```json")[1].split("```")[0].strip()
-        elif "```" in response_text:
-            response_text = response_text.split("```")[1].split("```")[0].strip()
-        
-        print(f"[PARSER] Raw response length: {len(response_text)} chars")
-        
-        # Parse JSON
+
+
+def _build_h2h_prompt(team1: str, team2: str, research_data: str) -> str:
+    """
+    Builds a smaller extraction prompt for head-to-head data only, used when
+    both teams' recent form is already cached.
+    """
+    return f"""You are a data extraction specialist. Extract the head-to-head history of a football fixture from the provided research text.
+
+Match: {team1} vs {team2}
+
+Research Data:
+{research_data}
+
+Your task: Extract the last 10 matches between {team1} and {team2} (if available).
+Each match: date, home_team, away_team, score
+
+CRITICAL INSTRUCTIONS:
+- Extract ONLY information that is EXPLICITLY stated in the research data
+- If a field is not available, use null
+- Dates should be in YYYY-MM-DD format if possible, otherwise use the format provided
+- Scores should be in "X-Y" format with the home team's goals first (e.g., "3-1")
+- Do NOT compute winners or win counts (they are calculated separately)
+
+Return ONLY valid JSON in this exact structure (no markdown, no explanations):
+
+{{
+  "head_to_head": {{
+    "recent_matches": [
+      {{
+        "date": "2025-10-11",
+        "home_team": "{team1}",
+        "away_team": "{team2}",
+        "score": "2-1"
+      }}
+    ]
+  }}
+}}
+
+If insufficient data exists, use:
+{{
+  "head_to_head": {{ "error": "Няма достатъчно информация" }}
+}}
+"""
+
+
+def _cached_team_stats(state: GraphState) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """Returns the cached parsed stats of both teams (None where not cached)."""
+    cached_stats = get_team_stats(state.get("team1", "")), get_team_stats(state.get("team2", ""))
+    for stats in cached_stats:
+        record_cache("team_stats", stats is not None)
+    return cached_stats
+
+
+def _build_prompt(state: GraphState, cached_stats) -> str:
+    """
+    Picks the extraction prompt: head-to-head only when both teams'
+    stats are cached, the full prompt otherwise.
+    """
+    team1 = state.get("team1", "")
+    team2 = state.get("team2", "")
+    research_data = research_for(state, "parser")
+    
+    if all(cached_stats):
+        # Team form cached for both teams: extract head-to-head only
+        set_attributes(parser_prompt="h2h")
+        return _build_h2h_prompt(team1, team2, research_data)
+    return _build_parser_prompt(team1, team2, research_data)
+
+
+def _apply_parser_response(state: GraphState, response, cached_stats) -> None:
+    """
+    Parses the LLM response as JSON and stores the structured data in the state.
+    
+    Freshly parsed team stats refresh the team form cache; cached stats
+    fill in for teams the response has no valid stats for.
+    
+    Raises:
+        json.JSONDecodeError: If the response is not valid JSON
+    """
+    team1 = state.get("team1", "")
+    team2 = state.get("team2", "")
+    
+    # Ensure content is string before calling .strip()
+    content = response.content if isinstance(response.content, str) else str(response.content)
+    response_text = content.strip()
+    
+    # Try to extract JSON from response
+    # Sometimes LLM wraps JSON in markdown code blocks
+    if "```json" in response_text:
+        response_text = response_text.split("```json")[1].split("```")[0].strip()
+    elif "```" in response_text:
+        response_text = response_text.split("```")[1].split("```")[0].strip()
+    
+    # Parse JSON
+    try:
         parsed_data = json.loads(response_text)
+    except json.JSONDecodeError:
+        print(f"[ERROR] Response was: {response_text[:500]}...")
+        raise
+    
+    # Validate and assign to state; summary statistics are computed locally
+    for key, team, cached in (("team1_stats", team1, cached_stats[0]), ("team2_stats", team2, cached_stats[1])):
+        stats = recompute_team_stats(team, parsed_data.get(key))
+        if is_valid_team_stats(stats):
+            set_team_stats(team, stats)
+        elif cached:
+            stats = cached
+        state[key] = stats if stats is not None else {"error": "Parsing failed"}
+    state["head_to_head"] = recompute_head_to_head(
+        team1, team2, parsed_data.get("head_to_head", {"error": "Parsing failed"})
+    )
+    
+    # Extraction summary on the node's span
+    set_attributes(
+        team1_matches=len(state["team1_stats"].get("recent_matches", [])),
+        team2_matches=len(state["team2_stats"].get("recent_matches", [])),
+        h2h_matches=len(state["head_to_head"].get("recent_matches", [])),
+        team1_form=state["team1_stats"].get("form"),
+        team2_form=state["team2_stats"].get("form"),
+    )
+
+
+def parse_structured_data(state: GraphState) -> GraphState:
+    """
+    Parses research_data to extract structured information:
+    - Team1 recent matches (last 10)
+    - Team2 recent matches (last 10)
+    - Head-to-head history (last 10)
+    
+    A rule-based extractor runs first; Gemini Flash is only used to
+    convert text to structured JSON when it finds too few matches. The
+    path taken ("rules" or "llm") is recorded in parser_path. Team stats
+    are shared per team through the team form cache; when both are
+    cached only the head-to-head section is extracted.
+    """
+    google_api_key = os.getenv("GOOGLE_API_KEY")
+    
+    if not _has_research_data(state):
+        return state
+    
+    cached_stats = _cached_team_stats(state)
+    if _apply_fast_path(state, cached_stats):
+        return state
+    
+    if not _has_api_key(state, google_api_key):
+        return state
+    
+    try:
+        # Shared Gemini client for parsing
+        llm = get_llm(PARSER_MODEL, 0.1, google_api_key)  # Low temperature for factual extraction
+        prompt = _build_prompt(state, cached_stats)
         
-        # Validate and assign to state
-        state["team1_stats"] = parsed_data.get("team1_stats", {"error": "Parsing failed"})
-        state["team2_stats"] = parsed_data.get("team2_stats", {"error": "Parsing failed"})
-        state["head_to_head"] = parsed_data.get("head_to_head", {"error": "Parsing failed"})
-        
-        # Print summary
-        print("\n[PARSER] Extraction Results:")
-        team1_matches = len(state["team1_stats"].get("recent_matches", []))
-        team2_matches = len(state["team2_stats"].get("recent_matches", []))
-        h2h_matches = len(state["head_to_head"].get("recent_matches", []))
-        
-        print(f"  • {team1} recent matches: {team1_matches}")
-        print(f"  • {team2} recent matches: {team2_matches}")
-        print(f"  • Head-to-head matches: {h2h_matches}")
+        response = invoke_llm(llm, PARSER_MODEL, prompt)
+        _apply_parser_response(state, response, cached_stats)
+        state["parser_path"] = "llm"
+        set_attributes(parser_path="llm")
         
-        if team1_matches > 0:
-            print(f"  • {team1} form: {state['team1_stats'].get('form', 'N/A')}")
-        if team2_matches > 0:
-            print(f"  • {team2} form: {state['team2_stats'].get('form', 'N/A')}")
+    except json.JSONDecodeError as e:
+        record_error(e)
+        print(f"[ERROR] JSON parsing failed: {e}")
+        _set_stats_error(state, "Грешка при обработка на данните")
+    except (ValueError, KeyError, TypeError, UpstreamError) as e:
+        record_error(e)
+        print(f"[ERROR] Data extraction failed: {e}")
+        _set_stats_error(state, "Няма достатъчно информация")
+    
+    return state
+
+
+async def aparse_structured_data(state: GraphState) -> GraphState:
+    """
+    Async version of parse_structured_data.
+    """
+    google_api_key = os.getenv("GOOGLE_API_KEY")
+    
+    if not _has_research_data(state):
+        return state
+    
+    cached_stats = await asyncio.to_thread(_cached_team_stats, state)
+    if await asyncio.to_thread(_apply_fast_path, state, cached_stats):
+        return state
+    
+    if not _has_api_key(state, google_api_key):
+        return state
+    
+    try:
+        llm = get_llm(PARSER_MODEL, 0.1, google_api_key)
+        prompt = _build_prompt(state, cached_stats)
         
-        print("[OK] Structured data extraction completed\n")
+        response = await ainvoke_llm(llm, PARSER_MODEL, prompt)
+        await asyncio.to_thread(_apply_parser_response, state, response, cached_stats)
+        state["parser_path"] = "llm"
+        set_attributes(parser_path="llm")
         
     except json.JSONDecodeError as e:
+        record_error(e)
         print(f"[ERROR] JSON parsing failed: {e}")
-        print(f"[ERROR] Response was: {response_text[:500]}...")
-        state["team1_stats"] = {"error": "Грешка при обработка на данните"}
-        state["team2_stats"] = {"error": "Грешка при обработка на данните"}
-        state["head_to_head"] = {"error": "Грешка при обработка на данните"}
-    except (ValueError, KeyError, TypeError) as e:
+        _set_stats_error(state, "Грешка при обработка на данните")
+    except (ValueError, KeyError, TypeError, UpstreamError) as e:
+        record_error(e)
         print(f"[ERROR] Data extraction failed: {e}")
-        state["team1_stats"] = {"error": "Няма достатъчно информация"}
-        state["team2_stats"] = {"error": "Няма достатъчно информация"}
-        state["head_to_head"] = {"error": "Няма достатъчно информация"}
+        _set_stats_error(state, "Няма достатъчно информация")
     
     return state
@@ -0,0 +1,321 @@
+"""
+Research Index
+
+Local vector store (chromadb) of every Tavily result the graph has
+collected, with the source URL, the teams and the fetch time as metadata.
+
+gather_data asks the index before searching the web: a search whose
+results are already indexed for the same team(s), recently enough and
+close enough to the query, is served from disk in milliseconds. Only the
+searches the index cannot cover go to Tavily, and their results are
+added to the index for the next request.
+
+The embedding function is pluggable (RESEARCH_EMBEDDING_FUNCTION or
+use_embedding_function()) and runs locally:
+
+- "default": chromadb's bundled ONNX all-MiniLM-L6-v2 model
+- "hashing": HashingEmbeddingFunction (no model download, e.g. offline runs)
+- any "package.module.Name" path of a chromadb embedding function class
+
+chromadb's on-disk store must have a single writer: set
+RESEARCH_INDEX_HOST to share one chromadb server between all worker
+processes. Without it every process keeps its own directory under
+RESEARCH_INDEX_PATH (directories of exited processes are removed), so
+workers never see each other's results: each one fills its own index,
+and a multi-worker deployment only gets cross-worker reuse from the
+Tavily cache. Results older than RESEARCH_INDEX_MAX_AGE are pruned
+periodically.
+
+Index errors never propagate: a failed lookup is a miss and a failed
+write is skipped.
+"""
+
+import hashlib
+import importlib
+import math
+import os
+import re
+import shutil
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from api.agent.cache import get_cache_path, make_cache_key
+from api.agent.teams import canonical_team_id
+
+
+# Set RESEARCH_INDEX_ENABLED=0 to always search the web
+RESEARCH_INDEX_ENABLED = os.getenv("RESEARCH_INDEX_ENABLED", "1") != "0"
+
+# Directory of the chromadb database
+RESEARCH_INDEX_PATH = os.getenv("RESEARCH_INDEX_PATH") or os.path.join(
+    os.path.dirname(os.path.abspath(get_cache_path())), "tipster_research_index"
+)
+
+# chromadb server ("host:port") shared by all processes; unset: one directory per process
+RESEARCH_INDEX_HOST = os.getenv("RESEARCH_INDEX_HOST")
+
+# Local embedding function ("default", "hashing" or a dotted class path)
+RESEARCH_EMBEDDING_FUNCTION = os.getenv("RESEARCH_EMBEDDING_FUNCTION", "default")
+
+# Indexed results older than this are not reused (searches may ask for less)
+RESEARCH_INDEX_MAX_AGE = float(os.getenv("RESEARCH_INDEX_MAX_AGE", "21600"))  # 6 hours
+
+# Seconds between deletions of results older than RESEARCH_INDEX_MAX_AGE
+RESEARCH_INDEX_PRUNE_INTERVAL = float(os.getenv("RESEARCH_INDEX_PRUNE_INTERVAL", "600"))
+
+# Maximum cosine distance between a search query and a reused result
+RESEARCH_INDEX_MAX_DISTANCE = float(os.getenv("RESEARCH_INDEX_MAX_DISTANCE", "0.6"))
+
+COLLECTION_NAME = "research_snippets"
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class HashingEmbeddingFunction:
+    """
+    Bag-of-words feature hashing into a fixed number of dimensions.
+
+    Needs no model, so it works offline; ranks by shared words only.
+    """
+
+    def __init__(self, dimensions: int = 384):
+        self.dimensions = dimensions
+
+    @staticmethod
+    def name() -> str:
+        return "tipster_hashing"
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        embeddings = []
+        for text in input:
+            vector = [0.0] * self.dimensions
+            for token in _TOKEN_RE.findall(text.lower()):
+                digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+                vector[int.from_bytes(digest[:4], "little") % self.dimensions] += 1.0 if digest[4] & 1 else -1.0
+            norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+            embeddings.append([value / norm for value in vector])
+        return embeddings
+
+
+def _load_embedding_function(spec: str) -> Any:
+    """Builds the embedding function named by RESEARCH_EMBEDDING_FUNCTION."""
+    if spec == "hashing":
+        return HashingEmbeddingFunction()
+    if spec == "default":
+        from chromadb.utils import embedding_functions
+        return embedding_functions.DefaultEmbeddingFunction()
+    module_name, _, class_name = spec.rpartition(".")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+def _search_kind(search: Dict[str, Any]) -> str:
+    """Returns "team" for a team form search, "fixture" for a match search."""
+    return "team" if search.get("team") else "fixture"
+
+
+def _search_teams(search: Dict[str, Any]) -> List[str]:
+    """Canonical ids of the teams a search is about (its team, or both teams of its fixture)."""
+    if search.get("team"):
+        return [canonical_team_id(search["team"])]
+    return [canonical_team_id(team) for team in search["fixture"]]
+
+
+def _remove_dead_process_dirs(path: str) -> None:
+    """Deletes the per-process index directories of processes that have exited."""
+    try:
+        names = os.listdir(path)
+    except OSError:
+        return
+    for name in names:
+        if not name.isdigit() or int(name) == os.getpid():
+            continue
+        try:
+            os.kill(int(name), 0)
+        except ProcessLookupError:
+            shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+        except OSError:
+            pass  # Exists but belongs to another user
+
+
+def _document(result: Dict[str, Any]) -> str:
+    return f"{result.get('title') or ''}\n{result.get('content') or ''}".strip()
+
+
+class ResearchIndex:
+    """
+    chromadb collection of Tavily results.
+
+    Each result is stored once per search context (its URL, the search
+    kind and the team(s) it was found for), with metadata url, title,
+    kind ("team" or "fixture"), team1, team2, label and fetched_at. The
+    collection is opened lazily on first use, so importing this module
+    does not load chromadb.
+    """
+
+    def __init__(self, path: str, embedding_function: Optional[Any] = None, host: Optional[str] = None):
+        """
+        Args:
+            path: Directory holding the per-process chromadb databases
+            embedding_function: Local embedding function (defaults to
+                RESEARCH_EMBEDDING_FUNCTION)
+            host: chromadb server ("host:port"); if set, path is not used
+        """
+        self.path = path
+        self.host = host
+        self.embedding_function = embedding_function
+        self.enabled = RESEARCH_INDEX_ENABLED
+        self._collection = None
+        self._pruned_at = 0.0
+        self._lock = threading.Lock()
+
+    def use_embedding_function(self, embedding_function: Any) -> None:
+        """Replaces the embedding function (a new collection is opened on next use)."""
+        with self._lock:
+            self.embedding_function = embedding_function
+            self._collection = None
+
+    def _get_collection(self) -> Any:
+        if self._collection is None:
+            with self._lock:
+                if self._collection is None:
+                    try:
+                        import chromadb  # Deferred: chromadb is slow to import and only needed here
+                    except ImportError:
+                        self.enabled = False
+                        print("[WARNING] chromadb is not installed; research index disabled")
+                        raise
+                    if self.embedding_function is None:
+                        self.embedding_function = _load_embedding_function(RESEARCH_EMBEDDING_FUNCTION)
+                    if self.host:
+                        host, _, port = self.host.rpartition(":")
+                        client = chromadb.HttpClient(host=host or port, port=int(port) if host else 8000)
+                    else:
+                        # A chromadb directory takes one writing process only
+                        _remove_dead_process_dirs(self.path)
+                        client = chromadb.PersistentClient(path=os.path.join(self.path, str(os.getpid())))
+                    self._collection = client.get_or_create_collection(
+                        COLLECTION_NAME,
+                        embedding_function=self.embedding_function,
+                        metadata={"hnsw:space": "cosine"},
+                    )
+        return self._collection
+
+    def lookup(self, search: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        """
+        Returns indexed results that cover a search, or None if the index
+        holds fewer than the search's max_results relevant results.
+
+        A result is relevant if it was found by the same kind of search
+        for the same team(s) (for a match search: the same fixture in
+        either order; team form results never answer a match search and
+        vice versa), within the freshness window (RESEARCH_INDEX_MAX_AGE,
+        or the search's cache_ttl if shorter) and within
+        RESEARCH_INDEX_MAX_DISTANCE of the query. Without
+        RESEARCH_INDEX_HOST only the results this process indexed itself
+        are searched.
+
+        Args:
+            search: Search definition from tools._build_searches()
+
+        Returns:
+            Tavily-shaped result dicts (score = 1 - distance), nearest first
+        """
+        if not self.enabled:
+            return None
+
+        teams = _search_teams(search)
+        max_age = min(RESEARCH_INDEX_MAX_AGE, search.get("cache_ttl") or RESEARCH_INDEX_MAX_AGE)
+        fresh = {"fetched_at": {"$gte": time.time() - max_age}}
+        if _search_kind(search) == "team":
+            about = {"$and": [{"kind": "team"}, {"team1": teams[0]}]}
+        else:
+            about = {"$and": [{"kind": "fixture"}, {"$or": [
+                {"$and": [{"team1": teams[0]}, {"team2": teams[1]}]},
+                {"$and": [{"team1": teams[1]}, {"team2": teams[0]}]},
+            ]}]}
+
+        try:
+            response = self._get_collection().query(
+                query_texts=[search["query"]],
+                n_results=search["max_results"] * 2,  # Room for duplicate URLs across contexts
+                where={"$and": [about, fresh]},
+                include=["documents", "metadatas", "distances"],
+            )
+        except ImportError:
+            return None
+        except Exception as e:  # chromadb raises its own error types
+            print(f"[WARNING] Research index lookup failed: {str(e)}")
+            return None
+
+        results: List[Dict[str, Any]] = []
+        seen = set()
+        for document, metadata, distance in zip(
+            response["documents"][0], response["metadatas"][0], response["distances"][0]
+        ):
+            if distance > RESEARCH_INDEX_MAX_DISTANCE or metadata["url"] in seen:
+                continue
+            seen.add(metadata["url"])
+            title = metadata.get("title") or ""
+            content = document[len(title):].lstrip("\n") if title and document.startswith(title) else document
+            results.append({
+                "title": title,
+                "url": metadata["url"],
+                "content": content,
+                "score": round(1 - distance, 3),
+            })
+            if len(results) == search["max_results"]:
+                return results
+        return None
+
+    def add(self, search: Dict[str, Any], results: List[Dict[str, Any]]) -> None:
+        """
+        Indexes the results of a Tavily search.
+
+        Args:
+            search: Search definition the results came from
+            results: Tavily result dicts
+        """
+        kind = _search_kind(search)
+        teams = _search_teams(search)
+        results = [result for result in results if result.get("url") and _document(result)]
+        if not self.enabled or not results:
+            return
+
+        fetched_at = time.time()
+        try:
+            self._prune(fetched_at)
+            self._get_collection().upsert(
+                ids=[make_cache_key(result["url"], kind, teams) for result in results],
+                documents=[_document(result) for result in results],
+                metadatas=[
+                    {
+                        "url": result["url"],
+                        "title": result.get("title") or "",
+                        "kind": kind,
+                        "team1": teams[0],
+                        "team2": teams[-1],
+                        "label": search["label"],
+                        "fetched_at": fetched_at,
+                    }
+                    for result in results
+                ],
+            )
+        except ImportError:
+            return
+        except Exception as e:  # Indexing is best effort
+            print(f"[WARNING] Research indexing failed: {str(e)}")
+
+    def _prune(self, now: float) -> None:
+        """Deletes results older than RESEARCH_INDEX_MAX_AGE, at most once per RESEARCH_INDEX_PRUNE_INTERVAL."""
+        if now - self._pruned_at < RESEARCH_INDEX_PRUNE_INTERVAL:
+            return
+        self._pruned_at = now
+        self._get_collection().delete(where={"fetched_at": {"$lt": now - RESEARCH_INDEX_MAX_AGE}})
+
+
+research_index = ResearchIndex(RESEARCH_INDEX_PATH, host=RESEARCH_INDEX_HOST)
+
+
+def use_embedding_function(embedding_function: Any) -> None:
+    """Plugs a local embedding function into the research index."""
+    research_index.use_embedding_function(embedding_function)
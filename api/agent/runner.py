@@ -0,0 +1,578 @@
+"""
+Analysis Runner
+
+Runs the analysis graph for a match with a result cache in front of it.
+Identical concurrent requests are coalesced into a single graph run:
+threads of one worker wait on a shared future, and worker processes
+agree on one runner through a lease in the persistent cache.
+"""
+
+import asyncio
+import contextvars
+import os
+import time
+import uuid
+from contextlib import aclosing
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from api.agent.aggregator import AGGREGATOR_TIERS, resolve_aggregator_tier
+from api.agent.analyzers import resolve_analyzer_mode
+from api.agent.cache import PersistentCache, SingleFlight, make_cache_key
+from api.agent.graph import analysis_graph
+from api.agent.state import GraphState
+from api.agent.teams import canonical_team_id
+from api.agent.metrics import atrack_inflight, record_cache_lookup, track_inflight
+from api.agent.scheduler import lane
+from api.agent.timings import collect_timings
+from api.agent.tracing import span
+
+
+# Completed analysis cache (set ANALYSIS_CACHE_TTL to 0 to disable)
+ANALYSIS_CACHE_TTL = float(os.getenv("ANALYSIS_CACHE_TTL", "1800"))  # 30 minutes
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "500"))
+
+# A lease outlives the slowest expected graph run; an expired lease is taken over
+ANALYSIS_LEASE_TTL = float(os.getenv("ANALYSIS_LEASE_TTL", "300"))
+ANALYSIS_LEASE_POLL_INTERVAL = 0.5
+
+analysis_cache = PersistentCache("analysis", ANALYSIS_CACHE_TTL, ANALYSIS_CACHE_MAX_ENTRIES)
+
+# Batch analysis limits
+BATCH_MAX_MATCHES = int(os.getenv("BATCH_MAX_MATCHES", "50"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+
+# In-flight graph runs of this process, keyed by analysis cache key
+_inflight = SingleFlight()
+
+# In-flight async graph runs of this process's event loop
+_ainflight: Dict[str, asyncio.Future] = {}
+
+# State keys streamed to clients as soon as a node produces them,
+# mapped to the event (and response field) name they are sent under
+STREAM_FIELDS = {
+    "research_data": "research_data",
+    "team1_stats": "team1_stats",
+    "team2_stats": "team2_stats",
+    "head_to_head": "head_to_head",
+    "goals_analysis": "goals_prediction",
+    "winner_analysis": "winner_prediction",
+    "score_analysis": "score_prediction",
+    "final_analysis": "final_analysis",
+}
+
+# Graph state fields kept when an analysis is cached or stored (what the API
+# payload is built from); working fields such as research_sources stay out
+STORED_FIELDS = (
+    "goals_analysis", "winner_analysis", "score_analysis", "final_analysis", "research_data",
+    "team1_stats", "team2_stats", "head_to_head", "parser_path", "aggregator_route",
+)
+
+# Nodes whose LLM tokens are streamed while they are generated
+TOKEN_STREAM_NODES = ("aggregate",)
+
+# Per-request options accepted by the run functions (see resolve_run_options)
+RUN_OPTIONS = ("analyzer_mode", "aggregator_tier", "priority")
+PRIORITIES = ("low", "normal", "high")
+
+# Lowest aggregator tier a cached analysis needs to serve an "auto" request of each priority
+PRIORITY_MIN_TIERS = {"low": "template", "normal": "fast", "high": "fast"}
+
+
+def resolve_run_options(options: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Validates per-request run options and fills in the defaults.
+
+    Args:
+        options: Any of analyzer_mode ("separate"/"combined"), aggregator_tier
+            ("auto"/"template"/"fast"/"thinking") and priority
+            ("low"/"normal"/"high"); missing or None values take the default
+
+    Returns:
+        All RUN_OPTIONS with valid values
+
+    Raises:
+        ValueError: If an option is unknown or has an invalid value
+    """
+    unknown = set(options) - set(RUN_OPTIONS)
+    if unknown:
+        raise ValueError(f"Unknown run options: {', '.join(sorted(unknown))}")
+    priority = (options.get("priority") or "normal").strip().lower()
+    if priority not in PRIORITIES:
+        raise ValueError(f"priority must be one of: {', '.join(PRIORITIES)}")
+    return {
+        "analyzer_mode": resolve_analyzer_mode(options.get("analyzer_mode")),
+        "aggregator_tier": resolve_aggregator_tier(options.get("aggregator_tier")),
+        "priority": priority,
+    }
+
+
+def run_options(match: Dict[str, Any]) -> Dict[str, Any]:
+    """Returns the run options set on a parsed match (for run_analysis(**run_options(match)))."""
+    return {key: match[key] for key in RUN_OPTIONS if match.get(key)}
+
+
+def _min_tier(options: Dict[str, str]) -> str:
+    """Lowest aggregator tier that satisfies a request with these (resolved) options."""
+    if options["aggregator_tier"] != "auto":
+        return options["aggregator_tier"]
+    return PRIORITY_MIN_TIERS[options["priority"]]
+
+
+def _satisfies(result: Dict[str, Any], options: Dict[str, str]) -> bool:
+    """
+    True if a cached analysis is good enough for the request: its
+    aggregator tier is at least the request's minimum tier. Analyses
+    without a route predate tiering and ran on the thinking model.
+    """
+    route = result.get("aggregator_route") or {}
+    tier = route.get("tier", "thinking")
+    return AGGREGATOR_TIERS.index(tier) >= AGGREGATOR_TIERS.index(_min_tier(options))
+
+
+def build_initial_state(team1: str, team2: str, **options: Any) -> GraphState:
+    """
+    Builds the initial graph state for a match.
+
+    Args:
+        team1: Home (first) team name
+        team2: Away (second) team name
+        **options: Run options (see resolve_run_options)
+
+    Returns:
+        GraphState with every field initialized
+
+    Raises:
+        ValueError: If a run option is invalid
+    """
+    return {
+        "team1": team1,
+        "team2": team2,
+        **resolve_run_options(options),
+        "research_data": "",
+        "research_sources": [],  # Will be populated by gather_data
+        "research_context": None,  # Will be populated by compact_research
+        "research_compaction": None,  # Will be populated by compact_research
+        "team1_stats": None,  # Will be populated by parser
+        "team2_stats": None,  # Will be populated by parser
+        "head_to_head": None,  # Will be populated by parser
+        "parser_path": None,  # Will be set by parser
+        "goals_analysis": "",
+        "winner_analysis": "",
+        "score_analysis": "",
+        "final_analysis": "",
+        "aggregator_route": None,  # Will be set by aggregate
+        "messages": []
+    }
+
+
+def analysis_cache_key(team1: str, team2: str, match_id: Optional[str] = None,
+                       commence_time: Optional[str] = None) -> str:
+    """
+    Builds the cache key for a match analysis.
+
+    The Odds API match id identifies a fixture uniquely. Without it the
+    key falls back to the canonical (home, away) team pair plus kickoff.
+    """
+    if match_id:
+        return make_cache_key("match", match_id)
+    return make_cache_key("teams", canonical_team_id(team1), canonical_team_id(team2), commence_time)
+
+
+def stored_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Returns the STORED_FIELDS of a final graph state (what the analysis cache and jobs keep)."""
+    return {field: result[field] for field in STORED_FIELDS if field in result}
+
+
+def _is_cacheable(result: Dict[str, Any]) -> bool:
+    """Only analyses that reached a real final prediction are cached."""
+    final_analysis = result.get("final_analysis") or ""
+    return bool(final_analysis) and not final_analysis.startswith("Error")
+
+
+def _run_with_lease(cache_key: str, team1: str, team2: str, options: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Runs the graph once across all worker processes.
+
+    The lease holder runs the graph and caches the result; other processes
+    poll the cache until a result good enough for options appears or the
+    lease is released or expires without one, in which case they take over.
+    """
+    while True:
+        if analysis_cache.acquire_lease(cache_key, ANALYSIS_LEASE_TTL):
+            try:
+                # Another process may have finished between our cache miss and the lease
+                cached = analysis_cache.get(cache_key)
+                if cached is not None and _satisfies(cached, options):
+                    return cached
+
+                result = analysis_graph.invoke(build_initial_state(team1, team2, **options))
+                if _is_cacheable(result):
+                    analysis_cache.set(cache_key, stored_result(result))
+                return result
+            finally:
+                analysis_cache.release_lease(cache_key)
+
+        print(f"[ANALYSIS] {team1} vs {team2} is running in another worker, waiting...")
+        time.sleep(ANALYSIS_LEASE_POLL_INTERVAL)
+        cached = analysis_cache.get(cache_key)
+        if cached is not None and _satisfies(cached, options):
+            return cached
+
+
+def run_analysis(team1: str, team2: str, match_id: Optional[str] = None,
+                 commence_time: Optional[str] = None, **options: Any) -> Dict[str, Any]:
+    """
+    Returns the analysis for a match, running the graph only if needed.
+
+    A cached or in-flight analysis is reused whichever analyzer mode
+    produced it, as long as its aggregator tier is good enough for the
+    request (see _satisfies); requests needing different tiers do not
+    share in-flight runs.
+
+    Args:
+        team1: Home (first) team name
+        team2: Away (second) team name
+        match_id: The Odds API match id, if known
+        commence_time: Match start time, if known
+        **options: Run options (see resolve_run_options)
+
+    Returns:
+        Final graph state of the (possibly cached) analysis, plus a
+        "timings" entry with the node timings of this call
+
+    Raises:
+        ValueError: If a run option is invalid
+    """
+    options = resolve_run_options(options)
+    cache_key = analysis_cache_key(team1, team2, match_id, commence_time)
+    flight_key = f"{cache_key}:{_min_tier(options)}"
+
+    with track_inflight("tipster_inflight_analyses", {"entry": "sync"}), collect_timings() as timings, \
+            span("run_analysis", team1=team1, team2=team2, match_id=match_id, **options) as run_span:
+        cached = analysis_cache.get(cache_key)
+        if cached is not None and not _satisfies(cached, options):
+            cached = None
+        record_cache_lookup("analysis", cached is not None)
+        if cached is not None:
+            run_span.set_attributes(analysis_cache="hit")
+            return {**cached, "timings": timings.as_dict("hit")}
+
+        result, shared = _inflight.do(flight_key, lambda: _run_with_lease(cache_key, team1, team2, options))
+        run_span.set_attributes(analysis_cache="shared" if shared else "miss")
+        # Copy: callers sharing a run must not see each other's timings
+        return {**result, "timings": timings.as_dict("shared" if shared else "miss")}
+
+
+def refresh_analysis(team1: str, team2: str, match_id: Optional[str] = None,
+                     commence_time: Optional[str] = None, ttl: Optional[float] = None,
+                     **options: Any) -> Optional[Dict[str, Any]]:
+    """
+    Runs the graph for a match even if it is cached and replaces the
+    cached analysis (used to pre-warm upcoming fixtures).
+
+    Skips the match if another worker is already computing it: that
+    run's result will be just as fresh. Upstream calls run in the
+    pre-warm lane, behind interactive requests.
+
+    Args:
+        team1: Home (first) team name
+        team2: Away (second) team name
+        match_id: The Odds API match id, if known
+        commence_time: Match start time, if known
+        ttl: Cache lifetime of the new analysis in seconds (default:
+            ANALYSIS_CACHE_TTL), e.g. until kickoff
+        **options: Run options (see resolve_run_options)
+
+    Returns:
+        Final graph state plus "timings", or None if the match was skipped
+
+    Raises:
+        ValueError: If a run option is invalid
+    """
+    options = resolve_run_options(options)
+    cache_key = analysis_cache_key(team1, team2, match_id, commence_time)
+    if not analysis_cache.acquire_lease(cache_key, ANALYSIS_LEASE_TTL):
+        return None
+
+    try:
+        with lane("prewarm"), track_inflight("tipster_inflight_analyses", {"entry": "prewarm"}), \
+                collect_timings() as timings, span("refresh_analysis", team1=team1, team2=team2, match_id=match_id, ttl=ttl, **options):
+            result = analysis_graph.invoke(build_initial_state(team1, team2, **options))
+            if _is_cacheable(result):
+                analysis_cache.set(cache_key, stored_result(result), ttl)
+            return {**result, "timings": timings.as_dict("miss")}
+    finally:
+        analysis_cache.release_lease(cache_key)
+
+
+def run_batch(matches: List[Dict[str, Any]], max_concurrency: int = BATCH_MAX_CONCURRENCY) -> List[Dict[str, Any]]:
+    """
+    Analyzes several matches with bounded concurrency.
+
+    Work shared between matches is done once: duplicate fixtures coalesce
+    on the analysis single-flight, and a team appearing in several fixtures
+    shares its form searches through the Tavily search cache and single-flight.
+    A failing match does not abort the others. Upstream calls run in the
+    batch lane, behind interactive requests.
+
+    Args:
+        matches: Parsed matches with team1, team2, match_id, commence_time
+            and (optionally) run options
+        max_concurrency: Maximum number of graph runs at once
+
+    Returns:
+        One entry per match, in input order: {"result": final_state} on
+        success or {"error": message} on failure
+    """
+    def analyze(match: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            with lane("batch"):
+                return {"result": run_analysis(
+                    match["team1"], match["team2"], match.get("match_id"), match.get("commence_time"),
+                    **run_options(match)
+                )}
+        except Exception as e:
+            print(f"[ERROR] Batch analysis failed for {match['team1']} vs {match['team2']}: {str(e)}")
+            return {"error": str(e)}
+
+    if not matches:
+        return []
+
+    workers = max(1, min(max_concurrency, BATCH_MAX_CONCURRENCY, len(matches)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Each match runs in a copy of this context, so its spans join the caller's trace
+        return list(executor.map(lambda match: contextvars.copy_context().run(analyze, match), matches))
+
+
+async def _arun_with_lease(cache_key: str, team1: str, team2: str, options: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Async version of _run_with_lease.
+
+    Blocking cache calls run in worker threads, so the lease is taken
+    under an explicit owner id instead of the calling thread's.
+    """
+    owner = f"{os.getpid()}:{uuid.uuid4().hex}"
+    while True:
+        if await asyncio.to_thread(analysis_cache.acquire_lease, cache_key, ANALYSIS_LEASE_TTL, owner):
+            try:
+                cached = await asyncio.to_thread(analysis_cache.get, cache_key)
+                if cached is not None and _satisfies(cached, options):
+                    return cached
+
+                result = await analysis_graph.ainvoke(build_initial_state(team1, team2, **options))
+                if _is_cacheable(result):
+                    await asyncio.to_thread(analysis_cache.set, cache_key, stored_result(result))
+                return result
+            finally:
+                await asyncio.to_thread(analysis_cache.release_lease, cache_key, owner)
+
+        print(f"[ANALYSIS] {team1} vs {team2} is running in another worker, waiting...")
+        await asyncio.sleep(ANALYSIS_LEASE_POLL_INTERVAL)
+        cached = await asyncio.to_thread(analysis_cache.get, cache_key)
+        if cached is not None and _satisfies(cached, options):
+            return cached
+
+
+async def arun_analysis(team1: str, team2: str, match_id: Optional[str] = None,
+                        commence_time: Optional[str] = None, **options: Any) -> Dict[str, Any]:
+    """
+    Async version of run_analysis, built on analysis_graph.ainvoke().
+
+    Args:
+        team1: Home (first) team name
+        team2: Away (second) team name
+        match_id: The Odds API match id, if known
+        commence_time: Match start time, if known
+        **options: Run options (see resolve_run_options)
+
+    Returns:
+        Final graph state of the (possibly cached) analysis, plus a
+        "timings" entry with the node timings of this call
+
+    Raises:
+        ValueError: If a run option is invalid
+    """
+    options = resolve_run_options(options)
+    cache_key = analysis_cache_key(team1, team2, match_id, commence_time)
+    flight_key = f"{cache_key}:{_min_tier(options)}"
+
+    async with atrack_inflight("tipster_inflight_analyses", {"entry": "async"}):
+        with collect_timings() as timings, \
+                span("run_analysis", team1=team1, team2=team2, match_id=match_id, **options) as run_span:
+            cached = await asyncio.to_thread(analysis_cache.get, cache_key)
+            if cached is not None and not _satisfies(cached, options):
+                cached = None
+            record_cache_lookup("analysis", cached is not None)
+            if cached is not None:
+                run_span.set_attributes(analysis_cache="hit")
+                return {**cached, "timings": timings.as_dict("hit")}
+
+            # No lock needed: the event loop runs one coroutine step at a time
+            future = _ainflight.get(flight_key)
+            if future is not None:
+                run_span.set_attributes(analysis_cache="shared")
+                result = await asyncio.shield(future)
+                return {**result, "timings": timings.as_dict("shared")}
+
+            run_span.set_attributes(analysis_cache="miss")
+            result = await _arun_leader(flight_key, cache_key, team1, team2, options)
+            return {**result, "timings": timings.as_dict("miss")}
+
+
+async def _arun_leader(flight_key: str, cache_key: str, team1: str, team2: str,
+                       options: Dict[str, str]) -> Dict[str, Any]:
+    """Runs the analysis for cache_key and shares it with concurrent callers of flight_key."""
+    future = asyncio.get_running_loop().create_future()
+    _ainflight[flight_key] = future
+    try:
+        result = await _arun_with_lease(cache_key, team1, team2, options)
+        future.set_result(result)
+        return result
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        # Mark the exception as retrieved when nobody else is waiting
+        future.exception()
+        raise
+    finally:
+        _ainflight.pop(flight_key, None)
+
+
+def _field_events(update: Dict[str, Any], sent: Dict[str, Any]):
+    """
+    Yields (event, payload) for every streamed field in a node update
+    whose value is new, recording it in sent.
+    """
+    for key, event in STREAM_FIELDS.items():
+        value = update.get(key)
+        if value and sent.get(key) != value:
+            sent[key] = value
+            yield event, {event: value}
+
+
+async def astream_analysis(team1: str, team2: str, match_id: Optional[str] = None,
+                           commence_time: Optional[str] = None,
+                           **options: Any) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Runs the analysis and yields results as soon as each node completes.
+
+    Yields (event, payload) pairs:
+    - one event per STREAM_FIELDS entry (e.g. "research_data", "team1_stats",
+      "goals_prediction", "final_analysis") once the node producing it finishes
+    - "token" events ({"node", "text"}) while the aggregator generates text
+    - a final "complete" event whose payload is the full final graph state
+      plus "timings": {"analysis_cache": "hit" | "shared" | "miss"}
+
+    A cached analysis is replayed immediately. Like arun_analysis, a miss
+    joins an identical in-flight run in this process or runs the graph
+    under the cross-process lease; a fresh run is cached when it completes.
+
+    Args:
+        team1: Home (first) team name
+        team2: Away (second) team name
+        match_id: The Odds API match id, if known
+        commence_time: Match start time, if known
+        **options: Run options (see resolve_run_options)
+    """
+    options = resolve_run_options(options)
+    cache_key = analysis_cache_key(team1, team2, match_id, commence_time)
+    flight_key = f"{cache_key}:{_min_tier(options)}"
+    sent: Dict[str, Any] = {}
+
+    async with atrack_inflight("tipster_inflight_analyses", {"entry": "stream"}):
+        cached = await asyncio.to_thread(analysis_cache.get, cache_key)
+        if cached is not None and not _satisfies(cached, options):
+            cached = None
+        record_cache_lookup("analysis", cached is not None)
+        if cached is not None:
+            for event in _field_events(cached, sent):
+                yield event
+            yield "complete", {**cached, "timings": {"analysis_cache": "hit"}}
+            return
+
+        # Shares in-flight runs with arun_analysis (same flight keys)
+        future = _ainflight.get(flight_key)
+        if future is not None:
+            result = await asyncio.shield(future)
+            for event in _field_events(result, sent):
+                yield event
+            yield "complete", {**result, "timings": {"analysis_cache": "shared"}}
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        _ainflight[flight_key] = future
+        try:
+            result = None
+            # aclosing releases the lease right away if the client disconnects
+            async with aclosing(_astream_with_lease(cache_key, team1, team2, options, sent)) as events:
+                async for event in events:
+                    if event[0] == "complete":
+                        result = event[1]
+                    else:
+                        yield event
+            future.set_result(result)
+        except (asyncio.CancelledError, GeneratorExit):
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else is waiting
+            future.exception()
+            raise
+        finally:
+            _ainflight.pop(flight_key, None)
+
+        yield "complete", {**result, "timings": {"analysis_cache": "miss"}}
+
+
+async def _astream_with_lease(cache_key: str, team1: str, team2: str, options: Dict[str, str],
+                              sent: Dict[str, Any]) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Streaming version of _arun_with_lease.
+
+    Yields the same events as astream_analysis, ending with ("complete",
+    final state). A result produced by another worker is replayed.
+    """
+    owner = f"{os.getpid()}:{uuid.uuid4().hex}"
+    while True:
+        if await asyncio.to_thread(analysis_cache.acquire_lease, cache_key, ANALYSIS_LEASE_TTL, owner):
+            try:
+                cached = await asyncio.to_thread(analysis_cache.get, cache_key)
+                if cached is not None and _satisfies(cached, options):
+                    break
+
+                result: Dict[str, Any] = dict(build_initial_state(team1, team2, **options))
+                async for mode, chunk in analysis_graph.astream(result.copy(), stream_mode=["updates", "messages"]):
+                    if mode == "messages":
+                        message, metadata = chunk
+                        node = metadata.get("langgraph_node")
+                        text = message.content if isinstance(message.content, str) else str(message.content)
+                        if node in TOKEN_STREAM_NODES and text:
+                            yield "token", {"node": node, "text": text}
+                        continue
+
+                    for update in chunk.values():
+                        if not update:
+                            continue
+                        result.update(update)
+                        for event in _field_events(update, sent):
+                            yield event
+
+                if _is_cacheable(result):
+                    await asyncio.to_thread(analysis_cache.set, cache_key, stored_result(result))
+                yield "complete", result
+                return
+            finally:
+                await asyncio.to_thread(analysis_cache.release_lease, cache_key, owner)
+
+        print(f"[ANALYSIS] {team1} vs {team2} is running in another worker, waiting...")
+        await asyncio.sleep(ANALYSIS_LEASE_POLL_INTERVAL)
+        cached = await asyncio.to_thread(analysis_cache.get, cache_key)
+        if cached is not None and _satisfies(cached, options):
+            break
+
+    for event in _field_events(cached, sent):
+        yield event
+    yield "complete", cached
@@ -0,0 +1,397 @@
+"""
+Upstream Scheduler
+
+Every Tavily search and Gemini call goes through call_upstream() /
+acall_upstream(), which keep the fleet inside the providers' rate limits:
+
+- token buckets per upstream (the Tavily key, each Gemini model) live in
+  the cache database, so all worker processes on the host draw from the
+  same budget; a call waits in its lane until a token is available
+- priority lanes: interactive requests may use every token, while the
+  pre-warm and batch lanes leave UPSTREAM_INTERACTIVE_RESERVE of each
+  bucket to them
+- rate-limit (429) and server (5xx) errors and dropped connections are
+  retried with jittered exponential backoff; a 429 also empties the
+  bucket, so the other processes slow down too
+- queue depth, queue wait and retries are exported as fleet metrics
+- a call that fails for good raises UpstreamError, which the nodes turn
+  into their "Error: ..." fallback
+
+The lane of a call comes from the context (lane()), set by the runner
+for pre-warm runs, batches and background jobs.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Iterator, Optional, Tuple, TypeVar
+from api.agent.cache import get_cache_path
+from api.agent.metrics import set_inflight
+from api.agent.timings import record_counter, record_histogram, record_llm_usage, upstream_call
+from api.agent.tracing import Span
+
+try:
+    from google.api_core import exceptions as google_exceptions
+except ImportError:  # Optional: only the typed status attributes are checked
+    google_exceptions = None
+
+# Transport errors of the HTTP clients the SDKs use (Tavily: requests and
+# httpx); neither subclasses the builtin ConnectionError / TimeoutError
+TRANSPORT_ERRORS: Tuple[type, ...] = (ConnectionError, TimeoutError)
+try:
+    import requests
+    TRANSPORT_ERRORS += (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+except ImportError:
+    pass
+try:
+    import httpx
+    TRANSPORT_ERRORS += (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError)
+except ImportError:
+    pass
+
+
+LANES = ("interactive", "prewarm", "batch")
+
+# Calls per minute per bucket; Gemini models without an entry use "gemini" (0: no limit)
+UPSTREAM_RATE_LIMITS = {
+    name.strip(): float(rate)
+    for name, _, rate in (
+        item.partition("=") for item in os.getenv("UPSTREAM_RATE_LIMITS", "tavily=60,gemini=30").split(",")
+    )
+    if name.strip()
+}
+
+# Bucket size in seconds of the refill rate (how large a burst may be)
+UPSTREAM_BURST_SECONDS = float(os.getenv("UPSTREAM_BURST_SECONDS", "10"))
+
+# Share of each bucket the pre-warm and batch lanes leave to interactive calls
+UPSTREAM_INTERACTIVE_RESERVE = float(os.getenv("UPSTREAM_INTERACTIVE_RESERVE", "0.25"))
+
+# Attempts per call and backoff bounds for retryable errors
+UPSTREAM_MAX_ATTEMPTS = max(1, int(os.getenv("UPSTREAM_MAX_ATTEMPTS", "4")))
+UPSTREAM_BACKOFF_BASE = float(os.getenv("UPSTREAM_BACKOFF_BASE", "1.0"))
+UPSTREAM_BACKOFF_MAX = float(os.getenv("UPSTREAM_BACKOFF_MAX", "30.0"))
+
+# Longest single sleep while waiting for a token (other processes may free one sooner)
+TOKEN_POLL_INTERVAL = 1.0
+
+# Lane of the calls made in the current thread / task
+_current_lane: contextvars.ContextVar[str] = contextvars.ContextVar("upstream_lane", default="interactive")
+
+T = TypeVar("T")
+
+
+class UpstreamError(Exception):
+    """
+    Raised by call_upstream() / acall_upstream() when a call failed for
+    good (not retryable, or out of attempts). The SDK's own error is the
+    __cause__.
+    """
+
+    def __init__(self, upstream: str, attempts: int, error: BaseException):
+        super().__init__(f"{upstream} call failed after {attempts} attempt(s): {error}")
+        self.upstream = upstream
+        self.attempts = attempts
+
+
+class TokenBuckets:
+    """
+    Token buckets in the rate_buckets table of the cache database.
+
+    A bucket is refilled lazily from its last update time whenever a
+    process takes from it, inside an IMMEDIATE transaction, so concurrent
+    processes never spend the same token. Database errors never block a
+    call: the token is granted and the error logged.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or get_cache_path()
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Returns this thread's connection, creating the schema on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS rate_buckets (
+                    bucket TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            self._local.conn = conn
+        return conn
+
+    def _update(self, bucket: str, rate: float, capacity: float, take: Callable[[float], Tuple[float, float]]) -> float:
+        """Refills a bucket, lets take() change its level and returns take()'s wait."""
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated_at FROM rate_buckets WHERE bucket = ?", (bucket,)).fetchone()
+            tokens = capacity if row is None else min(capacity, row[0] + max(0.0, now - row[1]) * rate)
+            tokens, wait = take(tokens)
+            conn.execute(
+                "INSERT INTO rate_buckets (bucket, tokens, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (bucket) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+                (bucket, tokens, now)
+            )
+            conn.execute("COMMIT")
+            return wait
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def try_acquire(self, bucket: str, rate: float, capacity: float, reserve: float = 0.0) -> float:
+        """
+        Takes a token if more than reserve tokens would remain.
+
+        Args:
+            bucket: Bucket name ("tavily" or a Gemini model)
+            rate: Refill rate in tokens per second
+            capacity: Bucket size
+            reserve: Tokens the caller must leave in the bucket
+
+        Returns:
+            0 if a token was taken, else the seconds until one is expected
+        """
+        def take(tokens):
+            if tokens >= 1 + reserve:
+                return tokens - 1, 0.0
+            return tokens, (1 + reserve - tokens) / rate
+
+        try:
+            return self._update(bucket, rate, capacity, take)
+        except sqlite3.Error as e:
+            print(f"[WARNING] Rate limit bucket update failed: {str(e)}")
+            return 0.0
+
+    def drain(self, bucket: str, rate: float, capacity: float) -> None:
+        """Empties a bucket after the upstream rejected a call for its rate."""
+        try:
+            self._update(bucket, rate, capacity, lambda tokens: (min(tokens, 0.0), 0.0))
+        except sqlite3.Error as e:
+            print(f"[WARNING] Rate limit bucket update failed: {str(e)}")
+
+
+token_buckets = TokenBuckets()
+
+
+@contextlib.contextmanager
+def lane(name: str) -> Iterator[None]:
+    """Runs the upstream calls made inside the with block in a priority lane."""
+    if name not in LANES:
+        raise ValueError(f"Unknown lane: {name}")
+    token = _current_lane.set(name)
+    try:
+        yield
+    finally:
+        _current_lane.reset(token)
+
+
+def current_lane() -> str:
+    return _current_lane.get()
+
+
+def _bucket_limits(upstream: str) -> Optional[Tuple[float, float]]:
+    """Returns (rate per second, capacity) of an upstream's bucket, or None if it is unlimited."""
+    per_minute = UPSTREAM_RATE_LIMITS.get(upstream)
+    if per_minute is None and upstream != "tavily":
+        per_minute = UPSTREAM_RATE_LIMITS.get("gemini")
+    if not per_minute or per_minute <= 0:
+        return None
+    rate = per_minute / 60
+    return rate, max(1.0, rate * UPSTREAM_BURST_SECONDS)
+
+
+def _reserve(call_lane: str, capacity: float) -> float:
+    """Tokens a lane must leave in a bucket (never the whole bucket, so every lane progresses)."""
+    if call_lane == "interactive":
+        return 0.0
+    return min(capacity * UPSTREAM_INTERACTIVE_RESERVE, capacity - 1)
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    """
+    Finds the HTTP status of an upstream error from its typed attributes
+    (SDKs expose it in different places; httpx.HTTPStatusError and
+    requests.HTTPError via response.status_code) or its google.api_core
+    exception class. Message text is never parsed.
+    """
+    for value in (
+        getattr(error, "status_code", None),
+        getattr(error, "code", None),
+        getattr(getattr(error, "response", None), "status_code", None),
+    ):
+        if isinstance(value, int):
+            return value
+    if google_exceptions is not None:
+        if isinstance(error, google_exceptions.ResourceExhausted):
+            return 429
+        if isinstance(error, google_exceptions.ServerError):
+            return 500
+    return None
+
+
+def _retry_after(error: BaseException) -> float:
+    """Seconds the upstream asked us to wait (Retry-After header), or 0."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After", 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _retry_reason(error: BaseException) -> Optional[str]:
+    """Returns why a failed call may be retried ("429", "5xx", "connection"), or None."""
+    if isinstance(error, TRANSPORT_ERRORS):
+        return "connection"
+    status = _status_code(error)
+    if status == 429:
+        return "429"
+    if status is not None and 500 <= status < 600:
+        return "5xx"
+    return None
+
+
+def _backoff(attempt: int, error: BaseException) -> float:
+    """Full-jitter exponential backoff, at least the upstream's Retry-After."""
+    delay = random.uniform(0, min(UPSTREAM_BACKOFF_MAX, UPSTREAM_BACKOFF_BASE * 2 ** attempt))
+    return max(delay, min(UPSTREAM_BACKOFF_MAX, _retry_after(error)))
+
+
+def _wait_for_token(upstream: str, call_lane: str) -> float:
+    """Blocks until the upstream's bucket grants a token; returns the seconds waited."""
+    limits = _bucket_limits(upstream)
+    if limits is None:
+        return 0.0
+    rate, capacity = limits
+    started = time.perf_counter()
+    wait = token_buckets.try_acquire(upstream, rate, capacity, _reserve(call_lane, capacity))
+    if wait:
+        queue = {"upstream": upstream, "lane": call_lane}
+        set_inflight("tipster_upstream_queue_depth", queue, 1)
+        try:
+            while wait:
+                time.sleep(min(wait, TOKEN_POLL_INTERVAL) * random.uniform(1.0, 1.2))
+                wait = token_buckets.try_acquire(upstream, rate, capacity, _reserve(call_lane, capacity))
+        finally:
+            set_inflight("tipster_upstream_queue_depth", queue, -1)
+    return time.perf_counter() - started
+
+
+async def _await_token(upstream: str, call_lane: str) -> float:
+    """Async version of _wait_for_token (bucket updates run in a thread)."""
+    limits = _bucket_limits(upstream)
+    if limits is None:
+        return 0.0
+    rate, capacity = limits
+    started = time.perf_counter()
+    wait = await asyncio.to_thread(token_buckets.try_acquire, upstream, rate, capacity, _reserve(call_lane, capacity))
+    if wait:
+        queue = {"upstream": upstream, "lane": call_lane}
+        set_inflight("tipster_upstream_queue_depth", queue, 1)
+        try:
+            while wait:
+                await asyncio.sleep(min(wait, TOKEN_POLL_INTERVAL) * random.uniform(1.0, 1.2))
+                wait = await asyncio.to_thread(
+                    token_buckets.try_acquire, upstream, rate, capacity, _reserve(call_lane, capacity)
+                )
+        finally:
+            set_inflight("tipster_upstream_queue_depth", queue, -1)
+    return time.perf_counter() - started
+
+
+def _handle_failure(upstream: str, attempt: int, error: Exception) -> float:
+    """
+    Decides whether a failed attempt is retried.
+
+    Returns:
+        Seconds to back off before the next attempt
+
+    Raises:
+        UpstreamError: If the error is not retryable or the attempts are used up
+    """
+    reason = _retry_reason(error)
+    if reason is None or attempt + 1 >= UPSTREAM_MAX_ATTEMPTS:
+        raise UpstreamError(upstream, attempt + 1, error) from error
+    if reason == "429":
+        limits = _bucket_limits(upstream)
+        if limits is not None:
+            token_buckets.drain(upstream, *limits)
+    record_counter("tipster_upstream_retries_total", {"upstream": upstream, "reason": reason})
+    delay = _backoff(attempt, error)
+    print(f"[WARNING] {upstream} call failed ({reason}), retrying in {delay:.1f}s: {str(error)}")
+    return delay
+
+
+def call_upstream(upstream: str, func: Callable[[Span], T]) -> T:
+    """
+    Makes a rate-limited upstream call, retrying retryable errors.
+
+    Each attempt waits for a token in the current lane and then runs
+    func inside upstream_call(), so it is timed, traced and counted like
+    any other call.
+
+    Args:
+        upstream: "tavily" or the Gemini model name
+        func: Makes the call; receives the attempt's span
+
+    Returns:
+        func's result
+
+    Raises:
+        UpstreamError: If the call failed for good
+    """
+    call_lane = current_lane()
+    for attempt in range(UPSTREAM_MAX_ATTEMPTS):
+        waited = _wait_for_token(upstream, call_lane)
+        record_histogram("tipster_upstream_queue_wait_seconds", {"upstream": upstream, "lane": call_lane}, waited)
+        try:
+            with upstream_call(upstream) as call:
+                call.set_attributes(lane=call_lane, attempt=attempt + 1, queue_wait_ms=round(waited * 1000, 1))
+                return func(call)
+        except Exception as e:
+            time.sleep(_handle_failure(upstream, attempt, e))
+
+
+async def acall_upstream(upstream: str, afunc: Callable[[Span], Awaitable[T]]) -> T:
+    """Async version of call_upstream."""
+    call_lane = current_lane()
+    for attempt in range(UPSTREAM_MAX_ATTEMPTS):
+        waited = await _await_token(upstream, call_lane)
+        record_histogram("tipster_upstream_queue_wait_seconds", {"upstream": upstream, "lane": call_lane}, waited)
+        try:
+            with upstream_call(upstream) as call:
+                call.set_attributes(lane=call_lane, attempt=attempt + 1, queue_wait_ms=round(waited * 1000, 1))
+                return await afunc(call)
+        except Exception as e:
+            delay = await asyncio.to_thread(_handle_failure, upstream, attempt, e)
+            await asyncio.sleep(delay)
+
+
+def invoke_llm(llm: Any, model: str, prompt: str) -> Any:
+    """Calls a Gemini model through the scheduler and records its token usage."""
+    def invoke(call: Span) -> Any:
+        response = llm.invoke(prompt)
+        record_llm_usage(prompt, response)
+        return response
+
+    return call_upstream(model, invoke)
+
+
+async def ainvoke_llm(llm: Any, model: str, prompt: str) -> Any:
+    """Async version of invoke_llm."""
+    async def invoke(call: Span) -> Any:
+        response = await llm.ainvoke(prompt)
+        record_llm_usage(prompt, response)
+        return response
+
+    return await acall_upstream(model, invoke)
@@ -14,18 +14,30 @@ class GraphState(TypedDict):
     
     All data collected and generated during the analysis process
     is stored in this state object.
+    
+    The analyzer nodes run in parallel, so each of them returns a partial
+    update containing only its own *_analysis key. LangGraph merges those
+    updates into the state before the aggregator runs. In "combined"
+    analyzer mode one node writes all three keys instead.
     """
     # Input data
     team1: str  # Name of the first team
     team2: str  # Name of the second team
+    analyzer_mode: Optional[str]  # "separate" (three analyzer calls) or "combined" (one call)
+    aggregator_tier: Optional[str]  # Requested aggregator tier: "auto", "template", "fast" or "thinking"
+    priority: Optional[str]  # Request priority: "low" (e.g. pre-warming), "normal" or "high"
     
     # Research data collected from web search
     research_data: Optional[str]  # Raw information from Tavily search
+    research_sources: Optional[List[Dict[str, Any]]]  # Tavily results behind research_data
+    research_context: Optional[Dict[str, str]]  # Compacted research per prompt (parser, goals, ...)
+    research_compaction: Optional[Dict[str, Dict[str, int]]]  # Estimated research tokens before/after per prompt
     
     # Structured data for frontend visualization (NEW)
     team1_stats: Optional[Dict[str, Any]]  # Team1 recent matches, form, stats
     team2_stats: Optional[Dict[str, Any]]  # Team2 recent matches, form, stats
     head_to_head: Optional[Dict[str, Any]]  # H2H history and stats
+    parser_path: Optional[str]  # How the structured data was extracted: "rules" or "llm"
     
     # Analysis results from specialized agents
     goals_analysis: Optional[str]  # Analysis of expected goals count
@@ -34,6 +46,7 @@ class GraphState(TypedDict):
     
     # Final aggregated result
     final_analysis: Optional[str]  # Final comprehensive analysis
+    aggregator_route: Optional[Dict[str, Any]]  # Tier, model and reason the aggregator ran with
     
     # Conversation history for chat functionality
     messages: List[dict]  # Chat messages for follow-up questions
@@ -0,0 +1,166 @@
+"""
+Match Statistics
+
+Derives form, goal totals/averages and head-to-head win counts from
+lists of matches. These fields are pure arithmetic, so they are computed
+here instead of being requested from the LLM: the parser prompt gets
+smaller and the numbers are always consistent with recent_matches.
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from api.agent.teams import same_team
+from api.agent.tracing import add_event
+
+
+SCORE_RE = re.compile(r"^\s*(\d{1,2})\s*[-–:]\s*(\d{1,2})\s*$")
+
+RESULT_LETTERS = {"win": "W", "draw": "D", "loss": "L"}
+
+
+def parse_score(score: Any) -> Optional[Tuple[int, int]]:
+    """Parses an "X-Y" score into (X, Y), or None if it is not a score."""
+    found = SCORE_RE.match(str(score)) if score is not None else None
+    return (int(found.group(1)), int(found.group(2))) if found else None
+
+
+def _goals(match: Dict[str, Any]) -> Optional[Tuple[int, int]]:
+    """
+    Returns (scored, conceded) for a team's match, preferring the score
+    string over the separate goal fields.
+    """
+    parsed = parse_score(match.get("score"))
+    if parsed:
+        return parsed
+    scored, conceded = match.get("goals_scored"), match.get("goals_conceded")
+    if isinstance(scored, int) and isinstance(conceded, int):
+        return scored, conceded
+    return None
+
+
+def normalize_team_match(match: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Makes goals_scored, goals_conceded and result consistent with the score.
+
+    Matches without a usable score are returned unchanged.
+    """
+    goals = _goals(match)
+    if goals is None:
+        return match
+    scored, conceded = goals
+    if scored > conceded:
+        result = "win"
+    elif scored < conceded:
+        result = "loss"
+    else:
+        result = "draw"
+    return {**match, "goals_scored": scored, "goals_conceded": conceded, "result": result}
+
+
+def team_summary(team: str, matches: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Builds a team_stats dict from a team's recent matches (newest first).
+
+    Args:
+        team: Team name
+        matches: Recent matches with at least a score ("X-Y" from the team's view)
+
+    Returns:
+        Dict with name, recent_matches, form, goal totals/averages and
+        matches_analyzed; averages are over matches with a known score
+    """
+    matches = [normalize_team_match(match) for match in matches]
+    known = [goals for goals in map(_goals, matches) if goals]
+    scored = [goals[0] for goals in known]
+    conceded = [goals[1] for goals in known]
+    count = len(known)
+
+    return {
+        "name": team,
+        "recent_matches": matches,
+        "form": "".join(RESULT_LETTERS[match["result"]] for match in matches if match.get("result") in RESULT_LETTERS),
+        "total_goals_scored": sum(scored),
+        "total_goals_conceded": sum(conceded),
+        "avg_goals_scored": round(sum(scored) / count, 2) if count else 0,
+        "avg_goals_conceded": round(sum(conceded) / count, 2) if count else 0,
+        "matches_analyzed": count,
+    }
+
+
+def normalize_h2h_match(team1: str, team2: str, match: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Sets a head-to-head match's winner from its score and home/away teams.
+
+    The winner is the requested team name (team1 or team2) or "Draw";
+    matches whose teams or score cannot be resolved keep their winner.
+    """
+    goals = parse_score(match.get("score"))
+    home = match.get("home_team") or ""
+    if goals is None or not (same_team(home, team1) or same_team(home, team2)):
+        return match
+    home_team = team1 if same_team(home, team1) else team2
+    away_team = team2 if home_team == team1 else team1
+    if goals[0] > goals[1]:
+        winner = home_team
+    elif goals[0] < goals[1]:
+        winner = away_team
+    else:
+        winner = "Draw"
+    return {**match, "winner": winner}
+
+
+def head_to_head_summary(team1: str, team2: str, matches: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Builds the head_to_head dict with win counts from the matches between
+    team1 and team2.
+
+    Returns:
+        Dict with total_matches, team1_wins, draws, team2_wins and
+        recent_matches, or an error dict when there are no matches
+    """
+    if not matches:
+        return {"error": "Няма достатъчно информация"}
+
+    matches = [normalize_h2h_match(team1, team2, match) for match in matches]
+    winners = [match.get("winner") for match in matches]
+    return {
+        "total_matches": len(matches),
+        "team1_wins": sum(1 for winner in winners if winner and same_team(winner, team1)),
+        "draws": sum(1 for winner in winners if str(winner).lower() == "draw"),
+        "team2_wins": sum(1 for winner in winners if winner and same_team(winner, team2)),
+        "recent_matches": matches,
+    }
+
+
+def recompute_team_stats(team: str, stats: Any) -> Any:
+    """
+    Overwrites the summary fields of LLM-parsed team stats with values
+    computed from its recent_matches. Error dicts are returned unchanged.
+    """
+    if not isinstance(stats, dict) or "error" in stats or not isinstance(stats.get("recent_matches"), list):
+        return stats
+
+    computed = team_summary(stats.get("name") or team, stats["recent_matches"])
+    for field in ("form", "total_goals_scored", "total_goals_conceded", "matches_analyzed"):
+        if stats.get(field) is not None and stats.get(field) != computed[field]:
+            add_event("stats_corrected", team=team, field=field, parsed=stats.get(field), computed=computed[field])
+    return {**stats, **computed}
+
+
+def recompute_head_to_head(team1: str, team2: str, head_to_head: Any) -> Any:
+    """
+    Overwrites the win counts of LLM-parsed head-to-head data with values
+    computed from its recent_matches. Error dicts are returned unchanged.
+    """
+    if not isinstance(head_to_head, dict) or "error" in head_to_head:
+        return head_to_head
+    matches = head_to_head.get("recent_matches")
+    if not isinstance(matches, list) or not matches:
+        return head_to_head
+
+    computed = head_to_head_summary(team1, team2, matches)
+    for field in ("total_matches", "team1_wins", "draws", "team2_wins"):
+        if head_to_head.get(field) is not None and head_to_head.get(field) != computed[field]:
+            add_event("stats_corrected", team="head_to_head", field=field,
+                      parsed=head_to_head.get(field), computed=computed[field])
+    return {**head_to_head, **computed}
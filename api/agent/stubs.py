@@ -0,0 +1,168 @@
+"""
+Stub Backends
+
+Local stand-ins for TavilyClient, AsyncTavilyClient and
+ChatGoogleGenerativeAI used by the offline benchmark
+(python manage.py benchmark). They never touch the network: each call
+sleeps for a configurable latency and returns generated data of a
+configurable size, shaped like the real responses so that every node
+of the graph does its normal work.
+"""
+
+import asyncio
+import json
+import random
+import re
+import time
+import zlib
+from typing import Any, Dict, List
+from langchain_core.messages import AIMessage
+from api.agent.clients import use_backends
+from api.agent.compaction import estimate_tokens
+
+
+class StubSettings:
+    """Latency and payload settings shared by all stub clients."""
+
+    def __init__(self):
+        self.llm_latency = 0.5  # Seconds per Gemini call
+        self.tavily_latency = 0.3  # Seconds per Tavily search
+        self.jitter = 0.2  # Latencies vary by up to +/- this fraction
+        self.content_chars = 1500  # Characters of content per Tavily result
+        self.output_chars = 600  # Characters of each analyzer / aggregator answer
+        self.scorelines = 2  # Scorelines per team form result (FAST_PATH_MIN_MATCHES+ takes the rules path)
+
+
+stub_settings = StubSettings()
+
+FILLER_WORDS = (
+    "coach", "squad", "pressing", "midfield", "training", "supporters", "tactical", "league",
+    "season", "defence", "striker", "winger", "possession", "chances", "fixture", "stadium",
+)
+
+
+def _latency(seconds: float) -> float:
+    jitter = stub_settings.jitter
+    return max(0.0, seconds * random.uniform(1 - jitter, 1 + jitter))
+
+
+def _team_from_query(query: str) -> str:
+    """Returns the team a search is about (the part before " vs " or " football")."""
+    return re.split(r" vs | football", query, maxsplit=1)[0]
+
+
+def _search_response(query: str, max_results: int = 5, **params: Any) -> Dict[str, Any]:
+    """Builds a Tavily-shaped response for a query."""
+    team = _team_from_query(query)
+    rng = random.Random(query)
+    results = []
+    for index in range(max_results):
+        lines = [
+            f"{team} {rng.randint(0, 4)}-{rng.randint(0, 3)} Rival{index}{line} on 2025-09-{line + 1:02d}."
+            for line in range(stub_settings.scorelines)
+        ]
+        text = " ".join(lines)
+        while len(text) < stub_settings.content_chars:
+            text += " " + " ".join(rng.choice(FILLER_WORDS) for _ in range(12)).capitalize() + "."
+        results.append({
+            "title": f"{team} news {index + 1}",
+            "url": f"https://stub.local/{zlib.crc32(query.encode('utf-8'))}/{index}",
+            "content": text[:stub_settings.content_chars],
+            "score": round(rng.random(), 3),
+        })
+    return {"query": query, "results": results}
+
+
+class StubTavilyClient:
+    """Stands in for tavily.TavilyClient."""
+
+    def __init__(self, api_key: str = ""):
+        self.api_key = api_key
+
+    def search(self, query: str, **params: Any) -> Dict[str, Any]:
+        time.sleep(_latency(stub_settings.tavily_latency))
+        return _search_response(query, **params)
+
+
+class StubAsyncTavilyClient:
+    """Stands in for tavily.AsyncTavilyClient."""
+
+    def __init__(self, api_key: str = ""):
+        self.api_key = api_key
+
+    async def search(self, query: str, **params: Any) -> Dict[str, Any]:
+        await asyncio.sleep(_latency(stub_settings.tavily_latency))
+        return _search_response(query, **params)
+
+
+def _parser_answer(prompt: str) -> str:
+    """Builds the JSON the parser prompt asks for."""
+    names: List[str] = re.findall(r'"name": "(.*?)"', prompt)
+    matches = [
+        {"date": f"2025-09-{day:02d}", "opponent": f"Opponent {day}", "score": f"{day % 4}-{day % 3}", "home_away": "home"}
+        for day in range(1, 6)
+    ]
+    head_to_head = {"recent_matches": [
+        {"date": "2025-03-01", "home_team": names[0] if names else "Team 1",
+         "away_team": names[1] if len(names) > 1 else "Team 2", "score": "2-1"}
+    ]}
+    if "team1_stats" not in prompt:
+        return json.dumps({"head_to_head": head_to_head})
+    return json.dumps({
+        "team1_stats": {"name": names[0] if names else "Team 1", "recent_matches": matches},
+        "team2_stats": {"name": names[1] if len(names) > 1 else "Team 2", "recent_matches": matches},
+        "head_to_head": head_to_head,
+    })
+
+
+def _combined_answer() -> str:
+    """Builds the JSON the combined analyzer prompt asks for."""
+    text = ("Analyse: " + "Die Form spricht für ein offenes Spiel. " * 100)[:max(1, stub_settings.output_chars // 3)]
+    return json.dumps({"goals_analysis": text, "winner_analysis": text, "score_analysis": text}, ensure_ascii=False)
+
+
+class StubChatModel:
+    """Stands in for ChatGoogleGenerativeAI (invoke / ainvoke only)."""
+
+    def __init__(self, model: str = "", google_api_key: str = "", temperature: float = 0.0, **kwargs: Any):
+        self.model = model
+        self.temperature = temperature
+
+    def _answer(self, prompt: Any) -> AIMessage:
+        prompt = prompt if isinstance(prompt, str) else str(prompt)
+        if "data extraction specialist" in prompt:
+            content = _parser_answer(prompt)
+        elif '"winner_analysis"' in prompt:
+            content = _combined_answer()
+        else:
+            content = ("Analyse: " + "Die Form spricht für ein offenes Spiel. " * 100)[:stub_settings.output_chars]
+        return AIMessage(
+            content=content,
+            usage_metadata={
+                "input_tokens": estimate_tokens(prompt),
+                "output_tokens": estimate_tokens(content),
+                "total_tokens": estimate_tokens(prompt) + estimate_tokens(content),
+            }
+        )
+
+    def invoke(self, prompt: Any, *args: Any, **kwargs: Any) -> AIMessage:
+        time.sleep(_latency(stub_settings.llm_latency))
+        return self._answer(prompt)
+
+    async def ainvoke(self, prompt: Any, *args: Any, **kwargs: Any) -> AIMessage:
+        await asyncio.sleep(_latency(stub_settings.llm_latency))
+        return self._answer(prompt)
+
+
+def install_stubs(**settings: Any) -> None:
+    """
+    Replaces the real Tavily and Gemini clients with the stubs.
+
+    Args:
+        **settings: StubSettings attributes to change (e.g. llm_latency=0.2)
+    """
+    for name, value in settings.items():
+        if not hasattr(stub_settings, name):
+            raise ValueError(f"Unknown stub setting: {name}")
+        setattr(stub_settings, name, value)
+    use_backends(llm=StubChatModel, tavily=StubTavilyClient, async_tavily=StubAsyncTavilyClient)
@@ -0,0 +1,57 @@
+"""
+Team Form Cache
+
+Per-team cache of recent form, shared by every fixture a team plays in.
+Holds both the raw Tavily form snippets (used by gather_data) and the
+parsed team stats (used by parse_data), keyed by canonical team id and
+with their own freshness window. A match analysis then only needs to
+fetch and parse the match-specific head-to-head data fresh.
+"""
+
+import os
+from typing import Any, Dict, List, Optional
+from api.agent.cache import PersistentCache
+from api.agent.teams import canonical_team_id
+
+
+# Team form freshness window (set TEAM_FORM_CACHE_TTL to 0 to disable)
+TEAM_FORM_CACHE_TTL = float(os.getenv("TEAM_FORM_CACHE_TTL", "21600"))  # 6 hours
+TEAM_FORM_CACHE_MAX_ENTRIES = int(os.getenv("TEAM_FORM_CACHE_MAX_ENTRIES", "1000"))
+
+team_snippets_cache = PersistentCache("team_snippets", TEAM_FORM_CACHE_TTL, TEAM_FORM_CACHE_MAX_ENTRIES)
+team_stats_cache = PersistentCache("team_stats", TEAM_FORM_CACHE_TTL, TEAM_FORM_CACHE_MAX_ENTRIES)
+
+
+def is_valid_team_stats(stats: Optional[Dict[str, Any]]) -> bool:
+    """Parsed stats are worth reusing only if they hold actual matches."""
+    return bool(stats) and "error" not in stats and bool(stats.get("recent_matches"))
+
+
+def get_team_snippets(team: str) -> Optional[List[Dict[str, Any]]]:
+    """Returns the cached Tavily form results for a team, if fresh."""
+    return team_snippets_cache.get(canonical_team_id(team))
+
+
+def set_team_snippets(team: str, results: List[Dict[str, Any]]) -> None:
+    """Caches the Tavily form results for a team."""
+    team_snippets_cache.set(canonical_team_id(team), results)
+
+
+def get_team_stats(team: str) -> Optional[Dict[str, Any]]:
+    """
+    Returns the cached parsed stats for a team, if fresh.
+
+    The stats are relabeled with the requested team name, since the same
+    team may have been cached under a different spelling.
+    """
+    stats = team_stats_cache.get(canonical_team_id(team))
+    if not is_valid_team_stats(stats):
+        return None
+    stats["name"] = team
+    return stats
+
+
+def set_team_stats(team: str, stats: Optional[Dict[str, Any]]) -> None:
+    """Caches parsed stats for a team if they are valid."""
+    if is_valid_team_stats(stats):
+        team_stats_cache.set(canonical_team_id(team), stats)
@@ -0,0 +1,133 @@
+"""
+Team Identity
+
+Maps the team names used in requests to canonical team ids, so caches
+and dedup layers keyed on a team hit regardless of how the name was written:
+
+- Unicode folding: case, accents and punctuation ("Türkiye" -> "turkiye")
+- club affixes such as "FC" or "CF" are dropped ("Valencia CF" -> "valencia")
+- an alias table maps other names of a team to one canonical name
+  ("Turkey", "Türkiye" and "Turkiye" -> "turkey"); TEAM_ALIASES_PATH
+  adds entries from a JSON file {"Canonical Name": ["Alias", ...]}
+
+Canonical ids are memoized, so repeated lookups cost a dict access.
+"""
+
+import functools
+import json
+import os
+import re
+import unicodedata
+from typing import Dict, Iterable
+
+
+# Club affixes dropped from the start or end of a name
+CLUB_AFFIXES = frozenset({"fc", "cf", "afc", "sc", "fk", "sk"})
+
+# Canonical name -> other names of the team
+DEFAULT_TEAM_ALIASES = {
+    "Turkey": ["Türkiye", "Turkiye"],
+    "Czech Republic": ["Czechia"],
+    "United States": ["USA", "United States of America", "USMNT"],
+    "South Korea": ["Korea Republic"],
+    "Ivory Coast": ["Côte d'Ivoire", "Cote d'Ivoire"],
+    "Manchester United": ["Man United", "Man Utd"],
+    "Manchester City": ["Man City"],
+    "Tottenham Hotspur": ["Tottenham", "Spurs"],
+    "Wolverhampton Wanderers": ["Wolves"],
+    "Inter Milan": ["Internazionale"],
+    "Paris Saint-Germain": ["PSG", "Paris SG"],
+    "Bayern Munich": ["Bayern München", "FC Bayern"],
+}
+
+# JSON file with more aliases (same shape as DEFAULT_TEAM_ALIASES)
+TEAM_ALIASES_PATH = os.getenv("TEAM_ALIASES_PATH")
+
+_NON_WORD_RE = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def fold(text: str) -> str:
+    """Lowercases, strips accents and collapses whitespace ("Türkiye" -> "turkiye")."""
+    normalized = unicodedata.normalize("NFKD", text or "")
+    return " ".join("".join(ch for ch in normalized if not unicodedata.combining(ch)).lower().split())
+
+
+def _normalize(name: str) -> str:
+    """Folds a name, drops punctuation and strips club affixes ("Valencia C.F." -> "valencia")."""
+    words = _NON_WORD_RE.sub(" ", fold(name).replace(".", "")).split()
+    while len(words) > 1 and words[0] in CLUB_AFFIXES:
+        words.pop(0)
+    while len(words) > 1 and words[-1] in CLUB_AFFIXES:
+        words.pop()
+    return " ".join(words)
+
+
+def _build_alias_index(aliases: Dict[str, Iterable[str]]) -> Dict[str, str]:
+    """Normalized alias (and canonical name) -> normalized canonical name."""
+    index = {}
+    for canonical, names in aliases.items():
+        canonical_id = _normalize(canonical)
+        index[canonical_id] = canonical_id
+        for name in names:
+            index[_normalize(name)] = canonical_id
+    return index
+
+
+def _load_aliases() -> Dict[str, Iterable[str]]:
+    aliases = dict(DEFAULT_TEAM_ALIASES)
+    if TEAM_ALIASES_PATH:
+        try:
+            with open(TEAM_ALIASES_PATH, encoding="utf-8") as handle:
+                aliases.update(json.load(handle))
+        except (OSError, ValueError) as e:
+            print(f"[WARNING] Team aliases not loaded from {TEAM_ALIASES_PATH}: {str(e)}")
+    return aliases
+
+
+_aliases = _load_aliases()
+_alias_index = _build_alias_index(_aliases)
+# Canonical id -> display name searched for (e.g. "turkey" -> "Turkey")
+_canonical_names = {_normalize(canonical): canonical for canonical in _aliases}
+
+
+def use_aliases(aliases: Dict[str, Iterable[str]]) -> None:
+    """Adds alias table entries ({"Canonical Name": ["Alias", ...]})."""
+    global _alias_index
+    _alias_index = {**_alias_index, **_build_alias_index(aliases)}
+    _canonical_names.update({_normalize(canonical): canonical for canonical in aliases})
+    canonical_team_id.cache_clear()
+
+
+def same_team(name: str, team: str) -> bool:
+    """
+    Checks whether a name found in text refers to team: both must have
+    the same canonical id, so club affixes ("FC Porto" / "Porto") and
+    aliases match, but reserve sides and namesakes ("Real Madrid Castilla",
+    "Atletico Madrid") do not.
+    """
+    if not fold(name) or not fold(team):
+        return False
+    return canonical_team_id(name) == canonical_team_id(team)
+
+
+@functools.lru_cache(maxsize=4096)
+def canonical_team_id(name: str) -> str:
+    """
+    Returns the canonical id for a team name.
+
+    Args:
+        name: Team name as received (e.g. "Türkiye ", "Valencia CF")
+
+    Returns:
+        Canonical team id (e.g. "turkey", "valencia")
+    """
+    normalized = _normalize(name)
+    return _alias_index.get(normalized, normalized)
+
+
+def canonical_team_name(name: str) -> str:
+    """
+    Returns the name to search a team under: the alias table's canonical
+    name if the team has one, otherwise the name as received (trimmed).
+    """
+    return _canonical_names.get(canonical_team_id(name), " ".join((name or "").split()))
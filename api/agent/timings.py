@@ -0,0 +1,416 @@
+"""
+Node Timings
+
+Per-node instrumentation of the analysis graph. Every node records its
+wall time, upstream (Tavily / Gemini) call count, LLM input/output
+tokens and cache hits/misses:
+
+- the records of one analysis are collected by the runner and returned
+  in the optional "timings" block of the API response
+- every record is also appended to the node_timings table of the cache
+  database, so latency can be reported across runs and worker processes
+  (python manage.py report_timings)
+- the fleet metrics (api.agent.metrics) are updated once per node with
+  its latency, upstream latencies, errors and cache lookups
+- node_timings rows and metric updates are buffered in memory and
+  written in batches by a background thread, so finishing a node does
+  not wait for SQLite
+- every node and upstream call is traced as a span (api.agent.tracing),
+  with the same counters as span attributes and cache lookups / errors
+  as span events
+
+Nodes are wrapped with timed_node(); code running inside a node reports
+with upstream_call(), record_llm_usage(), record_cache(), record_counter(),
+record_histogram() and record_error().
+"""
+
+import atexit
+import contextlib
+import contextvars
+import functools
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from api.agent.compaction import estimate_tokens
+from api.agent.metrics import (
+    BufferedStore, cache_lookup_update, histogram_updates, metrics_store, record_cache_lookup, set_inflight
+)
+from api.agent.tracing import Span, add_event, current_span, span
+
+
+# Rows kept in the node_timings table (0 disables persistence)
+NODE_TIMINGS_MAX_ROWS = int(os.getenv("NODE_TIMINGS_MAX_ROWS", "20000"))
+
+# Record of the node running in the current thread / task
+_current_node: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar("current_node", default=None)
+
+# Collector of the analysis running in the current thread / task
+_current_run: contextvars.ContextVar[Optional["RunTimings"]] = contextvars.ContextVar("current_run", default=None)
+
+# Record fields summed up over the nodes of a run
+COUNTERS = ("upstream_calls", "input_tokens", "output_tokens", "cache_hits", "cache_misses")
+
+
+def _new_record(node: str) -> Dict[str, Any]:
+    # "_metrics" buffers the node's metric updates until the node finishes
+    record: Dict[str, Any] = {"node": node, "wall_ms": 0.0, "upstreams": {}, "errors": {}, "_metrics": []}
+    record.update({counter: 0 for counter in COUNTERS})
+    return record
+
+
+class RunTimings:
+    """Collects the node records of one analysis run."""
+
+    def __init__(self):
+        self.nodes: List[Dict[str, Any]] = []
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self.nodes.append(record)
+
+    def as_dict(self, analysis_cache: str) -> Dict[str, Any]:
+        """
+        Builds the "timings" block of the API response.
+
+        Args:
+            analysis_cache: How the analysis was obtained: "miss" (graph ran),
+                "hit" (analysis cache) or "shared" (joined another request's run)
+
+        Returns:
+            Dict with total_ms, analysis_cache, totals and one entry per node
+        """
+        with self._lock:
+            nodes = list(self.nodes)
+        return {
+            "total_ms": round((time.perf_counter() - self._started) * 1000, 1),
+            "analysis_cache": analysis_cache,
+            "totals": {counter: sum(record[counter] for record in nodes) for counter in COUNTERS},
+            "nodes": {
+                record["node"]: {key: value for key, value in record.items() if key != "node" and not key.startswith("_")}
+                for record in nodes
+            },
+        }
+
+
+@contextlib.contextmanager
+def collect_timings() -> Iterator[RunTimings]:
+    """
+    Collects the node timings of the graph runs inside the with block.
+
+    Graph nodes run in copies of the caller's context (threads and tasks),
+    so they report to the collector set here.
+    """
+    run = RunTimings()
+    token = _current_run.set(run)
+    try:
+        yield run
+    finally:
+        _current_run.reset(token)
+
+
+def _finish(record: Dict[str, Any], run: Optional[RunTimings]) -> None:
+    """Publishes a finished node record to its run, the timing store and the metrics."""
+    if run is not None:
+        run.add(record)
+    node = {"node": record["node"]}
+    timing_store.record(record)
+    metrics_store.add(histogram_updates("tipster_node_duration_seconds", node, record["wall_ms"] / 1000) + record["_metrics"])
+    set_inflight("tipster_inflight_nodes", node, -1)
+
+
+def _record_exception(record: Dict[str, Any], error: BaseException) -> None:
+    error_type = type(error).__name__
+    record["errors"][error_type] = record["errors"].get(error_type, 0) + 1
+    record["_metrics"].append(("tipster_node_errors_total", {"node": record["node"], "exception": error_type}, 1))
+
+
+def _trace_record(node_span: Span, record: Dict[str, Any]) -> None:
+    """Copies a finished node record's counters to its span."""
+    node_span.set_attributes(**{counter: record[counter] for counter in COUNTERS})
+    if record["errors"]:
+        node_span.set_attributes(errors=dict(record["errors"]))
+
+
+def timed_node(node: str, func: Callable, afunc: Callable):
+    """
+    Wraps a node's sync and async implementations with timing.
+
+    Args:
+        node: Node name in the graph
+        func: Sync node function
+        afunc: Async node function
+
+    Returns:
+        (sync wrapper, async wrapper)
+    """
+    @functools.wraps(func)
+    def wrapper(state):
+        record = _new_record(node)
+        set_inflight("tipster_inflight_nodes", {"node": node}, 1)
+        with span(f"node {node}", node=node) as node_span:
+            token = _current_node.set(record)
+            started = time.perf_counter()
+            try:
+                return func(state)
+            except Exception as e:
+                _record_exception(record, e)
+                raise
+            finally:
+                record["wall_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                _current_node.reset(token)
+                _trace_record(node_span, record)
+                _finish(record, _current_run.get())
+
+    @functools.wraps(afunc)
+    async def awrapper(state):
+        record = _new_record(node)
+        set_inflight("tipster_inflight_nodes", {"node": node}, 1)
+        with span(f"node {node}", node=node) as node_span:
+            token = _current_node.set(record)
+            started = time.perf_counter()
+            try:
+                return await afunc(state)
+            except Exception as e:
+                _record_exception(record, e)
+                raise
+            finally:
+                record["wall_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                _current_node.reset(token)
+                _trace_record(node_span, record)
+                _finish(record, _current_run.get())
+
+    return wrapper, awrapper
+
+
+@contextlib.contextmanager
+def upstream_call(upstream: str) -> Iterator[Span]:
+    """
+    Times and traces an upstream API call made by the current node.
+
+    Failed calls are counted by exception type; the exception propagates.
+    Call record_llm_usage() inside the with block so the tokens land on
+    the call's span.
+
+    Args:
+        upstream: "tavily" or the Gemini model name
+
+    Yields:
+        The call's span, for attributes such as the query or result count
+    """
+    record = _current_node.get()
+    started = time.perf_counter()
+    name, attributes = ("tavily.search", {}) if upstream == "tavily" else ("gemini.invoke", {"model": upstream})
+    try:
+        with span(name, upstream=upstream, **attributes) as call_span:
+            yield call_span
+    except Exception as e:
+        if record is not None:
+            record["_metrics"].append(
+                ("tipster_upstream_errors_total", {"upstream": upstream, "exception": type(e).__name__}, 1)
+            )
+        raise
+    finally:
+        if record is not None:
+            record["upstream_calls"] += 1
+            record["upstreams"][upstream] = record["upstreams"].get(upstream, 0) + 1
+            record["_metrics"].extend(histogram_updates(
+                "tipster_upstream_duration_seconds", {"upstream": upstream}, time.perf_counter() - started
+            ))
+
+
+def record_llm_usage(prompt: str, response: Any) -> None:
+    """
+    Adds the token usage of a Gemini response to the current node.
+
+    Uses the usage metadata of the response; without it the token
+    counts are estimated from the prompt and response text. The counts
+    are also set on the open span (the Gemini call's, inside upstream_call).
+    """
+    usage = getattr(response, "usage_metadata", None) or {}
+    content = getattr(response, "content", "")
+    content = content if isinstance(content, str) else str(content)
+    input_tokens = usage.get("input_tokens") or estimate_tokens(prompt)
+    output_tokens = usage.get("output_tokens") or estimate_tokens(content)
+    current_span().set_attributes(
+        input_tokens=input_tokens, output_tokens=output_tokens, estimated_tokens=not usage
+    )
+    record = _current_node.get()
+    if record is None:
+        return
+    record["input_tokens"] += input_tokens
+    record["output_tokens"] += output_tokens
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    """
+    Counts a cache lookup of the current node (or, outside a node,
+    only in the fleet metrics).
+
+    Args:
+        cache: Cache name ("tavily", "research_index", "team_stats", "analysis")
+        hit: Whether the lookup found a fresh entry
+    """
+    add_event("cache_hit" if hit else "cache_miss", cache=cache)
+    record = _current_node.get()
+    if record is None:
+        record_cache_lookup(cache, hit)
+        return
+    record["cache_hits" if hit else "cache_misses"] += 1
+    record["_metrics"].append(cache_lookup_update(cache, hit))
+
+
+def record_counter(name: str, labels: Dict[str, str]) -> None:
+    """Increments a fleet counter (e.g. tipster_aggregator_tier_total) once the current node finishes."""
+    record = _current_node.get()
+    if record is None:
+        metrics_store.add([(name, labels, 1)])
+        return
+    record["_metrics"].append((name, labels, 1))
+
+
+def record_histogram(name: str, labels: Dict[str, str], seconds: float) -> None:
+    """Adds an observation to a fleet histogram (e.g. tipster_upstream_queue_wait_seconds) once the current node finishes."""
+    record = _current_node.get()
+    if record is None:
+        metrics_store.add(histogram_updates(name, labels, seconds))
+        return
+    record["_metrics"].extend(histogram_updates(name, labels, seconds))
+
+
+def record_error(error: BaseException) -> None:
+    """Counts an exception a node handled in one of its except branches."""
+    current_span().record_exception(error)
+    record = _current_node.get()
+    if record is not None:
+        _record_exception(record, error)
+
+
+class TimingStore(BufferedStore):
+    """
+    Append-only node_timings table in the cache database, trimmed to the
+    newest max_rows records. Records are buffered and written in one
+    transaction per flush (see BufferedStore). Database errors never
+    propagate.
+    """
+
+    def __init__(self, max_rows: int, path: Optional[str] = None):
+        self.max_rows = max_rows
+        # Rows not written yet
+        self._pending: List[tuple] = []
+        super().__init__(path)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Returns this thread's connection, creating the schema on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS node_timings (
+                    recorded_at REAL NOT NULL,
+                    node TEXT NOT NULL,
+                    wall_ms REAL NOT NULL,
+                    upstream_calls INTEGER NOT NULL,
+                    input_tokens INTEGER NOT NULL,
+                    output_tokens INTEGER NOT NULL,
+                    cache_hits INTEGER NOT NULL,
+                    cache_misses INTEGER NOT NULL
+                )
+            """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS node_timings_recorded ON node_timings (recorded_at)"
+            )
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def _clear(self) -> None:
+        self._pending = []
+
+    def record(self, record: Dict[str, Any]) -> None:
+        """
+        Buffers a finished node record until the next flush.
+
+        Args:
+            record: Finished node record
+        """
+        if self.max_rows <= 0:
+            return
+        with self._buffer_lock:
+            self._pending.append(
+                (time.time(), record["node"], record["wall_ms"], *(record[counter] for counter in COUNTERS))
+            )
+        self._schedule()
+
+    def flush(self) -> None:
+        """Appends the buffered records and drops the oldest rows beyond max_rows, in one transaction."""
+        with self._buffer_lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+        try:
+            conn = self._connect()
+            with conn:  # Commits, or rolls back on error
+                conn.executemany(
+                    "INSERT INTO node_timings (recorded_at, node, wall_ms, " + ", ".join(COUNTERS) + ") "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    pending
+                )
+                last_rowid = conn.execute("SELECT MAX(rowid) FROM node_timings").fetchone()[0]
+                conn.execute("DELETE FROM node_timings WHERE rowid <= ?", (last_rowid - self.max_rows,))
+        except sqlite3.Error as e:
+            print(f"[WARNING] Timing write failed: {str(e)}")
+
+    def summary(self, since: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Aggregates the stored records per node.
+
+        Args:
+            since: Only records newer than this Unix timestamp (default: all)
+
+        Returns:
+            Node name -> {runs, p50_ms, p95_ms, max_ms, avg_ms, upstream_calls,
+            input_tokens, output_tokens, cache_hit_ratio}; token and call
+            counts are averages per run
+        """
+        self.flush()
+        try:
+            rows = self._connect().execute(
+                "SELECT node, wall_ms, " + ", ".join(COUNTERS) + " FROM node_timings "
+                "WHERE recorded_at >= ? ORDER BY node, wall_ms",
+                (since or 0,)
+            ).fetchall()
+        except sqlite3.Error as e:
+            print(f"[WARNING] Timing read failed: {str(e)}")
+            return {}
+
+        grouped: Dict[str, List[tuple]] = {}
+        for row in rows:
+            grouped.setdefault(row[0], []).append(row[1:])
+
+        summary = {}
+        for node, node_rows in grouped.items():
+            walls = [row[0] for row in node_rows]  # Sorted by the query
+            runs = len(node_rows)
+            totals = {counter: sum(row[index + 1] for row in node_rows) for index, counter in enumerate(COUNTERS)}
+            lookups = totals["cache_hits"] + totals["cache_misses"]
+            summary[node] = {
+                "runs": runs,
+                "p50_ms": walls[int(0.50 * (runs - 1))],
+                "p95_ms": walls[int(0.95 * (runs - 1))],
+                "max_ms": walls[-1],
+                "avg_ms": round(sum(walls) / runs, 1),
+                "upstream_calls": round(totals["upstream_calls"] / runs, 2),
+                "input_tokens": round(totals["input_tokens"] / runs, 1),
+                "output_tokens": round(totals["output_tokens"] / runs, 1),
+                "cache_hit_ratio": round(totals["cache_hits"] / lookups, 3) if lookups else None,
+            }
+        return summary
+
+
+timing_store = TimingStore(NODE_TIMINGS_MAX_ROWS)
+atexit.register(timing_store.shutdown)
@@ -5,9 +5,277 @@ Functions for gathering information about football matches
 from various sources (Tavily, API-Football, etc.)
 """
 
+import asyncio
+import contextvars
 import os
-from tavily import TavilyClient
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from tavily import AsyncTavilyClient, TavilyClient
+from api.agent.cache import AsyncSingleFlight, PersistentCache, SingleFlight, make_cache_key
+from api.agent.clients import get_async_tavily_client, get_tavily_client
+from api.agent.research_index import research_index
+from api.agent.scheduler import acall_upstream, call_upstream
 from api.agent.state import GraphState
+from api.agent.team_form import get_team_snippets, set_team_snippets
+from api.agent.teams import canonical_team_id, canonical_team_name
+from api.agent.timings import record_cache, record_error
+from api.agent.tracing import Span, add_event, set_attributes
+
+
+# Trusted football sources for the match-specific search
+MATCH_SEARCH_DOMAINS = [
+    "flashscore.com", "sofascore.com", "espn.com", "bbc.com", "uefa.com",
+    "fifa.com", "transfermarkt.com", "footballwhispers.com", "whoscored.com"
+]
+
+# Search result cache for match searches (set TAVILY_MATCH_CACHE_TTL to 0 to disable).
+# Team form searches are cached per team in api.agent.team_form instead.
+TAVILY_MATCH_CACHE_TTL = float(os.getenv("TAVILY_MATCH_CACHE_TTL", "3600"))  # Match-specific search: 1 hour
+TAVILY_CACHE_MAX_ENTRIES = int(os.getenv("TAVILY_CACHE_MAX_ENTRIES", "2000"))
+
+tavily_cache = PersistentCache("tavily", TAVILY_MATCH_CACHE_TTL, TAVILY_CACHE_MAX_ENTRIES)
+
+# Identical searches running at the same time (e.g. the form search of a team
+# playing in several fixtures of a batch) share a single Tavily call
+_search_flight = SingleFlight()
+_asearch_flight = AsyncSingleFlight()
+
+
+def _build_searches(team1: str, team2: str) -> List[Dict[str, Any]]:
+    """
+    Builds the list of Tavily searches for a match, in the order
+    their results appear in research_data.
+    
+    Queries use the canonical team names, so every spelling of a team
+    sends (and caches) the same search.
+    
+    Args:
+        team1: Name of the first team
+        team2: Name of the second team
+        
+    Returns:
+        List of search definitions (label, query, Tavily parameters and
+        either a cache TTL and the fixture or, for team form searches, the team)
+    """
+    name1, name2 = canonical_team_name(team1), canonical_team_name(team2)
+    return [
+        # SEARCH 1: Direct match prediction and head-to-head
+        {
+            "label": "SEARCH 1 - Match Specific",
+            "query": f"{name1} vs {name2} football match prediction latest results goals scored recent form head to head statistics injuries lineup",
+            "max_results": 3,
+            "search_depth": "advanced",
+            "include_domains": MATCH_SEARCH_DOMAINS,
+            "cache_ttl": TAVILY_MATCH_CACHE_TTL,
+            "fixture": (team1, team2),  # Indexed results of this fixture can answer it
+        },
+        # SEARCH 2: Recent form of team1
+        {
+            "label": f"SEARCH 2 - {team1} Recent Form",
+            "query": f"{name1} football recent results last 5 matches goals scored form statistics 2025",
+            "max_results": 2,
+            "search_depth": "basic",
+            "include_domains": None,
+            "team": team1,  # Depends only on this team: cached per team
+        },
+        # SEARCH 3: Recent form of team2
+        {
+            "label": f"SEARCH 3 - {team2} Recent Form",
+            "query": f"{name2} football recent results last 5 matches goals scored form statistics 2025",
+            "max_results": 2,
+            "search_depth": "basic",
+            "include_domains": None,
+            "team": team2,  # Depends only on this team: cached per team
+        },
+    ]
+
+
+def _search_cache_key(search: Dict[str, Any]) -> str:
+    """
+    Builds the cache key for a search from the Tavily parameters that
+    affect the results. Team form searches are keyed by canonical team
+    id, the match search by the fixture's canonical team ids in either
+    order (home and away swapped find the same articles), other searches
+    by their normalized query.
+    """
+    if search.get("team"):
+        return make_cache_key("team_form", canonical_team_id(search["team"]))
+    domains = sorted(search["include_domains"]) if search.get("include_domains") else None
+    if search.get("fixture"):
+        teams = sorted(canonical_team_id(team) for team in search["fixture"])
+        return make_cache_key("match_search", teams, search["max_results"], search["search_depth"], domains)
+    query = " ".join(search["query"].lower().split())
+    return make_cache_key(query, search["max_results"], search["search_depth"], domains)
+
+
+def _cached_results(search: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    """Returns the cached results of a search (team form or query cache), if fresh."""
+    if search.get("team"):
+        return get_team_snippets(search["team"])
+    return tavily_cache.get(_search_cache_key(search))
+
+
+def _store_results(search: Dict[str, Any], results: List[Dict[str, Any]]) -> None:
+    """Caches the results of a successful search."""
+    if search.get("team"):
+        set_team_snippets(search["team"], results)
+    else:
+        tavily_cache.set(_search_cache_key(search), results, ttl=search.get("cache_ttl"))
+
+
+def _search_params(search: Dict[str, Any]) -> Dict[str, Any]:
+    """Builds the keyword arguments for TavilyClient.search from a search definition."""
+    params = {
+        "query": search["query"],
+        "max_results": search["max_results"],
+        "search_depth": search["search_depth"],
+    }
+    if search.get("include_domains"):
+        params["include_domains"] = search["include_domains"]
+    return params
+
+
+def _extract_results(search_results: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Returns the result list of a Tavily response."""
+    if search_results and 'results' in search_results:
+        return search_results['results']
+    return []
+
+
+def _indexed_results(search: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    """Returns results from the research index that cover a search, caching them like a Tavily answer."""
+    results = research_index.lookup(search)
+    record_cache("research_index", results is not None)
+    if results is not None:
+        add_event("search_indexed", label=search["label"], results=len(results))
+        _store_results(search, results)
+    return results
+
+
+def _store_fetched(search: Dict[str, Any], results: List[Dict[str, Any]]) -> None:
+    """Caches and indexes the results of a successful Tavily search."""
+    _store_results(search, results)
+    research_index.add(search, results)
+
+
+def _run_search(tavily: TavilyClient, search: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Runs a single Tavily search, serving it from the persistent cache
+    or the research index when they cover it and sharing it with
+    identical searches already in flight.
+    
+    Errors are logged and turned into an empty result list so that one
+    failing search does not drop the results of the others.
+    
+    Args:
+        tavily: Tavily client
+        search: Search definition from _build_searches()
+        
+    Returns:
+        List of Tavily result dicts (may be empty)
+    """
+    cached = _cached_results(search)
+    record_cache("tavily", cached is not None)
+    if cached is not None:
+        add_event("search_cached", label=search["label"], results=len(cached))
+        return cached
+    
+    def fetch() -> List[Dict[str, Any]]:
+        indexed = _indexed_results(search)
+        if indexed is not None:
+            return indexed
+        def search_tavily(call: Span) -> List[Dict[str, Any]]:
+            call.set_attributes(label=search["label"], query=search["query"])
+            results = _extract_results(tavily.search(**_search_params(search)))
+            call.set_attributes(results=len(results))
+            return results
+        
+        results = call_upstream("tavily", search_tavily)
+        # Only successful searches are cached; failures are retried next time
+        _store_fetched(search, results)
+        return results
+    
+    try:
+        results, shared = _search_flight.do(_search_cache_key(search), fetch)
+    except Exception as e:  # Tavily raises its own exception types besides HTTP errors
+        record_error(e)
+        print(f"[ERROR] {search['label']} failed: {str(e)}\n")
+        return []
+    
+    if shared:
+        add_event("search_shared", label=search["label"], results=len(results))
+    return results
+
+
+async def _arun_search(tavily: AsyncTavilyClient, search: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Async version of _run_search.
+    
+    Cache and index access is moved off the event loop since SQLite
+    and chromadb calls block. Identical searches of concurrent async
+    requests share one Tavily call (_asearch_flight).
+    """
+    cached = await asyncio.to_thread(_cached_results, search)
+    record_cache("tavily", cached is not None)
+    if cached is not None:
+        add_event("search_cached", label=search["label"], results=len(cached))
+        return cached
+    
+    async def fetch() -> List[Dict[str, Any]]:
+        # to_thread copies the context, so the lookup reports to this node
+        indexed = await asyncio.to_thread(_indexed_results, search)
+        if indexed is not None:
+            return indexed
+        async def search_tavily(call: Span) -> List[Dict[str, Any]]:
+            call.set_attributes(label=search["label"], query=search["query"])
+            results = _extract_results(await tavily.search(**_search_params(search)))
+            call.set_attributes(results=len(results))
+            return results
+        
+        results = await acall_upstream("tavily", search_tavily)
+        await asyncio.to_thread(_store_fetched, search, results)
+        return results
+    
+    try:
+        results, shared = await _asearch_flight.do(_search_cache_key(search), fetch)
+    except Exception as e:  # Tavily raises its own exception types besides HTTP errors
+        record_error(e)
+        print(f"[ERROR] {search['label']} failed: {str(e)}\n")
+        return []
+    
+    if shared:
+        add_event("search_shared", label=search["label"], results=len(results))
+    return results
+
+
+def _format_research_data(team1: str, team2: str, search_results: List[List[Dict[str, Any]]]) -> str:
+    """
+    Combines the results of all searches (in search order) into the
+    research_data text used by the parser and the analyzers.
+    """
+    # Combine all results
+    all_results = []
+    for results in search_results:
+        all_results.extend(results)
+    
+    set_attributes(sources=len(all_results))
+    
+    # Format the results
+    formatted_data = f"=== Research Data for {team1} vs {team2} ===\n\n"
+    
+    if all_results:
+        for idx, result in enumerate(all_results, 1):
+            title = result.get('title', 'N/A')
+            url = result.get('url', 'N/A')
+            
+            formatted_data += f"{idx}. {title}\n"
+            formatted_data += f"   Source: {url}\n"
+            formatted_data += f"   {result.get('content', 'No content available')}\n\n"
+    else:
+        formatted_data += "No relevant information found.\n"
+        print(f"[WARNING] No Tavily results for {team1} vs {team2}")
+    
+    return formatted_data
 
 
 def search_web_tavily(state: GraphState) -> GraphState:
@@ -38,79 +306,63 @@ def search_web_tavily(state: GraphState) -> GraphState:
         return state
     
     try:
-        print("\n" + "="*80)
-        print(f"[TAVILY SEARCH] Gathering data for {team1} vs {team2}")
-        print("="*80)
+        # Shared Tavily client (reused across requests)
+        tavily = get_tavily_client(tavily_api_key)
         
-        # Initialize Tavily client
-        tavily = TavilyClient(api_key=tavily_api_key)
+        searches = _build_searches(team1, team2)
+        set_attributes(team1=team1, team2=team2, searches=len(searches))
         
-        # SEARCH 1: Direct match prediction and head-to-head
-        query1 = f"{team1} vs {team2} football match prediction latest results goals scored recent form head to head statistics injuries lineup"
-        
-        print(f"[SEARCH 1 - Match Specific] {query1}\n")
-        
-        search_results1 = tavily.search(
-            query=query1,
-            max_results=3,
-            search_depth="advanced",
-            include_domains=["flashscore.com", "sofascore.com", "espn.com", "bbc.com", "uefa.com", "fifa.com", "transfermarkt.com", "footballwhispers.com", "whoscored.com"]
-        )
+        # Run all searches concurrently; results are collected in search order.
+        # Each search runs in a copy of this context so it reports to this node's timings.
+        with ThreadPoolExecutor(max_workers=len(searches)) as executor:
+            futures = [
+                executor.submit(contextvars.copy_context().run, _run_search, tavily, search)
+                for search in searches
+            ]
+            search_results = [future.result() for future in futures]
         
-        # SEARCH 2: Recent form of team1
-        query2 = f"{team1} football recent results last 5 matches goals scored form statistics 2025"
+        formatted_data = _format_research_data(team1, team2, search_results)
+        state["research_data"] = formatted_data
+        state["research_sources"] = [result for results in search_results for result in results]
         
-        print(f"[SEARCH 2 - {team1} Recent Form] {query2}\n")
+    except (ValueError, KeyError, ConnectionError) as e:
+        record_error(e)
+        error_msg = f"Error during web search: {str(e)}"
+        state["research_data"] = error_msg
+        print(f"[ERROR] {error_msg}\n")
+    
+    return state
+
+
+async def asearch_web_tavily(state: GraphState) -> GraphState:
+    """
+    Async version of search_web_tavily.
+    
+    The searches run concurrently on the event loop via AsyncTavilyClient.
+    """
+    team1 = state.get("team1", "")
+    team2 = state.get("team2", "")
+    
+    tavily_api_key = os.getenv("TAVILY_API_KEY")
+    
+    if not tavily_api_key:
+        state["research_data"] = "Error: Tavily API key not configured."
+        return state
+    
+    try:
+        tavily = get_async_tavily_client(tavily_api_key)
         
-        search_results2 = tavily.search(
-            query=query2,
-            max_results=2,
-            search_depth="basic"
-        )
+        searches = _build_searches(team1, team2)
+        set_attributes(team1=team1, team2=team2, searches=len(searches))
         
-        # SEARCH 3: Recent form of team2
-        query3 = f"{team2} football recent results last 5 matches goals scored form statistics 2025"
-        
-        print(f"[SEARCH 3 - {team2} Recent Form] {query3}\n")
-        
-        search_results3 = tavily.search(
-            query=query3,
-            max_results=2,
-            search_depth="basic"
-        )
-        
-        # Combine all results
-        all_results = []
-        if search_results1 and 'results' in search_results1:
-            all_results.extend(search_results1['results'])
-        if search_results2 and 'results' in search_results2:
-            all_results.extend(search_results2['results'])
-        if search_results3 and 'results' in search_results3:
-            all_results.extend(search_results3['results'])
-        
-        print(f"[OK] Found {len(all_results)} total sources across all searches\n")
-        
-        # Format the results
-        formatted_data = f"=== Research Data for {team1} vs {team2} ===\n\n"
-        
-        if all_results:
-            for idx, result in enumerate(all_results, 1):
-                title = result.get('title', 'N/A')
-                url = result.get('url', 'N/A')
-                print(f"   {idx}. {title}")
-                print(f"      URL: {url}\n")
-                
-                formatted_data += f"{idx}. {title}\n"
-                formatted_data += f"   Source: {url}\n"
-                formatted_data += f"   {result.get('content', 'No content available')}\n\n"
-        else:
-            formatted_data += "No relevant information found.\n"
-            print("   [WARNING] No results found\n")
+        # gather() keeps results in search order
+        search_results = await asyncio.gather(*(_arun_search(tavily, search) for search in searches))
         
-        state["research_data"] = formatted_data
-        print("[OK] All Tavily searches completed\n")
+        state["research_data"] = _format_research_data(team1, team2, list(search_results))
+        state["research_sources"] = [result for results in search_results for result in results]
         
     except (ValueError, KeyError, ConnectionError) as e:
+        record_error(e)
         error_msg = f"Error during web search: {str(e)}"
         state["research_data"] = error_msg
         print(f"[ERROR] {error_msg}\n")
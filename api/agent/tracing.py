@@ -0,0 +1,285 @@
+"""
+Request Tracing
+
+Request-scoped spans for the analysis pipeline:
+
+- a root span per API request (analyze_teams and its async / stream
+  variants) or per analysis started outside a request (jobs, batches)
+- a child span per graph node (opened by timed_node)
+- a child span per upstream call (Tavily search, each Gemini call),
+  with attributes such as the query, model, result count and tokens
+
+Finished spans are exported as JSON lines to a local file
+(TIPSTER_TRACE_PATH, default tipster_traces.jsonl next to the cache database),
+which stands in for a collector. Export happens on a background thread,
+so the request path only appends to a bounded in-memory queue (spans are
+dropped when it is full). Each span is one write to an O_APPEND
+descriptor, so lines of several processes never interleave, and the file
+is rotated to <path>.1 once it exceeds TIPSTER_TRACE_MAX_BYTES. Writers
+hold an flock on <path>.lock, so only one process rotates and nobody
+appends to a file while it is being rotated.
+
+The current span travels in a context variable, like the node timings,
+so the search threads and async tasks of a node report to it.
+"""
+
+import atexit
+import contextlib
+import contextvars
+import json
+import os
+import queue
+import secrets
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+from api.agent.cache import get_cache_path
+
+try:
+    import fcntl
+except ImportError:  # Windows: rotation is not coordinated between processes
+    fcntl = None
+
+
+# Set TIPSTER_TRACING=0 to stop recording spans
+TRACING_ENABLED = os.getenv("TIPSTER_TRACING", "1") != "0"
+
+# JSON lines file the spans are exported to
+TRACE_PATH = os.getenv("TIPSTER_TRACE_PATH") or os.path.join(
+    os.path.dirname(os.path.abspath(get_cache_path())), "tipster_traces.jsonl"
+)
+
+# The trace file is rotated to <path>.1 beyond this size (0: never rotated)
+TRACE_MAX_BYTES = int(os.getenv("TIPSTER_TRACE_MAX_BYTES", str(50 * 1024 * 1024)))
+
+# Spans waiting for export; newer spans are dropped when the queue is full
+TRACE_QUEUE_MAX_SPANS = int(os.getenv("TIPSTER_TRACE_QUEUE_MAX_SPANS", "10000"))
+
+# The exporter writes at least this often while spans are queued
+TRACE_FLUSH_INTERVAL = 1.0
+
+# Span open in the current thread / task
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """One timed operation of a trace."""
+
+    def __init__(self, name: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.attributes: Dict[str, Any] = {}
+        self.events: List[Dict[str, Any]] = []
+        self.status = "ok"
+        self.error: Optional[str] = None
+        self.start_time = time.time()
+        self._started = time.perf_counter()
+        self.duration_ms = 0.0
+        self.set_attributes(**attributes)
+
+    def set_attributes(self, **attributes: Any) -> None:
+        """Sets attributes; None values are skipped."""
+        for key, value in attributes.items():
+            if value is not None:
+                self.attributes[key] = value
+
+    def add_event(self, name: str, **attributes: Any) -> None:
+        """Records a point-in-time event (e.g. a cache hit) on the span."""
+        self.events.append({
+            "name": name,
+            "time": time.time(),
+            "attributes": {key: value for key, value in attributes.items() if value is not None},
+        })
+
+    def record_exception(self, error: BaseException) -> None:
+        """Marks the span as failed."""
+        self.status = "error"
+        self.error = f"{type(error).__name__}: {error}"
+
+    def end(self) -> None:
+        self.duration_ms = round((time.perf_counter() - self._started) * 1000, 1)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "name": self.name,
+            "start_time": self.start_time,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+            "events": self.events,
+        }
+
+
+class _NoopSpan(Span):
+    """Returned when tracing is off or no span is open; drops everything."""
+
+    def __init__(self):
+        self.attributes = {}
+        self.events = []
+
+    def set_attributes(self, **attributes: Any) -> None:
+        pass
+
+    def add_event(self, name: str, **attributes: Any) -> None:
+        pass
+
+    def record_exception(self, error: BaseException) -> None:
+        pass
+
+
+_noop_span = _NoopSpan()
+
+
+class SpanExporter:
+    """
+    Appends finished spans to a JSON lines file from a background thread.
+
+    Write errors are logged and the spans dropped; they never reach the request.
+    """
+
+    def __init__(self, path: str, max_spans: int = TRACE_QUEUE_MAX_SPANS):
+        self.path = path
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=max(1, max_spans))
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.dropped = 0
+
+    def export(self, span: Span) -> None:
+        """Queues a finished span (non-blocking; dropped if the queue is full)."""
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(span.as_dict())
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                print(f"[WARNING] Span export queue full, {self.dropped} spans dropped")
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + TRACE_FLUSH_INTERVAL
+            while batch[-1] is not None and time.monotonic() < deadline:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            self._write([span for span in batch if span is not None])
+            if batch[-1] is None:
+                return
+
+    @contextlib.contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """Holds an exclusive flock on <path>.lock (shared by all processes writing the file)."""
+        if fcntl is None:
+            yield
+            return
+        fd = os.open(self.path + ".lock", os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)  # Releases the lock
+
+    def _rotate(self) -> None:
+        """
+        Moves the trace file to <path>.1 once it exceeds TRACE_MAX_BYTES.
+        Called with the file lock held, so two processes never both rotate
+        (the second would overwrite <path>.1 with the fresh file).
+        """
+        try:
+            if TRACE_MAX_BYTES and os.path.getsize(self.path) > TRACE_MAX_BYTES:
+                os.replace(self.path, self.path + ".1")
+        except FileNotFoundError:
+            pass  # Not created yet
+
+    def _write(self, spans: List[Dict[str, Any]]) -> None:
+        if not spans:
+            return
+        try:
+            with self._file_lock():
+                self._rotate()
+                fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    for span in spans:
+                        # One write per line: O_APPEND keeps each line whole next to other processes'
+                        os.write(fd, (json.dumps(span, ensure_ascii=False, default=str) + "\n").encode("utf-8"))
+                finally:
+                    os.close(fd)
+        except OSError as e:
+            print(f"[WARNING] Span export failed: {str(e)}")
+
+    def shutdown(self) -> None:
+        """Writes the queued spans and stops the thread (called at exit)."""
+        if self._thread is not None:
+            try:
+                self._queue.put(None, timeout=5)
+            except queue.Full:
+                return
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+span_exporter = SpanExporter(TRACE_PATH)
+atexit.register(span_exporter.shutdown)
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """
+    Opens a span as a child of the current one (or as a new trace's root)
+    for the duration of the with block.
+
+    An exception escaping the block marks the span as failed and propagates.
+
+    Args:
+        name: Span name (e.g. "analyze_teams", "node gather_data", "tavily.search")
+        **attributes: Initial attributes; None values are skipped
+    """
+    if not TRACING_ENABLED:
+        yield _noop_span
+        return
+
+    parent = _current_span.get()
+    current = Span(name, parent, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.record_exception(e)
+        raise
+    finally:
+        current.end()
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # Closed from another context (e.g. an async generator resumed elsewhere)
+            _current_span.set(parent)
+        span_exporter.export(current)
+
+
+def current_span() -> Span:
+    """Returns the open span (a no-op span if there is none)."""
+    return _current_span.get() or _noop_span
+
+
+def set_attributes(**attributes: Any) -> None:
+    """Sets attributes on the open span."""
+    current_span().set_attributes(**attributes)
+
+
+def add_event(name: str, **attributes: Any) -> None:
+    """Adds an event to the open span."""
+    current_span().add_event(name, **attributes)
@@ -0,0 +1,121 @@
+"""
+Background Analysis Jobs
+
+A SQLite-backed job queue (the AnalysisJob table) for the submit/poll
+mode. Web processes only enqueue jobs; the run_analysis_workers
+management command claims and runs them, so workers scale separately
+from web processes.
+"""
+
+import os
+from datetime import timedelta
+from django.utils import timezone
+from .agent.runner import run_analysis, run_options, stored_result
+from .agent.scheduler import lane
+from .models import AnalysisJob
+from .store import store_result
+
+
+# A job is retried this many times before it is marked failed
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "2"))
+
+# Running jobs not finished after this long are assumed lost (worker crashed) and requeued
+JOB_STALE_AFTER = timedelta(seconds=int(os.getenv("JOB_STALE_AFTER", "600")))
+
+
+def submit_job(match):
+    """
+    Enqueues an analysis job.
+
+    Args:
+        match: Parsed match (team1, team2, match_id, sport_key, commence_time
+            and any run options)
+
+    Returns:
+        The created AnalysisJob
+    """
+    return AnalysisJob.objects.create(match=match)
+
+
+def claim_next_job(worker_id):
+    """
+    Atomically claims the oldest queued job.
+
+    The claim is a compare-and-set on the job status, so two workers
+    (threads or processes) can never claim the same job.
+
+    Args:
+        worker_id: Identifier of the claiming worker
+
+    Returns:
+        The claimed AnalysisJob, or None if the queue is empty
+    """
+    while True:
+        job = AnalysisJob.objects.filter(status=AnalysisJob.STATUS_QUEUED).order_by('created_at').first()
+        if job is None:
+            return None
+
+        claimed = AnalysisJob.objects.filter(pk=job.pk, status=AnalysisJob.STATUS_QUEUED).update(
+            status=AnalysisJob.STATUS_RUNNING,
+            worker=worker_id,
+            attempts=job.attempts + 1,
+            started_at=timezone.now()
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+        # Another worker won the race for this job; try the next one
+
+
+def run_job(job):
+    """
+    Runs a claimed job and records its result.
+
+    Failures are requeued until JOB_MAX_ATTEMPTS is reached.
+    """
+    match = job.match
+    try:
+        # Background jobs yield upstream quota to interactive requests
+        with lane("batch"):
+            result = run_analysis(
+                match["team1"], match["team2"], match.get("match_id"), match.get("commence_time"),
+                **run_options(match)
+            )
+    except Exception as e:
+        print(f"[ERROR] Job {job.pk} failed (attempt {job.attempts}): {str(e)}")
+        job.error = str(e)
+        if job.attempts < JOB_MAX_ATTEMPTS:
+            job.status = AnalysisJob.STATUS_QUEUED
+        else:
+            job.status = AnalysisJob.STATUS_FAILED
+            job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at'])
+        return
+
+    store_result(match, result)
+    job.result = stored_result(result)
+    job.error = ''
+    job.status = AnalysisJob.STATUS_DONE
+    job.finished_at = timezone.now()
+    job.save(update_fields=['result', 'error', 'status', 'finished_at'])
+
+
+def requeue_stale_jobs():
+    """
+    Requeues running jobs whose worker stopped without finishing them.
+
+    Jobs that already used all their attempts are marked failed instead,
+    so a job that keeps crashing workers does not loop forever.
+
+    Returns:
+        Number of requeued jobs
+    """
+    stale = AnalysisJob.objects.filter(
+        status=AnalysisJob.STATUS_RUNNING, started_at__lt=timezone.now() - JOB_STALE_AFTER
+    )
+    stale.filter(attempts__gte=JOB_MAX_ATTEMPTS).update(
+        status=AnalysisJob.STATUS_FAILED,
+        error='Worker stopped before the job finished',
+        finished_at=timezone.now()
+    )
+    return stale.filter(attempts__lt=JOB_MAX_ATTEMPTS).update(status=AnalysisJob.STATUS_QUEUED, worker='')
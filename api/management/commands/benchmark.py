@@ -0,0 +1,250 @@
+"""
+Offline performance benchmark.
+
+Usage:
+    python manage.py benchmark --concurrency 1,4,16 --requests 32
+    python manage.py benchmark --json bench.json --baseline main.json
+
+Replaces Tavily and Gemini with the local stubs in api/agent/stubs.py
+(configurable latency and payload size), then drives analysis_graph
+(sync and async) and the analyze_teams view at each concurrency level.
+Reports throughput, p50/p95/p99 latency and peak Python memory per
+target and level. All caches, the research index (with the hashing
+embedding function), timings, metrics and traces go to a temporary
+directory, so runs are repeatable and never touch the real cache.
+
+With --baseline, the run fails when p95 latency or throughput is worse
+than the baseline report by more than --max-regression.
+"""
+
+import asyncio
+import contextlib
+import io
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.test import APIRequestFactory
+from api.agent import metrics, research_index, runner, scheduler, team_form, timings, tools, tracing
+from api.agent.graph import analysis_graph
+from api.agent.runner import RUN_OPTIONS, build_initial_state
+from api.agent.stubs import install_stubs
+from api.views import analyze_teams
+
+TARGETS = ("graph", "graph-async", "view")
+
+
+def _percentile(values, fraction):
+    """Nearest-rank percentile of sorted values."""
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+def _use_cache_db(path):
+    """Points every SQLite-backed store at path (connections are reopened lazily)."""
+    stores = (
+        runner.analysis_cache, tools.tavily_cache, team_form.team_snippets_cache,
+        team_form.team_stats_cache, timings.timing_store, metrics.metrics_store, scheduler.token_buckets,
+    )
+    for store in stores:
+        store.path = path
+        store._local = threading.local()
+
+
+class Command(BaseCommand):
+    help = "Benchmarks the analysis graph and the analyze_teams view against stub Tavily/Gemini backends."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', default='1,4,16',
+                            help='Comma-separated concurrency levels (default: 1,4,16)')
+        parser.add_argument('--requests', type=int, default=16, help='Analyses per target and level (default: 16)')
+        parser.add_argument('--targets', default='graph,graph-async,view',
+                            help=f"Comma-separated targets out of {', '.join(TARGETS)}")
+        parser.add_argument('--llm-latency', type=float, default=0.5, help='Seconds per stub Gemini call')
+        parser.add_argument('--tavily-latency', type=float, default=0.3, help='Seconds per stub Tavily search')
+        parser.add_argument('--jitter', type=float, default=0.2, help='Latency jitter as a fraction (default: 0.2)')
+        parser.add_argument('--content-chars', type=int, default=1500, help='Characters per stub Tavily result')
+        parser.add_argument('--output-chars', type=int, default=600, help='Characters per stub Gemini answer')
+        parser.add_argument('--scorelines', type=int, default=2,
+                            help='Scorelines per team result; at least FAST_PATH_MIN_MATCHES skips the LLM parser')
+        parser.add_argument('--analyzer-mode', choices=('separate', 'combined'),
+                            help='Analyzer mode of every run (default: ANALYZER_MODE)')
+        parser.add_argument('--aggregator-tier', choices=('auto', 'template', 'fast', 'thinking'),
+                            help='Aggregator tier of every run (default: AGGREGATOR_TIER)')
+        parser.add_argument('--priority', choices=('low', 'normal', 'high'), help='Priority of every run')
+        parser.add_argument('--rate-limits', default='',
+                            help='Upstream rate limits as in UPSTREAM_RATE_LIMITS (default: none)')
+        parser.add_argument('--same-fixture', action='store_true',
+                            help='Analyze one fixture repeatedly (measures the cached / coalesced path)')
+        parser.add_argument('--json', help='Write the report to this JSON file')
+        parser.add_argument('--baseline', help='JSON report to compare against')
+        parser.add_argument('--max-regression', type=float, default=0.25,
+                            help='Allowed p95 / throughput regression against the baseline (default: 0.25)')
+        parser.add_argument('--verbose', action='store_true', help='Keep the graph logs')
+
+    def handle(self, *args, **options):
+        targets = [target.strip() for target in options['targets'].split(',') if target.strip()]
+        unknown = set(targets) - set(TARGETS)
+        if unknown:
+            raise CommandError(f"Unknown targets: {', '.join(sorted(unknown))}")
+        levels = [int(level) for level in options['concurrency'].split(',')]
+
+        install_stubs(
+            llm_latency=options['llm_latency'],
+            tavily_latency=options['tavily_latency'],
+            jitter=options['jitter'],
+            content_chars=options['content_chars'],
+            output_chars=options['output_chars'],
+            scorelines=options['scorelines'],
+        )
+        os.environ.setdefault("GOOGLE_API_KEY", "stub")
+        os.environ.setdefault("TAVILY_API_KEY", "stub")
+        # Stubs have no quota; limits only apply when asked for
+        scheduler.UPSTREAM_RATE_LIMITS.clear()
+        for item in options['rate_limits'].split(','):
+            name, _, rate = item.partition('=')
+            if name.strip():
+                scheduler.UPSTREAM_RATE_LIMITS[name.strip()] = float(rate)
+
+        report = {"settings": {key: options[key] for key in (
+            'requests', 'llm_latency', 'tavily_latency', 'jitter', 'content_chars',
+            'output_chars', 'scorelines', 'rate_limits', 'same_fixture', 'analyzer_mode', 'aggregator_tier', 'priority'
+        )}, "results": []}
+
+        with tempfile.TemporaryDirectory() as directory:
+            _use_cache_db(os.path.join(directory, "benchmark.sqlite3"))
+            tracing.span_exporter.path = os.path.join(directory, "traces.jsonl")
+            research_index.research_index.path = os.path.join(directory, "research_index")
+            research_index.use_embedding_function(research_index.HashingEmbeddingFunction())
+            for target in targets:
+                for level in levels:
+                    result = self._run_level(target, level, options)
+                    report["results"].append(result)
+                    self._print_result(result)
+
+        if options['json']:
+            with open(options['json'], 'w', encoding='utf-8') as handle:
+                json.dump(report, handle, indent=2)
+            self.stdout.write(f"[BENCHMARK] Report written to {options['json']}")
+
+        if options['baseline']:
+            self._compare(report, options['baseline'], options['max_regression'])
+
+    def _fixtures(self, target, level, count, same_fixture):
+        """Distinct team pairs per run, so caches and coalescing do not hide the work."""
+        if same_fixture:
+            return [("Bench Home", "Bench Away")] * count
+        return [(f"Bench {target} {level} {index} Home", f"Bench {target} {level} {index} Away") for index in range(count)]
+
+    def _run_level(self, target, level, options):
+        fixtures = self._fixtures(target, level, options['requests'], options['same_fixture'])
+        run_options = {key: options[key] for key in RUN_OPTIONS if options[key]}
+        logs = contextlib.nullcontext() if options['verbose'] else contextlib.redirect_stdout(io.StringIO())
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        with logs:
+            if target == "graph-async":
+                outcomes = asyncio.run(self._run_async(fixtures, level, run_options))
+            else:
+                run = self._run_graph if target == "graph" else self._run_view
+                with ThreadPoolExecutor(max_workers=level) as executor:
+                    outcomes = list(executor.map(lambda fixture: run(fixture, run_options), fixtures))
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        latencies = sorted(latency for latency, ok in outcomes if ok)
+        return {
+            "target": target,
+            "concurrency": level,
+            "requests": len(outcomes),
+            "errors": sum(1 for _, ok in outcomes if not ok),
+            "throughput_rps": round(len(outcomes) / elapsed, 3) if elapsed else 0.0,
+            "p50_ms": round(_percentile(latencies, 0.50) * 1000, 1),
+            "p95_ms": round(_percentile(latencies, 0.95) * 1000, 1),
+            "p99_ms": round(_percentile(latencies, 0.99) * 1000, 1),
+            "peak_memory_mb": round(peak / (1024 * 1024), 2),
+        }
+
+    @staticmethod
+    def _run_graph(fixture, run_options):
+        started = time.perf_counter()
+        try:
+            result = analysis_graph.invoke(build_initial_state(*fixture, **run_options))
+            ok = bool(result.get("final_analysis")) and not result["final_analysis"].startswith("Error")
+        except Exception:
+            ok = False
+        return time.perf_counter() - started, ok
+
+    @staticmethod
+    async def _run_async(fixtures, level, run_options):
+        semaphore = asyncio.Semaphore(level)
+
+        async def run(fixture):
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    result = await analysis_graph.ainvoke(build_initial_state(*fixture, **run_options))
+                    ok = bool(result.get("final_analysis")) and not result["final_analysis"].startswith("Error")
+                except Exception:
+                    ok = False
+                return time.perf_counter() - started, ok
+
+        return await asyncio.gather(*(run(fixture) for fixture in fixtures))
+
+    @staticmethod
+    def _run_view(fixture, run_options):
+        body = {"home_team": fixture[0], "away_team": fixture[1], **run_options}
+        request = APIRequestFactory().post('/api/analyze/', body, format='json')
+        started = time.perf_counter()
+        try:
+            ok = analyze_teams(request).status_code == 200
+        except Exception:
+            ok = False
+        return time.perf_counter() - started, ok
+
+    def _print_result(self, result):
+        self.stdout.write(
+            f"[BENCHMARK] {result['target']:<12} c={result['concurrency']:<3} "
+            f"n={result['requests']:<4} err={result['errors']:<3} "
+            f"{result['throughput_rps']:>7.2f} req/s  "
+            f"p50={result['p50_ms']:>8.0f}ms  p95={result['p95_ms']:>8.0f}ms  p99={result['p99_ms']:>8.0f}ms  "
+            f"peak={result['peak_memory_mb']:>7.2f}MB"
+        )
+
+    def _compare(self, report, baseline_path, max_regression):
+        """Raises CommandError if any target/level regressed beyond max_regression."""
+        with open(baseline_path, encoding='utf-8') as handle:
+            baseline = {
+                (result["target"], result["concurrency"]): result for result in json.load(handle)["results"]
+            }
+
+        regressions = []
+        for result in report["results"]:
+            previous = baseline.get((result["target"], result["concurrency"]))
+            if previous is None:
+                continue
+            if previous["p95_ms"] and result["p95_ms"] > previous["p95_ms"] * (1 + max_regression):
+                regressions.append(
+                    f"{result['target']} c={result['concurrency']}: p95 {previous['p95_ms']}ms -> {result['p95_ms']}ms"
+                )
+            if result["throughput_rps"] < previous["throughput_rps"] * (1 - max_regression):
+                regressions.append(
+                    f"{result['target']} c={result['concurrency']}: throughput "
+                    f"{previous['throughput_rps']} -> {result['throughput_rps']} req/s"
+                )
+            if result["errors"] > previous["errors"]:
+                regressions.append(
+                    f"{result['target']} c={result['concurrency']}: errors {previous['errors']} -> {result['errors']}"
+                )
+
+        if regressions:
+            raise CommandError("Performance regression against baseline:\n  " + "\n  ".join(regressions))
+        self.stdout.write(self.style.SUCCESS("[BENCHMARK] No regressions against baseline"))
@@ -0,0 +1,88 @@
+"""
+Pre-warms the analysis cache for upcoming fixtures.
+
+Usage:
+    python manage.py prewarm_fixtures fixtures.json --concurrency 2 --call-budget 200
+    python manage.py prewarm_fixtures fixtures.json --loop --interval 600
+
+Reads the fixtures from a saved Odds API response, analyzes every match
+that is new within the horizon or has passed a refresh point
+(--refresh-hours before kickoff), nearest kickoff first, and caches the
+result until shortly after kickoff. With --loop the file is re-read and
+the pass repeated every --interval seconds.
+"""
+
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from api.prewarm import PREWARM_HORIZON_HOURS, PREWARM_REFRESH_HOURS, due_fixtures, load_fixtures, prewarm
+
+
+class Command(BaseCommand):
+    help = "Analyzes upcoming fixtures ahead of kickoff so user requests hit the cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument('fixtures', help='JSON file with the Odds API fixtures')
+        parser.add_argument('--concurrency', type=int, default=2, help='Graph runs at once (default: 2)')
+        parser.add_argument('--max-runs', type=int, help='Maximum graph runs per pass (default: no limit)')
+        parser.add_argument('--call-budget', type=int,
+                            help='Maximum Tavily + Gemini calls per pass (default: no limit)')
+        parser.add_argument('--horizon-hours', type=float, default=PREWARM_HORIZON_HOURS,
+                            help=f'Only fixtures kicking off within this many hours (default: {PREWARM_HORIZON_HOURS:g})')
+        parser.add_argument('--refresh-hours', default=','.join(f"{hours:g}" for hours in PREWARM_REFRESH_HOURS),
+                            help='Comma-separated hours before kickoff to refresh at (default: %(default)s)')
+        parser.add_argument('--priority', choices=('low', 'normal', 'high'), default='normal',
+                            help='Run priority; below the users\' priority the cached tier will not serve them '
+                                 '(default: normal)')
+        parser.add_argument('--analyzer-mode', choices=('separate', 'combined'),
+                            help='Analyzer mode (default: ANALYZER_MODE)')
+        parser.add_argument('--loop', action='store_true', help='Repeat the pass every --interval seconds')
+        parser.add_argument('--interval', type=float, default=600.0,
+                            help='Seconds between passes with --loop (default: 600)')
+
+    def handle(self, *args, **options):
+        try:
+            refresh_hours = tuple(float(hours) for hours in options['refresh_hours'].split(',') if hours.strip())
+        except ValueError:
+            raise CommandError(f"Invalid --refresh-hours: {options['refresh_hours']}")
+        run_options = {key: options[key] for key in ('priority', 'analyzer_mode') if options[key]}
+
+        try:
+            while True:
+                self._pass(options, refresh_hours, run_options)
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write("[PREWARM] Stopped")
+
+    def _pass(self, options, refresh_hours, run_options):
+        close_old_connections()
+        try:
+            fixtures = load_fixtures(options['fixtures'])
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Cannot read fixtures: {str(e)}")
+
+        due = due_fixtures(fixtures, horizon_hours=options['horizon_hours'], refresh_hours=refresh_hours)
+        self.stdout.write(f"[PREWARM] {len(due)} of {len(fixtures)} fixture(s) due")
+        if not due:
+            return
+
+        reasons = {fixture["match_id"]: fixture["reason"] for fixture in due}
+        outcomes = prewarm(
+            due,
+            concurrency=options['concurrency'],
+            max_runs=options['max_runs'],
+            call_budget=options['call_budget'],
+            **run_options
+        )
+        for outcome in outcomes:
+            self.stdout.write(
+                f"[PREWARM] {outcome['match_id']} ({reasons[outcome['match_id']]}): "
+                f"{outcome['status']}, {outcome['upstream_calls']} upstream call(s)"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"[PREWARM] {sum(1 for outcome in outcomes if outcome['status'] == 'done')} analysis(es) warmed, "
+            f"{sum(outcome['upstream_calls'] for outcome in outcomes)} upstream call(s), "
+            f"{len(due) - len(outcomes)} deferred by the budget"
+        ))
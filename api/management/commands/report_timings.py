@@ -0,0 +1,47 @@
+"""
+Reports per-node latency and token usage of past analyses.
+
+Usage:
+    python manage.py report_timings --hours 24
+
+Reads the node_timings table that every analysis graph run appends to
+(see api/agent/timings.py), so the report covers all worker processes
+sharing the cache database.
+"""
+
+import json
+import time
+from django.core.management.base import BaseCommand
+from api.agent.timings import timing_store
+
+
+class Command(BaseCommand):
+    help = "Prints p50/p95 latency, upstream calls, tokens and cache hit ratio per graph node."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float, default=24.0,
+                            help='Only include node runs from the last N hours (default: 24, 0 for all)')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        since = time.time() - options['hours'] * 3600 if options['hours'] > 0 else None
+        summary = timing_store.summary(since)
+
+        if options['json']:
+            self.stdout.write(json.dumps(summary, indent=2))
+            return
+
+        if not summary:
+            self.stdout.write("[TIMINGS] No node timings recorded")
+            return
+
+        header = f"{'node':<18}{'runs':>7}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'calls':>7}{'in tok':>9}{'out tok':>9}{'cache':>7}"
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+        for node, row in sorted(summary.items(), key=lambda item: item[1]['p95_ms'], reverse=True):
+            ratio = row['cache_hit_ratio']
+            self.stdout.write(
+                f"{node:<18}{row['runs']:>7}{row['p50_ms']:>10.0f}{row['p95_ms']:>10.0f}{row['max_ms']:>10.0f}"
+                f"{row['upstream_calls']:>7.1f}{row['input_tokens']:>9.0f}{row['output_tokens']:>9.0f}"
+                f"{(f'{ratio:.0%}' if ratio is not None else '-'):>7}"
+            )
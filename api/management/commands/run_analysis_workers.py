@@ -0,0 +1,76 @@
+"""
+Runs a pool of background analysis workers.
+
+Usage:
+    python manage.py run_analysis_workers --workers 4
+
+Each worker thread claims queued AnalysisJob rows and runs them through
+the analysis graph. Start the command on as many hosts/processes as
+needed; jobs are claimed atomically, so workers never share a job.
+"""
+
+import os
+import socket
+import threading
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from api.jobs import claim_next_job, requeue_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = "Drains the background analysis job queue with a pool of worker threads."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Number of worker threads (default: 2)')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait when the queue is empty (default: 1.0)')
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        poll_interval = options['poll_interval']
+        stop = threading.Event()
+        prefix = f"{socket.gethostname()}:{os.getpid()}"
+
+        requeued = requeue_stale_jobs()
+        if requeued:
+            self.stdout.write(f"[WORKERS] Requeued {requeued} stale job(s)")
+
+        threads = [
+            threading.Thread(
+                target=self._work,
+                args=(f"{prefix}:{index}", poll_interval, stop),
+                name=f"analysis-worker-{index}",
+                daemon=True
+            )
+            for index in range(workers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        self.stdout.write(self.style.SUCCESS(f"[WORKERS] {workers} analysis worker(s) started"))
+        try:
+            while any(thread.is_alive() for thread in threads):
+                time.sleep(poll_interval)
+                requeue_stale_jobs()
+        except KeyboardInterrupt:
+            self.stdout.write("[WORKERS] Stopping after current jobs...")
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+    def _work(self, worker_id, poll_interval, stop):
+        """Claims and runs jobs until stop is set."""
+        try:
+            while not stop.is_set():
+                close_old_connections()
+                job = claim_next_job(worker_id)
+                if job is None:
+                    stop.wait(poll_interval)
+                    continue
+
+                self.stdout.write(f"[{worker_id}] Running job {job.pk}")
+                run_job(job)
+                self.stdout.write(f"[{worker_id}] Job {job.pk}: {job.status}")
+        finally:
+            connection.close()
@@ -0,0 +1,76 @@
+"""
+Response Compression
+
+Compresses large JSON responses with brotli (when the brotli package is
+installed and the client accepts it) or gzip. Small bodies, streaming
+responses (the SSE endpoint must flush every event) and responses that
+are already encoded are left alone.
+"""
+
+import gzip
+import os
+import re
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip only
+    brotli = None
+
+
+# Bodies smaller than this are sent uncompressed (the headers would eat the gain)
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+
+_ENCODING_RE = re.compile(r"\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*$")
+
+
+def _accepted_encodings(header):
+    """Returns the content codings an Accept-Encoding header allows (q > 0)."""
+    accepted = set()
+    for item in header.split(","):
+        match = _ENCODING_RE.match(item)
+        if not match:
+            continue
+        try:
+            quality = float(match.group(2)) if match.group(2) else 1.0
+        except ValueError:
+            continue
+        if quality > 0:
+            accepted.add(match.group(1).lower())
+    return accepted
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Brotli / gzip compression for responses of at least COMPRESS_MIN_BYTES.
+
+    Like Django's GZipMiddleware, a strong ETag is made weak on compressed
+    responses, so conditional requests still match.
+    """
+
+    def process_response(self, request, response):
+        if response.streaming or response.has_header("Content-Encoding"):
+            return response
+        if len(response.content) < COMPRESS_MIN_BYTES:
+            return response
+        # From here on the body depends on Accept-Encoding, even when sent as is
+        patch_vary_headers(response, ("Accept-Encoding",))
+
+        accepted = _accepted_encodings(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if brotli is not None and "br" in accepted:
+            encoding, compressed = "br", brotli.compress(response.content, quality=5)
+        elif "gzip" in accepted:
+            encoding, compressed = "gzip", gzip.compress(response.content, compresslevel=6, mtime=0)
+        else:
+            return response
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response["Content-Length"] = str(len(compressed))
+        response["Content-Encoding"] = encoding
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        return response
@@ -0,0 +1,73 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Match',
+            fields=[
+                ('id', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('sport_key', models.CharField(blank=True, default='', max_length=64)),
+                ('home_team', models.CharField(max_length=128)),
+                ('away_team', models.CharField(max_length=128)),
+                ('home_team_id', models.CharField(max_length=128)),
+                ('away_team_id', models.CharField(max_length=128)),
+                ('commence_time', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['commence_time'],
+                'indexes': [
+                    models.Index(fields=['commence_time'], name='api_match_commence_idx'),
+                    models.Index(fields=['home_team_id', 'commence_time'], name='api_match_home_commence_idx'),
+                    models.Index(fields=['away_team_id', 'commence_time'], name='api_match_away_commence_idx'),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name='TeamFormSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('team_id', models.CharField(max_length=128)),
+                ('team_name', models.CharField(max_length=128)),
+                ('stats', models.JSONField()),
+                ('parser_path', models.CharField(blank=True, default='', max_length=16)),
+                ('captured_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-captured_at'],
+                'indexes': [models.Index(fields=['team_id', '-captured_at'], name='api_form_team_captured_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='Analysis',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('team1', models.CharField(max_length=128)),
+                ('team2', models.CharField(max_length=128)),
+                ('team1_id', models.CharField(max_length=128)),
+                ('team2_id', models.CharField(max_length=128)),
+                ('sport_key', models.CharField(blank=True, default='', max_length=64)),
+                ('commence_time', models.DateTimeField(blank=True, null=True)),
+                ('result', models.JSONField()),
+                ('aggregator_tier', models.CharField(blank=True, default='', max_length=16)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('match', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='analyses', to='api.match')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [
+                    models.Index(fields=['match', '-created_at'], name='api_analysis_match_idx'),
+                    models.Index(fields=['team1_id', 'team2_id', 'commence_time'], name='api_analysis_teams_idx'),
+                    models.Index(fields=['commence_time'], name='api_analysis_commence_idx'),
+                ],
+            },
+        ),
+    ]
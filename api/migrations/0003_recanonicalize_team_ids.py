@@ -0,0 +1,83 @@
+import re
+import unicodedata
+
+from django.db import migrations
+
+
+# Frozen copy of api.agent.teams as of this migration, so later changes to
+# the live normalization or alias table do not change what it computes.
+# Aliases from TEAM_ALIASES_PATH are not applied here.
+CLUB_AFFIXES = frozenset({"fc", "cf", "afc", "sc", "fk", "sk"})
+
+TEAM_ALIASES = {
+    "Turkey": ["Türkiye", "Turkiye"],
+    "Czech Republic": ["Czechia"],
+    "United States": ["USA", "United States of America", "USMNT"],
+    "South Korea": ["Korea Republic"],
+    "Ivory Coast": ["Côte d'Ivoire", "Cote d'Ivoire"],
+    "Manchester United": ["Man United", "Man Utd"],
+    "Manchester City": ["Man City"],
+    "Tottenham Hotspur": ["Tottenham", "Spurs"],
+    "Wolverhampton Wanderers": ["Wolves"],
+    "Inter Milan": ["Internazionale"],
+    "Paris Saint-Germain": ["PSG", "Paris SG"],
+    "Bayern Munich": ["Bayern München", "FC Bayern"],
+}
+
+_NON_WORD_RE = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def _fold(text):
+    normalized = unicodedata.normalize("NFKD", text or "")
+    return " ".join("".join(ch for ch in normalized if not unicodedata.combining(ch)).lower().split())
+
+
+def _normalize(name):
+    words = _NON_WORD_RE.sub(" ", _fold(name).replace(".", "")).split()
+    while len(words) > 1 and words[0] in CLUB_AFFIXES:
+        words.pop(0)
+    while len(words) > 1 and words[-1] in CLUB_AFFIXES:
+        words.pop()
+    return " ".join(words)
+
+
+_ALIAS_INDEX = {}
+for _canonical, _names in TEAM_ALIASES.items():
+    _ALIAS_INDEX[_normalize(_canonical)] = _normalize(_canonical)
+    for _name in _names:
+        _ALIAS_INDEX[_normalize(_name)] = _normalize(_canonical)
+
+
+def canonical_team_id(name):
+    normalized = _normalize(name)
+    return _ALIAS_INDEX.get(normalized, normalized)
+
+
+def recanonicalize_team_ids(apps, schema_editor):
+    """Recomputes stored team ids with the alias-aware canonical_team_id."""
+    Match = apps.get_model('api', 'Match')
+    Analysis = apps.get_model('api', 'Analysis')
+    TeamFormSnapshot = apps.get_model('api', 'TeamFormSnapshot')
+
+    for match in Match.objects.all().iterator():
+        match.home_team_id = canonical_team_id(match.home_team)
+        match.away_team_id = canonical_team_id(match.away_team)
+        match.save(update_fields=['home_team_id', 'away_team_id'])
+    for analysis in Analysis.objects.all().iterator():
+        analysis.team1_id = canonical_team_id(analysis.team1)
+        analysis.team2_id = canonical_team_id(analysis.team2)
+        analysis.save(update_fields=['team1_id', 'team2_id'])
+    for snapshot in TeamFormSnapshot.objects.all().iterator():
+        snapshot.team_id = canonical_team_id(snapshot.team_name)
+        snapshot.save(update_fields=['team_id'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_match_teamformsnapshot_analysis'),
+    ]
+
+    operations = [
+        migrations.RunPython(recanonicalize_team_ids, migrations.RunPython.noop),
+    ]
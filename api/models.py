@@ -1,3 +1,125 @@
+import uuid
 from django.db import models
 
-# Create your models here.
+
+class AnalysisJob(models.Model):
+    """
+    A queued analysis run for the background job mode.
+    
+    Jobs are submitted by the analyze_jobs view and drained by the
+    run_analysis_workers management command. The finished graph state
+    is stored in result so the status view can build the same payload
+    analyze_teams returns.
+    """
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    match = models.JSONField()  # Parsed match: team1, team2, match_id, sport_key, commence_time
+    result = models.JSONField(null=True, blank=True)  # Final graph state once done
+    error = models.TextField(blank=True, default='')
+    attempts = models.PositiveIntegerField(default=0)
+    worker = models.CharField(max_length=64, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='api_job_status_created_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.match.get('team1')} vs {self.match.get('team2')} ({self.status})"
+
+
+class Match(models.Model):
+    """
+    A fixture from The Odds API, keyed by its match id.
+    
+    Team ids are the canonical ids from api.agent.teams, so lookups by
+    team hit regardless of how the name was spelled in the request.
+    """
+    id = models.CharField(primary_key=True, max_length=64)  # The Odds API match id
+    sport_key = models.CharField(max_length=64, blank=True, default='')
+    home_team = models.CharField(max_length=128)
+    away_team = models.CharField(max_length=128)
+    home_team_id = models.CharField(max_length=128)
+    away_team_id = models.CharField(max_length=128)
+    commence_time = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['commence_time']
+        indexes = [
+            models.Index(fields=['commence_time'], name='api_match_commence_idx'),
+            models.Index(fields=['home_team_id', 'commence_time'], name='api_match_home_commence_idx'),
+            models.Index(fields=['away_team_id', 'commence_time'], name='api_match_away_commence_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.home_team} vs {self.away_team} ({self.commence_time})"
+
+
+class TeamFormSnapshot(models.Model):
+    """
+    Parsed recent form of a team (the team1_stats / team2_stats of an
+    analysis) at the time the analysis ran.
+    """
+    team_id = models.CharField(max_length=128)  # Canonical team id
+    team_name = models.CharField(max_length=128)
+    stats = models.JSONField()  # recent_matches, form, goals, ... as returned by the parser
+    parser_path = models.CharField(max_length=16, blank=True, default='')  # "rules" or "llm"
+    captured_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-captured_at']
+        indexes = [
+            models.Index(fields=['team_id', '-captured_at'], name='api_form_team_captured_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.team_name} form ({self.captured_at})"
+
+
+class Analysis(models.Model):
+    """
+    A completed match analysis.
+    
+    result holds the graph state fields the analyze_teams payload is
+    built from (see api.agent.runner.STORED_FIELDS), so a stored analysis can
+    be served without running the graph. Analyses of requests without an
+    Odds API id have no match and are found by team ids and kickoff.
+    """
+    match = models.ForeignKey(Match, null=True, blank=True, on_delete=models.CASCADE, related_name='analyses')
+    team1 = models.CharField(max_length=128)
+    team2 = models.CharField(max_length=128)
+    team1_id = models.CharField(max_length=128)
+    team2_id = models.CharField(max_length=128)
+    sport_key = models.CharField(max_length=64, blank=True, default='')
+    commence_time = models.DateTimeField(null=True, blank=True)
+    result = models.JSONField()
+    aggregator_tier = models.CharField(max_length=16, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['match', '-created_at'], name='api_analysis_match_idx'),
+            models.Index(fields=['team1_id', 'team2_id', 'commence_time'], name='api_analysis_teams_idx'),
+            models.Index(fields=['commence_time'], name='api_analysis_commence_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.team1} vs {self.team2} ({self.created_at})"
@@ -0,0 +1,182 @@
+"""
+Fixture Pre-warming
+
+Pre-computes analyses for upcoming fixtures so the users arriving in
+the hours before kickoff hit the analysis cache instead of waiting for
+a cold graph run.
+
+Every fixture is analyzed once it enters the horizon and again at each
+refresh point before kickoff (e.g. 24h, 6h and 1h before), so the cached
+analysis reflects late team news. Due fixtures run nearest kickoff first,
+within a concurrency limit and a per-pass budget of graph runs and
+upstream (Tavily / Gemini) calls. Fresh analyses are cached until
+shortly after kickoff and stored in the database like any other run.
+"""
+
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta, timezone as dt_timezone
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .agent.runner import refresh_analysis
+from .models import Analysis
+from .store import store_result
+
+
+# Hours before kickoff at which a fixture's analysis is refreshed
+PREWARM_REFRESH_HOURS = tuple(
+    float(hours) for hours in os.getenv("PREWARM_REFRESH_HOURS", "24,6,1").split(",") if hours.strip()
+)
+
+# Fixtures further away than this are not pre-warmed yet
+PREWARM_HORIZON_HOURS = float(os.getenv("PREWARM_HORIZON_HOURS", "48"))
+
+# A pre-warmed analysis stays cached until this long after kickoff
+PREWARM_KICKOFF_GRACE = timedelta(hours=float(os.getenv("PREWARM_KICKOFF_GRACE_HOURS", "2")))
+
+
+def load_fixtures(path):
+    """
+    Reads an Odds API fixture list from a JSON file.
+
+    Accepts the /odds or /events response (a list of matches) or
+    {"matches": [...]}. Entries without an id, both teams or a valid
+    commence_time are skipped.
+
+    Returns:
+        Fixtures as dicts with team1, team2, match_id, sport_key,
+        commence_time (ISO string) and kickoff (aware datetime)
+    """
+    with open(path, encoding='utf-8') as handle:
+        data = json.load(handle)
+    if isinstance(data, dict):
+        data = data.get('matches') or []
+
+    fixtures = []
+    for item in data:
+        if not isinstance(item, dict):
+            continue
+        try:
+            kickoff = parse_datetime(item.get('commence_time') or '')
+        except (TypeError, ValueError):
+            continue
+        if not (item.get('id') and item.get('home_team') and item.get('away_team') and kickoff):
+            continue
+        if timezone.is_naive(kickoff):
+            kickoff = kickoff.replace(tzinfo=dt_timezone.utc)
+        fixtures.append({
+            "team1": item['home_team'],
+            "team2": item['away_team'],
+            "match_id": item['id'],
+            "sport_key": item.get('sport_key'),
+            "commence_time": item['commence_time'],
+            "kickoff": kickoff,
+        })
+    return fixtures
+
+
+def _last_analyzed(match_ids):
+    """Returns match id -> time of its newest stored analysis (one indexed query)."""
+    rows = (
+        Analysis.objects.filter(match_id__in=match_ids)
+        .values('match_id').annotate(last=Max('created_at'))
+    )
+    return {row['match_id']: row['last'] for row in rows}
+
+
+def due_fixtures(fixtures, now=None, horizon_hours=PREWARM_HORIZON_HOURS, refresh_hours=PREWARM_REFRESH_HOURS):
+    """
+    Picks the fixtures whose analysis is missing or older than their
+    latest passed refresh point, nearest kickoff first.
+
+    Args:
+        fixtures: Fixtures from load_fixtures()
+        now: Current time (default: timezone.now())
+        horizon_hours: Only fixtures kicking off within this many hours
+        refresh_hours: Hours before kickoff at which to refresh
+
+    Returns:
+        Due fixtures sorted by kickoff, each with a "reason"
+        ("new" or "refresh <N>h")
+    """
+    now = now or timezone.now()
+    upcoming = [
+        fixture for fixture in fixtures
+        if now < fixture["kickoff"] <= now + timedelta(hours=horizon_hours)
+    ]
+    last_analyzed = _last_analyzed([fixture["match_id"] for fixture in upcoming])
+
+    due = []
+    for fixture in sorted(upcoming, key=lambda fixture: fixture["kickoff"]):
+        last = last_analyzed.get(fixture["match_id"])
+        if last is None:
+            due.append({**fixture, "reason": "new"})
+            continue
+        # Latest refresh point already reached (hours are counted back from kickoff)
+        passed = [hours for hours in refresh_hours if fixture["kickoff"] - timedelta(hours=hours) <= now]
+        if passed and last < fixture["kickoff"] - timedelta(hours=min(passed)):
+            due.append({**fixture, "reason": f"refresh {min(passed):g}h"})
+    return due
+
+
+def prewarm(fixtures, concurrency=2, max_runs=None, call_budget=None, now=None, **options):
+    """
+    Runs the due fixtures through the analysis graph.
+
+    No new run starts once max_runs graph runs have started or the
+    finished runs have used call_budget upstream calls, so the budget can
+    be overshot by at most the runs already in flight.
+
+    Args:
+        fixtures: Due fixtures from due_fixtures(), in priority order
+        concurrency: Maximum graph runs at once
+        max_runs: Maximum graph runs in this pass (None: no limit)
+        call_budget: Maximum Tavily + Gemini calls in this pass (None: no limit)
+        now: Current time used for the cache lifetimes (default: timezone.now())
+        **options: Run options for refresh_analysis (e.g. priority)
+
+    Returns:
+        One outcome per started fixture: {"match_id", "status", "upstream_calls"}
+        with status "done", "skipped" (running elsewhere) or "failed: ..."
+    """
+    now = now or timezone.now()
+    lock = threading.Lock()
+    usage = {"started": 0, "calls": 0}
+
+    def within_budget():
+        with lock:
+            if max_runs is not None and usage["started"] >= max_runs:
+                return False
+            if call_budget is not None and usage["calls"] >= call_budget:
+                return False
+            usage["started"] += 1
+            return True
+
+    def run(fixture):
+        if not within_budget():
+            return None
+        ttl = (fixture["kickoff"] + PREWARM_KICKOFF_GRACE - now).total_seconds()
+        try:
+            result = refresh_analysis(
+                fixture["team1"], fixture["team2"], fixture["match_id"], fixture["commence_time"], ttl, **options
+            )
+            if result is None:
+                return {"match_id": fixture["match_id"], "status": "skipped", "upstream_calls": 0}
+            calls = result["timings"]["totals"]["upstream_calls"]
+            with lock:
+                usage["calls"] += calls
+            store_result(fixture, result)
+            return {"match_id": fixture["match_id"], "status": "done", "upstream_calls": calls}
+        except Exception as e:
+            print(f"[ERROR] Pre-warming {fixture['team1']} vs {fixture['team2']} failed: {str(e)}")
+            return {"match_id": fixture["match_id"], "status": f"failed: {str(e)}", "upstream_calls": 0}
+        finally:
+            connection.close()
+
+    # Threads pick fixtures in order, so the nearest kickoffs start first
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        return [outcome for outcome in executor.map(run, fixtures) if outcome is not None]
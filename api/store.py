@@ -0,0 +1,130 @@
+"""
+Analysis Store
+
+Persists completed analyses in the database (Match, Analysis and
+TeamFormSnapshot) so a match that was already analyzed can be served
+with one indexed read (the stored_analysis view) instead of a graph run.
+
+Only fresh graph runs are stored; cache hits and runs shared with a
+concurrent request were stored by the request that ran the graph.
+"""
+
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+from .agent.runner import stored_result
+from .agent.team_form import is_valid_team_stats
+from .agent.teams import canonical_team_id
+from .models import Analysis, Match, TeamFormSnapshot
+
+
+def _commence_time(value):
+    """Parses an ISO 8601 kickoff time; None if missing or invalid."""
+    if not value:
+        return None
+    try:
+        return parse_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def should_store(result):
+    """True for finished fresh graph runs with a real final prediction."""
+    timings = result.get("timings") or {}
+    final_analysis = result.get("final_analysis") or ""
+    return timings.get("analysis_cache", "miss") == "miss" and bool(final_analysis) and not final_analysis.startswith("Error")
+
+
+@transaction.atomic
+def save_analysis(match, result):
+    """
+    Stores a completed analysis with its match and team form snapshots.
+
+    Args:
+        match: Parsed match (team1, team2, match_id, sport_key, commence_time)
+        result: Final graph state
+
+    Returns:
+        The created Analysis
+    """
+    commence_time = _commence_time(match.get("commence_time"))
+    team1_id = canonical_team_id(match["team1"])
+    team2_id = canonical_team_id(match["team2"])
+
+    stored_match = None
+    if match.get("match_id"):
+        stored_match, _ = Match.objects.update_or_create(
+            id=match["match_id"],
+            defaults={
+                "sport_key": match.get("sport_key") or '',
+                "home_team": match["team1"],
+                "away_team": match["team2"],
+                "home_team_id": team1_id,
+                "away_team_id": team2_id,
+                "commence_time": commence_time,
+            }
+        )
+
+    parser_path = result.get("parser_path") or ''
+    TeamFormSnapshot.objects.bulk_create([
+        TeamFormSnapshot(team_id=canonical_team_id(team), team_name=team, stats=stats, parser_path=parser_path)
+        for team, stats in ((match["team1"], result.get("team1_stats")), (match["team2"], result.get("team2_stats")))
+        if is_valid_team_stats(stats)
+    ])
+
+    return Analysis.objects.create(
+        match=stored_match,
+        team1=match["team1"],
+        team2=match["team2"],
+        team1_id=team1_id,
+        team2_id=team2_id,
+        sport_key=match.get("sport_key") or '',
+        commence_time=commence_time,
+        result=stored_result(result),
+        aggregator_tier=(result.get("aggregator_route") or {}).get("tier") or '',
+    )
+
+
+def store_result(match, result):
+    """
+    Stores the analysis if it is a fresh run (see should_store).
+
+    Database errors are logged and never fail the request that produced
+    the analysis.
+    """
+    if not should_store(result):
+        return None
+    try:
+        return save_analysis(match, result)
+    except Exception as e:  # The analysis itself succeeded; storing it is best effort
+        print(f"[WARNING] Storing analysis for {match['team1']} vs {match['team2']} failed: {str(e)}")
+        return None
+
+
+def latest_analysis(match_id=None, team1=None, team2=None, commence_time=None):
+    """
+    Returns the newest stored analysis of a match, or None.
+
+    Looks up by Odds API match id when given, otherwise by the canonical
+    (home, away) team ids and, if given, the kickoff time. The result JSON
+    is loaded on first access, so a conditional GET answered with 304
+    never reads it.
+    """
+    if match_id:
+        return Analysis.objects.filter(match_id=match_id).defer('result').order_by('-created_at').first()
+
+    analyses = Analysis.objects.defer('result').filter(team1_id=canonical_team_id(team1), team2_id=canonical_team_id(team2))
+    kickoff = _commence_time(commence_time)
+    if kickoff is not None:
+        analyses = analyses.filter(commence_time=kickoff)
+    return analyses.order_by('-created_at').first()
+
+
+def stored_match(analysis):
+    """Rebuilds the parsed match dict of a stored analysis (for _build_response)."""
+    return {
+        "team1": analysis.team1,
+        "team2": analysis.team2,
+        "match_id": analysis.match_id,
+        "sport_key": analysis.sport_key or None,
+        "commence_time": analysis.commence_time.isoformat().replace('+00:00', 'Z') if analysis.commence_time else None,
+    }
@@ -0,0 +1,63 @@
+from django.test import SimpleTestCase
+
+from api.agent.aggregator import _predicted_goals, _predicted_score, _predicted_winner, route_aggregator
+
+
+def _state(winner, score, goals, **options):
+    return {
+        "team1": "Turkey",
+        "team2": "Spain",
+        "winner_analysis": winner,
+        "score_analysis": score,
+        "goals_analysis": goals,
+        "aggregator_tier": "auto",
+        **options,
+    }
+
+
+AGREEING = ("Turkey wird gewinnen.", "Ergebnis: Turkey 2-1 Spain", "Erwartete Tore: 2-3")
+CONFLICTING = ("Spain wird gewinnen.", "Ergebnis: Turkey 2-1 Spain", "Erwartete Tore: 2-3")
+
+
+class PredictionParsingTests(SimpleTestCase):
+
+    def test_predicted_winner(self):
+        self.assertEqual(_predicted_winner("Turkey wird gewinnen.", "Turkey", "Spain"), "1")
+        self.assertEqual(_predicted_winner("Spain wird gewinnen.", "Turkey", "Spain"), "2")
+        self.assertEqual(_predicted_winner("Prognose: Unentschieden.", "Turkey", "Spain"), "X")
+        self.assertIsNone(_predicted_winner("Keine Prognose.", "Turkey", "Spain"))
+
+    def test_predicted_winner_ignores_earlier_draws(self):
+        text = "Die letzten Duelle endeten unentschieden. Turkey wird gewinnen."
+        self.assertEqual(_predicted_winner(text, "Turkey", "Spain"), "1")
+
+    def test_predicted_score(self):
+        self.assertEqual(_predicted_score("Ergebnis: Turkey 2-1 Spain", "Turkey", "Spain"), (2, 1))
+        self.assertEqual(_predicted_score("Ergebnis: Spain 2-1 Turkey", "Turkey", "Spain"), (1, 2))
+        self.assertEqual(_predicted_score("Ergebnis: 0:0", "Turkey", "Spain"), (0, 0))
+        self.assertIsNone(_predicted_score("Kein Ergebnis.", "Turkey", "Spain"))
+
+    def test_predicted_goals(self):
+        self.assertEqual(_predicted_goals("Erwartete Tore: Über 2.5"), (2.5, float("inf")))
+        self.assertEqual(_predicted_goals("Erwartete Tore: Unter 3,5"), (0.0, 3.5))
+        self.assertEqual(_predicted_goals("Erwartete Tore: 2-3"), (2.0, 3.0))
+        self.assertEqual(_predicted_goals("Erwartete Tore: 3+"), (3.0, float("inf")))
+        self.assertIsNone(_predicted_goals("Erwartete Tore: Über/Unter 2.5"))
+        self.assertIsNone(_predicted_goals("Keine Angabe"))
+
+
+class RouteAggregatorTests(SimpleTestCase):
+
+    def test_agreement_routes_by_priority(self):
+        self.assertEqual(route_aggregator(_state(*AGREEING, priority="low"))["tier"], "template")
+        self.assertEqual(route_aggregator(_state(*AGREEING, priority="normal"))["tier"], "fast")
+        self.assertEqual(route_aggregator(_state(*AGREEING, priority="high"))["tier"], "fast")
+
+    def test_conflict_routes_to_thinking(self):
+        route = route_aggregator(_state(*CONFLICTING, priority="low"))
+        self.assertEqual((route["tier"], route["reason"]), ("thinking", "conflict"))
+        self.assertEqual(route["agreement"]["conflicts"], ["winner/score"])
+
+    def test_requested_tier_wins(self):
+        route = route_aggregator(_state(*AGREEING, aggregator_tier="thinking"))
+        self.assertEqual((route["tier"], route["reason"]), ("thinking", "requested"))
@@ -0,0 +1,64 @@
+import json
+import os
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from api.agent import analyzers
+from api.agent.analyzers import analyze_combined, resolve_analyzer_mode
+
+
+STATE = {"team1": "Turkey", "team2": "Spain", "research_data": "Turkey 6-1 Bulgaria on 2025-10-11."}
+
+ANALYSES = {
+    "goals_analysis": "Over 2.5 goals.",
+    "winner_analysis": "Spain to win.",
+    "score_analysis": "Predicted score: Turkey 1-2 Spain",
+}
+
+
+@mock.patch.dict(os.environ, {"GOOGLE_API_KEY": "test"})
+@mock.patch.object(analyzers, "get_llm")
+@mock.patch.object(analyzers, "invoke_llm")
+class CombinedAnalyzerTests(SimpleTestCase):
+
+    def _run(self, invoke_llm, content):
+        invoke_llm.return_value = mock.Mock(content=content)
+        return analyze_combined(STATE)
+
+    def test_json_response(self, invoke_llm, get_llm):
+        self.assertEqual(self._run(invoke_llm, json.dumps(ANALYSES)), ANALYSES)
+
+    def test_json_in_code_block(self, invoke_llm, get_llm):
+        content = f"Here you go:\n```json\n{json.dumps(ANALYSES, ensure_ascii=False)}\n```"
+        self.assertEqual(self._run(invoke_llm, content), ANALYSES)
+
+    def test_invalid_json_fills_every_analysis_with_the_error(self, invoke_llm, get_llm):
+        update = self._run(invoke_llm, "Spain should win this one 2-1.")
+        self.assertEqual(set(update), set(ANALYSES))
+        self.assertEqual(len(set(update.values())), 1)
+        self.assertTrue(update["score_analysis"].startswith("Error in combined analysis:"))
+
+    def test_missing_analysis_is_an_error(self, invoke_llm, get_llm):
+        update = self._run(invoke_llm, json.dumps({**ANALYSES, "winner_analysis": " "}))
+        self.assertIn("has no winner_analysis", update["goals_analysis"])
+
+    def test_without_api_key(self, invoke_llm, get_llm):
+        with mock.patch.dict(os.environ, {"GOOGLE_API_KEY": ""}):
+            update = analyze_combined(STATE)
+        self.assertEqual(update["winner_analysis"], "Error: Google API key not configured.")
+        invoke_llm.assert_not_called()
+
+
+class AnalyzerModeTests(SimpleTestCase):
+
+    def test_resolves_requested_mode(self):
+        self.assertEqual(resolve_analyzer_mode(" Combined "), "combined")
+
+    @mock.patch.object(analyzers, "ANALYZER_MODE", "separate")
+    def test_defaults_to_configured_mode(self):
+        self.assertEqual(resolve_analyzer_mode(None), "separate")
+
+    def test_rejects_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            resolve_analyzer_mode("ensemble")
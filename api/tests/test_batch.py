@@ -0,0 +1,106 @@
+import asyncio
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+
+from api.agent import runner, tools
+from api.agent.scheduler import current_lane
+
+
+def _fake_analysis(team1, team2, match_id=None, commence_time=None, **options):
+    if team1 == "Broken":
+        raise RuntimeError("upstream down")
+    return {"final_analysis": f"{team1}-{team2}", "lane": current_lane(), **options}
+
+
+class RunBatchTests(SimpleTestCase):
+
+    def test_results_in_input_order_and_failures_isolated(self):
+        matches = [
+            {"team1": "Turkey", "team2": "Spain", "match_id": "a"},
+            {"team1": "Broken", "team2": "Spain", "match_id": "b"},
+            {"team1": "Georgia", "team2": "Bulgaria", "match_id": "c", "priority": "low"},
+        ]
+        with mock.patch.object(runner, "run_analysis", side_effect=_fake_analysis):
+            outcomes = runner.run_batch(matches, max_concurrency=2)
+
+        self.assertEqual(outcomes[0]["result"]["final_analysis"], "Turkey-Spain")
+        self.assertEqual(outcomes[1], {"error": "upstream down"})
+        self.assertEqual(outcomes[2]["result"]["priority"], "low")
+        # Batch upstream calls queue behind interactive ones
+        self.assertEqual({outcome["result"]["lane"] for outcome in (outcomes[0], outcomes[2])}, {"batch"})
+
+    def test_empty_batch(self):
+        self.assertEqual(runner.run_batch([]), [])
+
+
+class FakeAsyncTavily:
+    """Counts searches; each takes long enough for concurrent callers to overlap."""
+
+    def __init__(self):
+        self.queries = []
+
+    async def search(self, query, **params):
+        self.queries.append(query)
+        await asyncio.sleep(0.05)
+        return {"results": [{"title": "Form", "url": "https://example.com/form", "content": query}]}
+
+
+async def _direct_upstream(upstream, afunc):
+    return await afunc(mock.MagicMock())
+
+
+class SharedAsyncSearchTests(SimpleTestCase):
+
+    @mock.patch.object(tools, "_store_fetched")
+    @mock.patch.object(tools, "_indexed_results", return_value=None)
+    @mock.patch.object(tools, "_cached_results", return_value=None)
+    @mock.patch.object(tools, "acall_upstream", side_effect=_direct_upstream)
+    def test_fixtures_sharing_a_team_share_its_form_search(self, *mocks):
+        tavily = FakeAsyncTavily()
+        # Turkey plays in both fixtures: its form search runs once
+        searches = tools._build_searches("Turkey", "Spain")[1:] + tools._build_searches("Türkiye", "Georgia")[1:]
+
+        async def run_all():
+            return await asyncio.gather(*(tools._arun_search(tavily, search) for search in searches))
+
+        results = asyncio.run(run_all())
+        self.assertEqual(len(tavily.queries), 3)
+        self.assertEqual(results[0], results[2])
+
+
+class AnalyzeBatchViewTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def _post(self, body):
+        def outcomes(matches, max_concurrency):
+            return [{"result": {"final_analysis": match["team1"]}} for match in matches]
+
+        with mock.patch("api.views.run_batch", side_effect=outcomes), mock.patch("api.views.store_result"):
+            return self.client.post("/api/analyze/batch/", body, format="json")
+
+    def test_invalid_item_does_not_abort_the_batch(self):
+        response = self._post({"matches": [
+            {"id": "a", "home_team": "Turkey", "away_team": "Spain"},
+            {"id": "b", "home_team": "Georgia", "away_team": "Bulgaria", "aggregator_tier": "bogus"},
+            {"id": "c", "home_team": "Turkey"},
+        ]})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertTrue(results[0]["success"])
+        self.assertEqual(results[0]["analysis"]["final_analysis"], "Turkey")
+        self.assertEqual(results[1]["match_id"], "b")
+        self.assertFalse(results[1]["success"])
+        self.assertIn("aggregator_tier", results[1]["error"])
+        self.assertFalse(results[2]["success"])
+        self.assertEqual((response.json()["succeeded"], response.json()["failed"]), (1, 2))
+
+    def test_invalid_batch_options_are_rejected(self):
+        response = self._post({"aggregator_tier": "bogus", "matches": [{"home_team": "Turkey", "away_team": "Spain"}]})
+        self.assertEqual(response.status_code, 400)
+
+    def test_empty_list_is_rejected(self):
+        self.assertEqual(self._post({"matches": []}).status_code, 400)
@@ -0,0 +1,160 @@
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from api.agent import runner
+from api.agent.cache import PersistentCache, SingleFlight, make_cache_key
+
+
+class CacheTestCase(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "cache.sqlite3")
+
+    def _cache(self, namespace="tavily", ttl=60, max_entries=10):
+        return PersistentCache(namespace, ttl, max_entries, path=self.path)
+
+
+class PersistentCacheTests(CacheTestCase):
+
+    def test_round_trip_across_instances(self):
+        self._cache().set("key", {"results": ["Türkiye 6-1 Bulgaria"]})
+        self.assertEqual(self._cache().get("key"), {"results": ["Türkiye 6-1 Bulgaria"]})
+
+    def test_namespaces_are_separate(self):
+        self._cache("tavily").set("key", 1)
+        self.assertIsNone(self._cache("analysis").get("key"))
+
+    def test_entries_expire(self):
+        cache = self._cache(ttl=60)
+        with mock.patch("api.agent.cache.time.time", return_value=1000.0):
+            cache.set("default", 1)
+            cache.set("short", 2, ttl=5)
+        with mock.patch("api.agent.cache.time.time", return_value=1010.0):
+            self.assertEqual(cache.get("default"), 1)
+            self.assertIsNone(cache.get("short"))
+        with mock.patch("api.agent.cache.time.time", return_value=1061.0):
+            self.assertIsNone(cache.get("default"))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = self._cache(max_entries=2)
+        for now, key in ((1.0, "a"), (2.0, "b")):
+            with mock.patch("api.agent.cache.time.time", return_value=now):
+                cache.set(key, key)
+        with mock.patch("api.agent.cache.time.time", return_value=3.0):
+            cache.get("a")  # "b" is now the least recently used
+        with mock.patch("api.agent.cache.time.time", return_value=4.0):
+            cache.set("c", "c")
+            self.assertEqual((cache.get("a"), cache.get("b"), cache.get("c")), ("a", None, "c"))
+
+    def test_disabled_cache(self):
+        cache = self._cache(ttl=0)
+        cache.set("key", 1)
+        self.assertIsNone(cache.get("key"))
+
+    def test_unserializable_values_are_skipped(self):
+        cache = self._cache()
+        cache.set("key", object())
+        self.assertIsNone(cache.get("key"))
+
+    def test_keys_are_stable(self):
+        self.assertEqual(make_cache_key("tavily", {"b": 1, "a": 2}), make_cache_key("tavily", {"a": 2, "b": 1}))
+        self.assertNotEqual(make_cache_key("tavily", "Turkey"), make_cache_key("tavily", "Spain"))
+
+
+class LeaseTests(CacheTestCase):
+
+    def test_one_owner_at_a_time(self):
+        cache = self._cache("analysis")
+        self.assertTrue(cache.acquire_lease("key", 60, owner="worker-1"))
+        self.assertFalse(self._cache("analysis").acquire_lease("key", 60, owner="worker-2"))
+
+        # Only the owner can release it
+        cache.release_lease("key", owner="worker-2")
+        self.assertFalse(cache.acquire_lease("key", 60, owner="worker-2"))
+        cache.release_lease("key", owner="worker-1")
+        self.assertTrue(cache.acquire_lease("key", 60, owner="worker-2"))
+
+    def test_expired_lease_is_taken_over(self):
+        cache = self._cache("analysis")
+        with mock.patch("api.agent.cache.time.time", return_value=1000.0):
+            self.assertTrue(cache.acquire_lease("key", 30, owner="crashed"))
+        with mock.patch("api.agent.cache.time.time", return_value=1031.0):
+            self.assertTrue(cache.acquire_lease("key", 30, owner="worker-2"))
+
+    def test_broken_database_grants_the_lease(self):
+        cache = PersistentCache("analysis", 60, 10, path=os.path.join(self.path, "missing", "cache.sqlite3"))
+        self.assertTrue(cache.acquire_lease("key", 60))
+
+
+class SingleFlightTests(SimpleTestCase):
+
+    def test_concurrent_callers_share_one_call(self):
+        flight = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return "analysis"
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            leader = executor.submit(flight.do, "key", compute)
+            started.wait(5)
+            follower = executor.submit(flight.do, "key", compute)
+            time.sleep(0.05)
+            release.set()
+            self.assertEqual(leader.result(), ("analysis", False))
+            self.assertEqual(follower.result(), ("analysis", True))
+        self.assertEqual(len(calls), 1)
+
+    def test_errors_are_shared_and_not_kept(self):
+        flight = SingleFlight()
+
+        def fail():
+            raise RuntimeError("upstream down")
+
+        with self.assertRaises(RuntimeError):
+            flight.do("key", fail)
+        self.assertEqual(flight.do("key", lambda: "retried"), ("retried", False))
+
+
+@mock.patch.object(runner, "record_cache_lookup")
+class AnalysisCacheTests(CacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.graph = mock.MagicMock()
+        self.graph.invoke.return_value = {"final_analysis": "Turkey to win", "aggregator_route": {"tier": "fast"}}
+        for patch in (mock.patch.object(runner, "analysis_graph", self.graph),
+                      mock.patch.object(runner, "analysis_cache", self._cache("analysis"))):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_miss_then_hit_across_team_spellings(self, record_cache_lookup):
+        first = runner.run_analysis("Turkey", "Spain", "match-1")
+        second = runner.run_analysis("Türkiye", "Spain", "match-1")
+        self.assertEqual(self.graph.invoke.call_count, 1)
+        self.assertEqual(first["timings"]["analysis_cache"], "miss")
+        self.assertEqual(second["timings"]["analysis_cache"], "hit")
+        self.assertEqual(second["final_analysis"], "Turkey to win")
+
+    def test_cached_fast_analysis_does_not_satisfy_a_thinking_request(self, record_cache_lookup):
+        runner.run_analysis("Turkey", "Spain", "match-1")
+        runner.run_analysis("Turkey", "Spain", "match-1", aggregator_tier="thinking")
+        self.assertEqual(self.graph.invoke.call_count, 2)
+
+    def test_failed_analyses_are_not_cached(self, record_cache_lookup):
+        self.graph.invoke.return_value = {"final_analysis": "Error in final analysis aggregation: quota"}
+        runner.run_analysis("Turkey", "Spain", "match-1")
+        runner.run_analysis("Turkey", "Spain", "match-1")
+        self.assertEqual(self.graph.invoke.call_count, 2)
@@ -0,0 +1,73 @@
+from django.test import SimpleTestCase
+
+from api.agent.compaction import (
+    collect_passages, compact_for_prompt, compact_research, estimate_tokens, research_for
+)
+
+
+SOURCES = [
+    {"title": "Turkey vs Spain preview", "url": "https://www.uefa.com/turkey-spain/?utm=feed",
+     "content": "Turkey beat Georgia 3-2 and Bulgaria 6-1 in their last two qualifiers.\n"
+                "Accept cookies to continue reading.\n"
+                "Spain have scored 15 goals in four matches and conceded none."},
+    # Mirror of the first page
+    {"title": "Turkey vs Spain preview", "url": "http://uefa.com/turkey-spain",
+     "content": "Turkey beat Georgia 3-2 and Bulgaria 6-1 in their last two qualifiers."},
+    {"title": "Syndicated report", "url": "https://news.example.com/report",
+     "content": "Turkey beat Georgia 3-2 and Bulgaria 6-1 in their last two qualifiers!\n"
+                "The stadium in Konya holds 42,000 spectators and was renovated after the last season."},
+]
+
+
+class CollectPassagesTests(SimpleTestCase):
+
+    def test_drops_mirrors_boilerplate_and_near_duplicates(self):
+        passages = collect_passages(SOURCES)
+        self.assertEqual([passage["text"] for passage in passages], [
+            "Turkey beat Georgia 3-2 and Bulgaria 6-1 in their last two qualifiers.",
+            "Spain have scored 15 goals in four matches and conceded none.",
+            "The stadium in Konya holds 42,000 spectators and was renovated after the last season.",
+        ])
+        self.assertEqual([passage["source"] for passage in passages], [1, 1, 2])
+
+    def test_keeps_reversed_results(self):
+        passages = collect_passages([
+            {"url": "https://a.com", "content": "Turkey 1-0 Spain in the 2024 friendly in Istanbul."},
+            {"url": "https://b.com", "content": "Spain 1-0 Turkey in the 2024 friendly in Istanbul."},
+        ])
+        self.assertEqual(len(passages), 2)
+
+
+class CompactForPromptTests(SimpleTestCase):
+
+    def test_stays_within_budget_and_prefers_relevant_passages(self):
+        passages = collect_passages(SOURCES)
+        full = compact_for_prompt("Turkey", "Spain", passages, "goals", 0)
+        compacted = compact_for_prompt("Turkey", "Spain", passages, "goals", 60)
+
+        self.assertIn("Konya", full)
+        self.assertLessEqual(estimate_tokens(compacted), 60)
+        self.assertIn("Spain have scored 15 goals", compacted)
+        self.assertNotIn("Konya", compacted)
+
+    def test_no_passages(self):
+        self.assertIn("No relevant information found.", compact_for_prompt("Turkey", "Spain", [], "goals", 100))
+
+
+class CompactResearchTests(SimpleTestCase):
+
+    def test_one_text_per_prompt_of_the_analyzer_mode(self):
+        state = {"team1": "Turkey", "team2": "Spain", "research_data": "x" * 4000, "research_sources": SOURCES,
+                 "analyzer_mode": "combined"}
+        update = compact_research(state)
+        self.assertEqual(set(update["research_context"]), {"parser", "combined", "aggregate"})
+        self.assertEqual(update["research_compaction"]["combined"]["tokens_before"], 1000)
+        self.assertLess(update["research_compaction"]["combined"]["tokens_after"], 1000)
+        self.assertEqual(research_for({**state, **update}, "combined"), update["research_context"]["combined"])
+
+    def test_failed_searches_pass_through(self):
+        state = {"team1": "Turkey", "team2": "Spain", "research_data": "Error: Tavily API key not configured.",
+                 "research_sources": []}
+        update = compact_research(state)
+        self.assertEqual(update, {"research_context": None, "research_compaction": None})
+        self.assertEqual(research_for({**state, **update}, "goals"), "Error: Tavily API key not configured.")
@@ -0,0 +1,115 @@
+from django.test import SimpleTestCase
+
+from api.agent.extractor import _head_to_head, _team_matches, extract_structured_data, find_scorelines
+from api.agent.parser import _apply_fast_path, _has_research_data
+from api.agent.teams import same_team
+
+
+RESEARCH_TEXT = """Turkey 6-1 Bulgaria on 2025-10-11.
+Georgia 2-3 Turkey (A) on September 7, 2025.
+Spain vs Turkey: 6-0, 2025-09-04
+Real Madrid Castilla 2-0 Turkey on 2025-06-01."""
+
+CACHED_STATS = {"name": "cached", "recent_matches": []}
+
+
+class SameTeamTests(SimpleTestCase):
+
+    def test_accepts_spellings_of_one_team(self):
+        self.assertTrue(same_team("FC Porto", "Porto"))
+        self.assertTrue(same_team("Türkiye", "Turkey"))
+
+    def test_rejects_reserve_sides_and_namesakes(self):
+        self.assertFalse(same_team("Real Madrid Castilla", "Real Madrid"))
+        self.assertFalse(same_team("Atletico Madrid", "Madrid"))
+        self.assertFalse(same_team("Bayern Munich II", "Bayern Munich"))
+
+    def test_rejects_empty_names(self):
+        self.assertFalse(same_team("", "Turkey"))
+        self.assertFalse(same_team("Turkey", "  "))
+
+
+class FindScorelinesTests(SimpleTestCase):
+
+    def test_layouts_markers_and_dates(self):
+        scorelines = find_scorelines(RESEARCH_TEXT)
+        self.assertEqual(scorelines[0], {
+            "home": "Turkey", "away": "Bulgaria", "home_goals": 6, "away_goals": 1, "date": "2025-10-11",
+        })
+        # "(A)": the first-named team played away
+        self.assertEqual(scorelines[1], {
+            "home": "Turkey", "away": "Georgia", "home_goals": 3, "away_goals": 2, "date": "2025-09-07",
+        })
+        # "A vs B: X-Y" layout
+        self.assertEqual(scorelines[2], {
+            "home": "Spain", "away": "Turkey", "home_goals": 6, "away_goals": 0, "date": "2025-09-04",
+        })
+        self.assertEqual(len(scorelines), 4)
+
+    def test_ignores_dates_and_same_team(self):
+        self.assertEqual(find_scorelines("Played on 2025-10-11 in Bursa."), [])
+        self.assertEqual(find_scorelines("Turkey 1-1 Turkey"), [])
+
+    def test_ignores_predicted_scores(self):
+        self.assertEqual(find_scorelines("Prediction: Turkey 2-1 Bulgaria"), [])
+        self.assertEqual(find_scorelines("Our tips:\nTurkey 2-1 Bulgaria"), [])
+        scorelines = find_scorelines("Turkey 6-1 Bulgaria on 2025-10-11. We expect Turkey 2-0 Spain.")
+        self.assertEqual([(line["away"], line["home_goals"]) for line in scorelines], [("Bulgaria", 6)])
+
+
+class TeamMatchesTests(SimpleTestCase):
+
+    def test_from_team_view(self):
+        matches = _team_matches("Türkiye", find_scorelines(RESEARCH_TEXT))
+        self.assertEqual([match["opponent"] for match in matches], ["Bulgaria", "Georgia", "Spain", "Real Madrid Castilla"])
+        self.assertEqual(matches[2]["score"], "0-6")
+        self.assertEqual(matches[2]["home_away"], "away")
+
+    def test_skip_reserve_sides(self):
+        self.assertEqual(_team_matches("Real Madrid", find_scorelines(RESEARCH_TEXT)), [])
+
+    def test_drop_duplicates(self):
+        scorelines = find_scorelines("Turkey 6-1 Bulgaria on 2025-10-11.\nTurkey 6-1 Bulgaria, 2025-10-11")
+        self.assertEqual(len(_team_matches("Turkey", scorelines)), 1)
+
+    def test_head_to_head_either_order(self):
+        matches = _head_to_head("Turkey", "Spain", find_scorelines(RESEARCH_TEXT))
+        self.assertEqual(matches, [
+            {"date": "2025-09-04", "home_team": "Spain", "away_team": "Turkey", "score": "6-0"},
+        ])
+
+    def test_coverage(self):
+        _, coverage = extract_structured_data("Turkey", "Spain", RESEARCH_TEXT)
+        self.assertEqual(coverage, {"team1": 4, "team2": 1, "head_to_head": 1})
+
+
+class FastPathTests(SimpleTestCase):
+
+    def test_needs_head_to_head_matches(self):
+        state = {"team1": "Turkey", "team2": "Bulgaria", "research_data": "Turkey 6-1 Georgia on 2025-10-11."}
+        self.assertFalse(_apply_fast_path(state, (CACHED_STATS, CACHED_STATS)))
+        self.assertNotIn("parser_path", state)
+
+    def test_predicted_score_is_not_head_to_head(self):
+        state = {"team1": "Turkey", "team2": "Bulgaria", "research_data": "Prediction: Turkey 2-1 Bulgaria."}
+        self.assertFalse(_apply_fast_path(state, (CACHED_STATS, CACHED_STATS)))
+        self.assertNotIn("head_to_head", state)
+
+
+class ResearchDataCheckTests(SimpleTestCase):
+
+    def test_search_errors_are_not_research(self):
+        state = {"team1": "Turkey", "team2": "Spain", "research_data": "Error: Tavily API key not configured.",
+                 "research_sources": []}
+        self.assertFalse(_has_research_data(state))
+        self.assertEqual(state["head_to_head"], {"error": "Няма достатъчно информация"})
+
+    def test_no_results_are_not_research(self):
+        state = {"team1": "Turkey", "team2": "Spain",
+                 "research_data": "=== Research Data for Turkey vs Spain ===\n\nNo relevant information found.\n",
+                 "research_sources": []}
+        self.assertFalse(_has_research_data(state))
+
+    def test_results_are_research(self):
+        state = {"research_data": RESEARCH_TEXT, "research_sources": [{"url": "https://example.com", "content": "..."}]}
+        self.assertTrue(_has_research_data(state))
@@ -0,0 +1,79 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from api import jobs
+from api.jobs import claim_next_job, requeue_stale_jobs, run_job, submit_job
+from api.models import AnalysisJob
+
+
+MATCH = {"team1": "Turkey", "team2": "Spain", "match_id": "m1", "sport_key": "soccer", "commence_time": None}
+
+
+class ClaimJobTests(TestCase):
+
+    def test_claims_oldest_queued_job_once(self):
+        older, newer = submit_job(MATCH), submit_job({**MATCH, "match_id": "m2"})
+        AnalysisJob.objects.filter(pk=older.pk).update(created_at=timezone.now() - timedelta(minutes=1))
+
+        first = claim_next_job("worker-1")
+        self.assertEqual(first.pk, older.pk)
+        self.assertEqual((first.status, first.worker, first.attempts), (AnalysisJob.STATUS_RUNNING, "worker-1", 1))
+        self.assertIsNotNone(first.started_at)
+
+        self.assertEqual(claim_next_job("worker-2").pk, newer.pk)
+        self.assertIsNone(claim_next_job("worker-3"))
+
+
+class RequeueStaleJobsTests(TestCase):
+
+    def _running(self, attempts, started_ago):
+        job = submit_job(MATCH)
+        AnalysisJob.objects.filter(pk=job.pk).update(
+            status=AnalysisJob.STATUS_RUNNING, worker="crashed", attempts=attempts,
+            started_at=timezone.now() - started_ago
+        )
+        return job
+
+    def test_requeues_lost_jobs_and_fails_exhausted_ones(self):
+        lost = self._running(1, jobs.JOB_STALE_AFTER + timedelta(seconds=1))
+        exhausted = self._running(jobs.JOB_MAX_ATTEMPTS, jobs.JOB_STALE_AFTER + timedelta(seconds=1))
+        active = self._running(1, timedelta(seconds=5))
+
+        self.assertEqual(requeue_stale_jobs(), 1)
+        lost.refresh_from_db()
+        exhausted.refresh_from_db()
+        active.refresh_from_db()
+        self.assertEqual((lost.status, lost.worker), (AnalysisJob.STATUS_QUEUED, ""))
+        self.assertEqual(exhausted.status, AnalysisJob.STATUS_FAILED)
+        self.assertIsNotNone(exhausted.finished_at)
+        self.assertEqual(active.status, AnalysisJob.STATUS_RUNNING)
+
+
+@mock.patch.object(jobs, "store_result")
+class RunJobTests(TestCase):
+
+    def test_success_stores_result(self, store_result):
+        submit_job(MATCH)
+        result = {"final_analysis": "Turkey to win", "research_sources": [{"url": "..."}], "timings": {}}
+        with mock.patch.object(jobs, "run_analysis", return_value=result):
+            run_job(claim_next_job("worker-1"))
+
+        job = AnalysisJob.objects.get()
+        self.assertEqual(job.status, AnalysisJob.STATUS_DONE)
+        self.assertEqual(job.result["final_analysis"], "Turkey to win")
+        self.assertNotIn("timings", job.result)
+        store_result.assert_called_once()
+
+    def test_failures_are_retried_then_failed(self, store_result):
+        submit_job(MATCH)
+        with mock.patch.object(jobs, "run_analysis", side_effect=RuntimeError("upstream down")):
+            for _ in range(jobs.JOB_MAX_ATTEMPTS):
+                run_job(claim_next_job("worker-1"))
+
+        job = AnalysisJob.objects.get()
+        self.assertEqual((job.status, job.attempts, job.error), (AnalysisJob.STATUS_FAILED, jobs.JOB_MAX_ATTEMPTS, "upstream down"))
+        self.assertIsNone(claim_next_job("worker-1"))
+        store_result.assert_not_called()
@@ -0,0 +1,48 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from api.agent import metrics
+from api.agent.metrics import MetricsStore, histogram_updates, render_metrics
+
+
+class RenderMetricsTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "cache.sqlite3")
+        self.store = MetricsStore(self.path)
+        self.addCleanup(self.store.shutdown)
+        patch = mock.patch.object(metrics, "metrics_store", self.store)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_counters_histograms_and_hit_ratio(self):
+        metrics.record_cache_lookup("analysis", True)
+        metrics.record_cache_lookup("analysis", True)
+        metrics.record_cache_lookup("analysis", False)
+        self.store.add(histogram_updates("tipster_node_duration_seconds", {"node": "research"}, 0.3))
+
+        text = render_metrics()
+        self.assertIn('tipster_cache_lookups_total{cache="analysis",result="hit"} 2', text)
+        self.assertIn('tipster_cache_hit_ratio{cache="analysis"} 0.6666666666666666', text)
+        self.assertIn('tipster_node_duration_seconds_bucket{node="research",le="0.25"} 0', text)
+        self.assertIn('tipster_node_duration_seconds_bucket{node="research",le="0.5"} 1', text)
+        self.assertIn('tipster_node_duration_seconds_bucket{node="research",le="+Inf"} 1', text)
+        self.assertIn('tipster_node_duration_seconds_count{node="research"} 1', text)
+        self.assertIn("# TYPE tipster_inflight_nodes gauge", text)
+
+    def test_updates_are_buffered_until_flushed(self):
+        with mock.patch.object(self.store, "_schedule"):
+            with metrics.track_inflight("tipster_inflight_analyses", {"entry": "sync"}):
+                metrics.record_cache_lookup("tavily", False)
+                # Nothing has reached the database yet
+                self.assertEqual(MetricsStore(self.path).values(), {})
+                self.assertIn('tipster_inflight_analyses{entry="sync"} 1', render_metrics())
+        self.store.flush()
+        series = MetricsStore(self.path).values()
+        self.assertEqual(series["tipster_cache_lookups_total"], [([("cache", "tavily"), ("result", "miss")], 1)])
+        self.assertEqual(series["tipster_inflight_analyses"], [([("entry", "sync")], 0)])
@@ -0,0 +1,70 @@
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.test import TestCase
+
+from api.models import Analysis
+from api.prewarm import due_fixtures, load_fixtures
+from api.store import save_analysis
+
+
+NOW = datetime(2025, 11, 17, 12, 0, tzinfo=dt_timezone.utc)
+
+
+def _fixture(match_id, hours_to_kickoff):
+    kickoff = NOW + timedelta(hours=hours_to_kickoff)
+    return {"team1": "Turkey", "team2": "Spain", "match_id": match_id, "sport_key": "soccer_uefa_nations_league",
+            "commence_time": kickoff.isoformat(), "kickoff": kickoff}
+
+
+def _analyzed(fixture, hours_ago):
+    analysis = save_analysis(fixture, {"final_analysis": "Spain to win 2-1."})
+    Analysis.objects.filter(pk=analysis.pk).update(created_at=NOW - timedelta(hours=hours_ago))
+
+
+class DueFixturesTests(TestCase):
+
+    def test_only_upcoming_fixtures_within_the_horizon(self):
+        fixtures = [_fixture("past", -1), _fixture("far", 60), _fixture("soon", 30)]
+        due = due_fixtures(fixtures, now=NOW, horizon_hours=48)
+        self.assertEqual([(fixture["match_id"], fixture["reason"]) for fixture in due], [("soon", "new")])
+
+    def test_nearest_kickoff_first(self):
+        due = due_fixtures([_fixture("late", 40), _fixture("early", 3), _fixture("middle", 20)], now=NOW)
+        self.assertEqual([fixture["match_id"] for fixture in due], ["early", "middle", "late"])
+
+    def test_refreshed_after_each_passed_refresh_point(self):
+        # Kickoff in 5h: the 6h point has passed, the 1h point has not
+        stale, fresh = _fixture("stale", 5), _fixture("fresh", 5)
+        _analyzed(stale, hours_ago=2)  # Before the 6h point
+        _analyzed(fresh, hours_ago=0.5)  # After the 6h point
+        due = due_fixtures([stale, fresh], now=NOW, refresh_hours=(24, 6, 1))
+        self.assertEqual([(fixture["match_id"], fixture["reason"]) for fixture in due], [("stale", "refresh 6h")])
+
+    def test_analyzed_fixture_before_its_first_refresh_point_is_not_due(self):
+        fixture = _fixture("m1", 30)
+        _analyzed(fixture, hours_ago=10)
+        self.assertEqual(due_fixtures([fixture], now=NOW, refresh_hours=(24, 6, 1)), [])
+
+
+class LoadFixturesTests(TestCase):
+
+    def _load(self, data):
+        handle, path = tempfile.mkstemp(suffix=".json")
+        self.addCleanup(os.remove, path)
+        with os.fdopen(handle, "w", encoding="utf-8") as file:
+            json.dump(data, file)
+        return load_fixtures(path)
+
+    def test_invalid_entries_are_skipped(self):
+        fixtures = self._load({"matches": [
+            {"id": "a", "home_team": "Turkey", "away_team": "Spain", "commence_time": "2025-11-18T19:45:00"},
+            {"id": "b", "home_team": "Georgia", "commence_time": "2025-11-18T19:45:00Z"},
+            {"id": "c", "home_team": "Georgia", "away_team": "Bulgaria", "commence_time": "tomorrow"},
+            "not a match",
+        ]})
+        self.assertEqual([fixture["match_id"] for fixture in fixtures], ["a"])
+        # Naive times are read as UTC
+        self.assertEqual(fixtures[0]["kickoff"], datetime(2025, 11, 18, 19, 45, tzinfo=dt_timezone.utc))
@@ -0,0 +1,72 @@
+import importlib.util
+import tempfile
+import unittest
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from api.agent import research_index
+from api.agent.research_index import HashingEmbeddingFunction, ResearchIndex
+from api.agent.tools import _build_searches
+
+
+def _response(distances):
+    return {
+        "documents": [[f"Form {i}\nTurkey won {i}-0" for i in range(len(distances))]],
+        "metadatas": [[{"url": f"https://example.com/{i}", "title": f"Form {i}"} for i in range(len(distances))]],
+        "distances": [distances],
+    }
+
+
+class LookupThresholdTests(SimpleTestCase):
+
+    def setUp(self):
+        self.index = ResearchIndex("unused")
+        self.index.enabled = True
+        self.collection = mock.MagicMock()
+        self.index._collection = self.collection
+        self.fixture_search, self.team_search = _build_searches("Turkey", "Spain")[:2]
+
+    def test_enough_close_results(self):
+        self.collection.query.return_value = _response([0.1, 0.2, 0.3])
+        results = self.index.lookup(self.team_search)
+        self.assertEqual([result["url"] for result in results], ["https://example.com/0", "https://example.com/1"])
+        self.assertEqual(results[0], {"title": "Form 0", "url": "https://example.com/0",
+                                      "content": "Turkey won 0-0", "score": 0.9})
+
+    @mock.patch.object(research_index, "RESEARCH_INDEX_MAX_DISTANCE", 0.5)
+    def test_too_few_close_results_is_a_miss(self):
+        self.collection.query.return_value = _response([0.1, 0.7])
+        self.assertIsNone(self.index.lookup(self.team_search))
+
+    def test_filters_on_search_kind(self):
+        self.collection.query.return_value = _response([])
+        self.index.lookup(self.team_search)
+        self.index.lookup(self.fixture_search)
+        team_where, fixture_where = (call.kwargs["where"] for call in self.collection.query.call_args_list)
+        self.assertIn({"kind": "team"}, team_where["$and"][0]["$and"])
+        self.assertIn({"kind": "fixture"}, fixture_where["$and"][0]["$and"])
+
+    def test_errors_are_misses(self):
+        self.collection.query.side_effect = RuntimeError("index corrupted")
+        self.assertIsNone(self.index.lookup(self.team_search))
+
+
+@unittest.skipUnless(importlib.util.find_spec("chromadb"), "chromadb is not installed")
+class ChromaIndexTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.index = ResearchIndex(directory.name, embedding_function=HashingEmbeddingFunction())
+        self.index.enabled = True
+
+    def test_fixture_results_do_not_answer_team_searches(self):
+        fixture_search, team_search = _build_searches("Turkey", "Spain")[:2]
+        results = [{"title": f"Turkey form {i}", "url": f"https://example.com/{i}", "content": team_search["query"]}
+                   for i in range(3)]
+        self.index.add(fixture_search, results)
+        self.assertIsNone(self.index.lookup(team_search))
+
+        self.index.add(team_search, results)
+        self.assertEqual(len(self.index.lookup(team_search)), team_search["max_results"])
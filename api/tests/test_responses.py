@@ -0,0 +1,101 @@
+import gzip
+import json
+from unittest import mock
+
+from django.http import HttpResponse, QueryDict
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+
+from api import middleware
+from api.middleware import CompressionMiddleware
+from api.store import save_analysis
+from api.views import _etag_matches, _requested_fields, _select_fields
+
+
+PAYLOAD = {
+    "team1": "Turkey", "team2": "Spain", "match_id": "m1",
+    "analysis": {"goals_prediction": "Over 2.5", "winner_prediction": "Spain", "score_prediction": "1-2",
+                 "final_analysis": "Spain to win.", "research_data": "..."},
+    "team1_stats": {"form": "W"}, "team2_stats": {"form": "WW"}, "success": True,
+}
+
+
+class FieldSelectionTests(SimpleTestCase):
+
+    def test_fields_from_query_or_body(self):
+        query = QueryDict("fields=score_prediction,team1_stats")
+        self.assertEqual(_requested_fields({}, query), {"analysis.score_prediction", "team1_stats"})
+        self.assertEqual(_requested_fields({"fields": ["analysis.final_analysis"]}, query), {"analysis.final_analysis"})
+        self.assertIsNone(_requested_fields({}, QueryDict("")))
+
+    def test_unknown_field(self):
+        with self.assertRaises(ValueError):
+            _requested_fields({"fields": "score_prediction,odds"}, QueryDict(""))
+
+    def test_select_fields(self):
+        selected = _select_fields(PAYLOAD, frozenset({"analysis.score_prediction", "team1_stats"}))
+        self.assertEqual(selected, {"analysis": {"score_prediction": "1-2"}, "team1_stats": {"form": "W"}, "success": True})
+        self.assertIs(_select_fields(PAYLOAD, None), PAYLOAD)
+
+    def test_etag_comparison_is_weak(self):
+        self.assertTrue(_etag_matches('"abc"', 'W/"abc"'))
+        self.assertTrue(_etag_matches('"abc"', '"xyz", "abc"'))
+        self.assertTrue(_etag_matches('"abc"', "*"))
+        self.assertFalse(_etag_matches('"abc"', '"xyz"'))
+        self.assertFalse(_etag_matches('"abc"', None))
+
+
+@mock.patch.object(middleware, "COMPRESS_MIN_BYTES", 100)
+class CompressionMiddlewareTests(SimpleTestCase):
+
+    def _response(self, body, accept_encoding="gzip"):
+        request = RequestFactory().get("/api/analyses/m1/", HTTP_ACCEPT_ENCODING=accept_encoding)
+        response = HttpResponse(body, content_type="application/json")
+        response["ETag"] = '"abc"'
+        return CompressionMiddleware(lambda request: response).process_response(request, response)
+
+    def test_compresses_large_bodies(self):
+        body = json.dumps(PAYLOAD) * 10
+        with mock.patch.object(middleware, "brotli", None):
+            response = self._response(body, "gzip, br")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.content).decode(), body)
+        self.assertEqual(response["ETag"], 'W/"abc"')
+        self.assertIn("Accept-Encoding", response["Vary"])
+
+    def test_leaves_small_bodies_and_other_encodings(self):
+        self.assertFalse(self._response("{}").has_header("Content-Encoding"))
+        self.assertFalse(self._response(json.dumps(PAYLOAD) * 10, "gzip;q=0, identity").has_header("Content-Encoding"))
+
+
+class ConditionalGetTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        save_analysis(
+            {"team1": "Turkey", "team2": "Spain", "match_id": "m1", "sport_key": "soccer", "commence_time": None},
+            {"final_analysis": "Spain to win.", "score_analysis": "1-2"},
+        )
+
+    def test_not_modified_until_a_new_analysis_is_stored(self):
+        first = self.client.get("/api/analyses/m1/")
+        self.assertEqual(first.status_code, 200)
+
+        cached = self.client.get("/api/analyses/m1/", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached["ETag"], first["ETag"])
+
+        save_analysis(
+            {"team1": "Turkey", "team2": "Spain", "match_id": "m1", "sport_key": "soccer", "commence_time": None},
+            {"final_analysis": "Draw.", "score_analysis": "1-1"},
+        )
+        updated = self.client.get("/api/analyses/m1/", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(updated.status_code, 200)
+        self.assertEqual(updated.data["analysis"]["final_analysis"], "Draw.")
+
+    def test_field_selection_has_its_own_etag(self):
+        full = self.client.get("/api/analyses/m1/")
+        slim = self.client.get("/api/analyses/m1/", {"fields": "score_prediction"})
+        self.assertNotEqual(full["ETag"], slim["ETag"])
+        self.assertEqual(slim.data, {"analysis": {"score_prediction": "1-2"}, "success": True})
+        self.assertEqual(self.client.get("/api/analyses/m1/", {"fields": "odds"}).status_code, 400)
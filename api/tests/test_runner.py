@@ -0,0 +1,78 @@
+import asyncio
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from api.agent import runner
+
+
+class FakeStreamingGraph:
+    """Streams one research update and the final analysis; counts runs."""
+
+    def __init__(self):
+        self.runs = 0
+
+    async def astream(self, state, stream_mode):
+        self.runs += 1
+        await asyncio.sleep(0.05)
+        yield "updates", {"research": {"research_data": "Turkey 6-1 Bulgaria"}}
+        yield "updates", {"aggregator": {"final_analysis": "Turkey to win"}}
+
+
+def _collect(stream):
+    async def collect():
+        return [event async for event in stream]
+    return collect()
+
+
+@mock.patch.object(runner, "record_cache_lookup")
+class StreamCoalescingTests(SimpleTestCase):
+
+    def setUp(self):
+        self.graph = FakeStreamingGraph()
+        self.cache = mock.MagicMock()
+        self.cache.get.return_value = None
+        self.cache.acquire_lease.return_value = True
+        patches = [mock.patch.object(runner, "analysis_graph", self.graph),
+                   mock.patch.object(runner, "analysis_cache", self.cache)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_concurrent_streams_share_one_run(self, record_cache_lookup):
+        async def run_all():
+            return await asyncio.gather(_collect(runner.astream_analysis("Turkey", "Bulgaria")),
+                                        _collect(runner.astream_analysis("Turkey", "Bulgaria")))
+
+        first, second = asyncio.run(run_all())
+        self.assertEqual(self.graph.runs, 1)
+        self.assertEqual(self.cache.acquire_lease.call_count, 1)
+        self.cache.release_lease.assert_called_once()
+        self.assertEqual([event for event, _ in first], ["research_data", "final_analysis", "complete"])
+        self.assertEqual([event for event, _ in second], ["research_data", "final_analysis", "complete"])
+        self.assertEqual(first[-1][1]["timings"], {"analysis_cache": "miss"})
+        self.assertEqual(second[-1][1]["timings"], {"analysis_cache": "shared"})
+        self.assertEqual(runner._ainflight, {})
+
+    def test_waits_for_another_worker_and_replays(self, record_cache_lookup):
+        cached = {"final_analysis": "Turkey to win", "aggregator_tier": "thinking"}
+        self.cache.acquire_lease.return_value = False
+        self.cache.get.side_effect = [None, cached]
+
+        with mock.patch.object(runner, "ANALYSIS_LEASE_POLL_INTERVAL", 0):
+            events = asyncio.run(_collect(runner.astream_analysis("Turkey", "Bulgaria")))
+
+        self.assertEqual(self.graph.runs, 0)
+        self.assertEqual(events[0], ("final_analysis", {"final_analysis": "Turkey to win"}))
+        self.assertEqual(events[-1][1]["timings"], {"analysis_cache": "miss"})
+
+    def test_disconnect_releases_lease(self, record_cache_lookup):
+        async def first_event():
+            stream = runner.astream_analysis("Turkey", "Bulgaria")
+            event = await stream.__anext__()
+            await stream.aclose()
+            return event
+
+        self.assertEqual(asyncio.run(first_event())[0], "research_data")
+        self.cache.release_lease.assert_called_once()
+        self.assertEqual(runner._ainflight, {})
@@ -0,0 +1,102 @@
+import importlib.util
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from api.agent import analyzers, scheduler
+from api.agent.scheduler import TokenBuckets, UpstreamError
+
+
+class HTTPError(Exception):
+    """Stands in for an SDK error exposing the status on its response."""
+
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.response = mock.Mock(status_code=status_code, headers=headers or {})
+
+
+class TokenBucketTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.buckets = TokenBuckets(os.path.join(directory.name, "cache.sqlite3"))
+
+    def test_burst_then_wait(self):
+        for _ in range(3):
+            self.assertEqual(self.buckets.try_acquire("tavily", 1.0, 3.0), 0.0)
+        self.assertGreater(self.buckets.try_acquire("tavily", 1.0, 3.0), 0.0)
+
+    def test_reserve_is_left_to_interactive_calls(self):
+        self.assertEqual(self.buckets.try_acquire("tavily", 0.01, 4.0, reserve=2.0), 0.0)
+        self.assertEqual(self.buckets.try_acquire("tavily", 0.01, 4.0, reserve=2.0), 0.0)
+        self.assertGreater(self.buckets.try_acquire("tavily", 0.01, 4.0, reserve=2.0), 0.0)
+        self.assertEqual(self.buckets.try_acquire("tavily", 0.01, 4.0), 0.0)
+
+    def test_drain(self):
+        self.buckets.drain("gemini", 0.01, 5.0)
+        self.assertGreater(self.buckets.try_acquire("gemini", 0.01, 5.0), 0.0)
+
+
+class RetryClassificationTests(SimpleTestCase):
+
+    def test_status_codes(self):
+        self.assertEqual(scheduler._retry_reason(HTTPError(429)), "429")
+        self.assertEqual(scheduler._retry_reason(HTTPError(503)), "5xx")
+        self.assertIsNone(scheduler._retry_reason(HTTPError(400)))
+        self.assertIsNone(scheduler._retry_reason(ValueError("503 in the message is not a status")))
+
+    def test_connection_errors(self):
+        self.assertEqual(scheduler._retry_reason(ConnectionResetError()), "connection")
+        self.assertEqual(scheduler._retry_reason(TimeoutError()), "connection")
+
+    @unittest.skipUnless(importlib.util.find_spec("requests"), "requests is not installed")
+    def test_requests_transport_errors(self):
+        import requests
+        self.assertEqual(scheduler._retry_reason(requests.exceptions.ConnectionError()), "connection")
+        self.assertEqual(scheduler._retry_reason(requests.exceptions.ReadTimeout()), "connection")
+
+    @unittest.skipUnless(importlib.util.find_spec("httpx"), "httpx is not installed")
+    def test_httpx_transport_errors(self):
+        import httpx
+        self.assertEqual(scheduler._retry_reason(httpx.ConnectError("refused")), "connection")
+        self.assertEqual(scheduler._retry_reason(httpx.ReadTimeout("slow")), "connection")
+
+    def test_backoff_honours_retry_after(self):
+        self.assertGreaterEqual(scheduler._backoff(0, HTTPError(429, {"Retry-After": "7"})), 7.0)
+
+
+@mock.patch.object(scheduler, "_bucket_limits", return_value=None)
+@mock.patch.object(scheduler, "_backoff", return_value=0.0)
+@mock.patch.object(scheduler, "UPSTREAM_MAX_ATTEMPTS", 3)
+class CallUpstreamTests(SimpleTestCase):
+
+    def test_retries_then_succeeds(self, *mocks):
+        func = mock.Mock(side_effect=[HTTPError(503), ConnectionResetError(), "ok"])
+        self.assertEqual(scheduler.call_upstream("tavily", func), "ok")
+        self.assertEqual(func.call_count, 3)
+
+    def test_gives_up_with_upstream_error(self, *mocks):
+        error = HTTPError(503)
+        func = mock.Mock(side_effect=error)
+        with self.assertRaises(UpstreamError) as raised:
+            scheduler.call_upstream("tavily", func)
+        self.assertEqual(func.call_count, 3)
+        self.assertIs(raised.exception.__cause__, error)
+
+    def test_client_errors_are_not_retried(self, *mocks):
+        func = mock.Mock(side_effect=HTTPError(400))
+        with self.assertRaises(UpstreamError):
+            scheduler.call_upstream("tavily", func)
+        self.assertEqual(func.call_count, 1)
+
+    @mock.patch.dict(os.environ, {"GOOGLE_API_KEY": "test"})
+    @mock.patch.object(analyzers, "get_llm")
+    def test_analyzer_falls_back_to_error_message(self, get_llm, *mocks):
+        get_llm.return_value.invoke.side_effect = ConnectionResetError("reset by peer")
+        update = analyzers.analyze_goals({"team1": "Turkey", "team2": "Spain", "research_data": "..."})
+        self.assertTrue(update["goals_analysis"].startswith("Error in goals analysis:"))
+        self.assertEqual(get_llm.return_value.invoke.call_count, 3)
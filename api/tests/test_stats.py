@@ -0,0 +1,54 @@
+from django.test import SimpleTestCase
+
+from api.agent.stats import head_to_head_summary, recompute_team_stats, team_summary
+
+
+class TeamSummaryTests(SimpleTestCase):
+
+    def test_form_and_goals_from_scores(self):
+        summary = team_summary("Turkey", [
+            {"opponent": "Bulgaria", "score": "6-1"},
+            {"opponent": "Spain", "score": "0-6"},
+            {"opponent": "Georgia", "score": "1-1"},
+            {"opponent": "Estonia", "score": None},
+        ])
+        self.assertEqual(summary["form"], "WLD")
+        self.assertEqual(summary["total_goals_scored"], 7)
+        self.assertEqual(summary["total_goals_conceded"], 8)
+        self.assertEqual(summary["matches_analyzed"], 3)
+        self.assertEqual(summary["avg_goals_scored"], 2.33)
+
+    def test_recompute_overwrites_llm_fields(self):
+        stats = recompute_team_stats("Turkey", {
+            "recent_matches": [{"opponent": "Bulgaria", "score": "6-1"}], "form": "LLL", "total_goals_scored": 99,
+        })
+        self.assertEqual(stats["form"], "W")
+        self.assertEqual(stats["total_goals_scored"], 6)
+
+    def test_recompute_keeps_errors(self):
+        self.assertEqual(recompute_team_stats("Turkey", {"error": "x"}), {"error": "x"})
+
+
+class HeadToHeadSummaryTests(SimpleTestCase):
+
+    def test_counts_wins_and_draws(self):
+        summary = head_to_head_summary("Turkey", "Spain", [
+            {"date": "2025-09-04", "home_team": "Spain", "away_team": "Turkey", "score": "6-0"},
+            {"date": "2024-03-01", "home_team": "Türkiye", "away_team": "Spain", "score": "2-1"},
+            {"date": "2023-03-01", "home_team": "Turkey", "away_team": "Spain", "score": "1-1"},
+        ])
+        self.assertEqual(summary["total_matches"], 3)
+        self.assertEqual(summary["team1_wins"], 1)
+        self.assertEqual(summary["draws"], 1)
+        self.assertEqual(summary["team2_wins"], 1)
+        self.assertEqual([match["winner"] for match in summary["recent_matches"]], ["Spain", "Turkey", "Draw"])
+
+    def test_unresolved_teams_keep_their_winner(self):
+        summary = head_to_head_summary("Real Madrid", "Barcelona", [
+            {"home_team": "Real Madrid Castilla", "away_team": "Barcelona", "score": "2-0", "winner": None},
+        ])
+        self.assertIsNone(summary["recent_matches"][0]["winner"])
+        self.assertEqual(summary["team1_wins"], 0)
+
+    def test_no_matches(self):
+        self.assertEqual(head_to_head_summary("Turkey", "Spain", []), {"error": "Няма достатъчно информация"})
@@ -0,0 +1,66 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.models import Analysis, Match, TeamFormSnapshot
+from api.store import latest_analysis, save_analysis, store_result
+
+
+MATCH = {"team1": "Türkiye", "team2": "Spain", "match_id": "m1", "sport_key": "soccer_fifa_world_cup_qualifiers_europe",
+         "commence_time": "2025-11-18T19:45:00Z"}
+
+TEAM_STATS = {"name": "Turkey", "form": "W", "total_goals_scored": 6, "total_goals_conceded": 1, "matches_analyzed": 1,
+              "recent_matches": [{"opponent": "Bulgaria", "score": "6-1", "result": "W", "date": "2025-10-11"}]}
+
+RESULT = {
+    "final_analysis": "Spain to win 2-1.", "score_analysis": "Predicted score: Turkey 1-2 Spain",
+    "team1_stats": TEAM_STATS, "team2_stats": {"error": "Няма достатъчно информация"},
+    "aggregator_route": {"tier": "fast"}, "research_sources": [{"url": "https://example.com"}],
+    "timings": {"analysis_cache": "miss"},
+}
+
+
+class StoreResultTests(TestCase):
+
+    def test_fresh_runs_are_stored_with_canonical_team_ids(self):
+        analysis = store_result(MATCH, RESULT)
+        self.assertEqual((analysis.team1_id, analysis.team2_id, analysis.aggregator_tier), ("turkey", "spain", "fast"))
+        self.assertNotIn("research_sources", analysis.result)
+        self.assertEqual(Match.objects.get().home_team_id, "turkey")
+        # Only valid team stats are snapshotted
+        self.assertEqual(list(TeamFormSnapshot.objects.values_list("team_id", flat=True)), ["turkey"])
+
+    def test_cache_hits_and_failures_are_not_stored(self):
+        self.assertIsNone(store_result(MATCH, {**RESULT, "timings": {"analysis_cache": "hit"}}))
+        self.assertIsNone(store_result(MATCH, {**RESULT, "final_analysis": "Error in final analysis aggregation: quota"}))
+        self.assertFalse(Analysis.objects.exists())
+
+    def test_latest_analysis_by_match_id_or_teams(self):
+        save_analysis(MATCH, RESULT)
+        newest = save_analysis(MATCH, {**RESULT, "final_analysis": "Draw."})
+        self.assertEqual(latest_analysis(match_id="m1").pk, newest.pk)
+        self.assertEqual(latest_analysis(team1="Turkey", team2="Spain", commence_time="2025-11-18T19:45:00Z").pk, newest.pk)
+        self.assertIsNone(latest_analysis(team1="Spain", team2="Turkey"))
+        self.assertIsNone(latest_analysis(match_id="other"))
+
+
+class StoredAnalysisViewTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        save_analysis(MATCH, RESULT)
+
+    def test_by_match_id(self):
+        response = self.client.get("/api/analyses/m1/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["analysis"]["final_analysis"], "Spain to win 2-1.")
+        self.assertEqual(response.data["commence_time"], "2025-11-18T19:45:00Z")
+        self.assertIn("stored_at", response.data)
+
+    def test_by_teams(self):
+        response = self.client.get("/api/analyses/", {"home_team": "Turkey", "away_team": "Spain"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["match_id"], "m1")
+
+    def test_unknown_match(self):
+        self.assertEqual(self.client.get("/api/analyses/other/").status_code, 404)
+        self.assertEqual(self.client.get("/api/analyses/", {"home_team": "Turkey"}).status_code, 400)
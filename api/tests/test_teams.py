@@ -0,0 +1,28 @@
+from django.test import SimpleTestCase
+
+from api.agent.teams import canonical_team_id, canonical_team_name
+
+
+class CanonicalTeamIdTests(SimpleTestCase):
+
+    def test_folds_affixes_and_aliases(self):
+        self.assertEqual(canonical_team_id("Valencia C.F."), "valencia")
+        self.assertEqual(canonical_team_id("FC Porto"), "porto")
+        self.assertEqual(canonical_team_id(" Türkiye "), "turkey")
+        self.assertEqual(canonical_team_id("Man Utd"), "manchester united")
+
+    def test_affix_alone_is_kept(self):
+        self.assertEqual(canonical_team_id("FC"), "fc")
+
+    def test_reserve_sides_are_other_teams(self):
+        self.assertNotEqual(canonical_team_id("Real Madrid Castilla"), canonical_team_id("Real Madrid"))
+        self.assertNotEqual(canonical_team_id("Bayern Munich II"), canonical_team_id("Bayern Munich"))
+
+    def test_ambiguous_names_are_not_aliases(self):
+        self.assertNotEqual(canonical_team_id("Inter"), canonical_team_id("Inter Milan"))
+        self.assertNotEqual(canonical_team_id("Korea"), canonical_team_id("South Korea"))
+        self.assertEqual(canonical_team_id("Korea Republic"), canonical_team_id("South Korea"))
+
+    def test_canonical_name(self):
+        self.assertEqual(canonical_team_name("Türkiye"), "Turkey")
+        self.assertEqual(canonical_team_name("  Real   Betis "), "Real Betis")
@@ -0,0 +1,45 @@
+import json
+import os
+import tempfile
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from api.agent import tracing
+from api.agent.tracing import SpanExporter
+
+
+@mock.patch.object(tracing, "TRACE_MAX_BYTES", 1000)
+class TraceRotationTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "traces.jsonl")
+
+    def _lines(self, path):
+        with open(path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    def test_concurrent_writers_rotate_once(self):
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"name": "old", "padding": "x" * 1500}) + "\n")
+
+        # One exporter per writer, like one per worker process
+        exporters = [SpanExporter(self.path) for _ in range(8)]
+        threads = [threading.Thread(target=exporter._write, args=([{"name": f"span {i}"}],))
+                   for i, exporter in enumerate(exporters)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([span["name"] for span in self._lines(self.path + ".1")], ["old"])
+        self.assertEqual(sorted(span["name"] for span in self._lines(self.path)), [f"span {i}" for i in range(8)])
+
+    def test_small_file_is_not_rotated(self):
+        SpanExporter(self.path)._write([{"name": "first"}])
+        SpanExporter(self.path)._write([{"name": "second"}])
+        self.assertFalse(os.path.exists(self.path + ".1"))
+        self.assertEqual([span["name"] for span in self._lines(self.path)], ["first", "second"])
@@ -3,4 +3,11 @@ from . import views
 
 urlpatterns = [
     path('analyze/', views.analyze_teams, name='analyze_teams'),
+    path('analyze/async/', views.analyze_teams_async, name='analyze_teams_async'),
+    path('analyze/stream/', views.analyze_teams_stream, name='analyze_teams_stream'),
+    path('analyze/batch/', views.analyze_batch, name='analyze_batch'),
+    path('analyze/jobs/', views.submit_analysis_job, name='submit_analysis_job'),
+    path('analyze/jobs/<uuid:job_id>/', views.analysis_job_status, name='analysis_job_status'),
+    path('analyses/', views.stored_analysis, name='stored_analysis_by_teams'),
+    path('analyses/<str:match_id>/', views.stored_analysis, name='stored_analysis'),
 ]
@@ -1,8 +1,210 @@
+import hashlib
+import json
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.http import parse_etags, quote_etag
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
-from .agent import analysis_graph
-from .agent.state import GraphState
+from .agent.metrics import render_metrics
+from .agent.tracing import span
+from .agent.runner import (
+    BATCH_MAX_CONCURRENCY, BATCH_MAX_MATCHES, RUN_OPTIONS,
+    arun_analysis, astream_analysis, resolve_run_options, run_analysis, run_batch, run_options
+)
+from .jobs import submit_job
+from .models import AnalysisJob
+from .store import latest_analysis, store_result, stored_match
+
+TEAMS_REQUIRED_ERROR = "Both teams are required (home_team/away_team or team1/team2)"
+
+# Top-level fields of the analysis payload a client can select with "fields"
+RESPONSE_FIELDS = (
+    "team1", "team2", "match_id", "commence_time", "sport_key", "analysis", "team1_stats",
+    "team2_stats", "head_to_head", "parser_path", "aggregator_route", "timings", "stored_at",
+)
+
+# Fields inside "analysis" (selectable as "analysis.<name>" or just "<name>")
+ANALYSIS_FIELDS = ("goals_prediction", "winner_prediction", "score_prediction", "final_analysis", "research_data")
+
+
+def _parse_match(data):
+    """
+    Extracts the match fields from a request body.
+    
+    Accepts The Odds API format (preferred) or the legacy team1/team2 format.
+    Team names are None when missing; callers validate them.
+    
+    Raises:
+        ValueError: If a run option (analyzer_mode, aggregator_tier,
+            priority) is given but invalid
+    """
+    # The Odds API uses home_team/away_team
+    home_team = data.get('home_team')
+    away_team = data.get('away_team')
+    
+    # Legacy format uses team1/team2
+    team1 = data.get('team1')
+    team2 = data.get('team2')
+    
+    # Prefer The Odds API format
+    if home_team and away_team:
+        team1 = home_team
+        team2 = away_team
+    
+    # Optional run options; validated here, defaults applied when the analysis runs
+    options = {key: data.get(key) for key in RUN_OPTIONS if data.get(key)}
+    resolve_run_options(options)
+    
+    return {
+        "team1": team1,
+        "team2": team2,
+        "match_id": data.get('id', None),
+        "sport_key": data.get('sport_key', None),
+        "commence_time": data.get('commence_time', None),
+        **options,
+    }
+
+
+def _parse_batch_item(item, defaults):
+    """
+    Parses one match of a batch request with the batch-wide run options
+    as defaults.
+    
+    Returns:
+        (match, None), (None, None) if the item is not an object, or
+        (None, error message) if its run options are invalid
+    """
+    if not isinstance(item, dict):
+        return None, None
+    try:
+        return _parse_match({**defaults, **item}), None
+    except ValueError as e:
+        return None, str(e)
+
+
+def _wants_timings(data, query):
+    """
+    True if the client asked for the timings block, via "timings": true in
+    the body or ?timings=1 in the URL.
+    """
+    flag = data.get('timings', query.get('timings'))
+    return flag is True or str(flag).lower() in ("1", "true", "yes")
+
+
+def _requested_fields(data, query):
+    """
+    Returns the payload fields the client asked for, via "fields" in the
+    body (list or comma-separated string) or ?fields=... in the URL, or
+    None for the full payload.
+    
+    Example: ?fields=score_prediction,team1_stats,team2_stats
+    
+    Raises:
+        ValueError: If a field is unknown
+    """
+    fields = data.get('fields', query.get('fields')) if isinstance(data, dict) else query.get('fields')
+    if not fields:
+        return None
+    if isinstance(fields, str):
+        fields = fields.split(',')
+    
+    selected = set()
+    for field in (str(field).strip() for field in fields):
+        name = field[len("analysis."):] if field.startswith("analysis.") else field
+        if name in ANALYSIS_FIELDS:
+            selected.add(f"analysis.{name}")
+        elif field in RESPONSE_FIELDS:
+            selected.add(field)
+        elif field:
+            raise ValueError(f"Unknown field: {field}")
+    return frozenset(selected) or None
+
+
+def _select_fields(payload, fields):
+    """Trims a payload to the selected fields ("success" is always kept)."""
+    if fields is None:
+        return payload
+    selected = {key: value for key, value in payload.items() if key in fields or key == "success"}
+    analysis_fields = [field[len("analysis."):] for field in fields if field.startswith("analysis.")]
+    if analysis_fields and "analysis" not in fields:
+        analysis = payload.get("analysis") or {}
+        selected["analysis"] = {name: analysis[name] for name in ANALYSIS_FIELDS if name in analysis_fields}
+    return selected
+
+
+def _stored_etag(analysis, fields):
+    """ETag of a stored analysis in a field selection (stored analyses never change)."""
+    selection = ",".join(sorted(fields)) if fields else "*"
+    digest = hashlib.sha256(f"{analysis.pk}:{analysis.created_at.isoformat()}:{selection}".encode()).hexdigest()
+    return quote_etag(digest[:32])
+
+
+def _etag_matches(etag, if_none_match):
+    """Weak comparison of an ETag with an If-None-Match header."""
+    if not if_none_match:
+        return False
+    tags = parse_etags(if_none_match)
+    return "*" in tags or etag.removeprefix("W/") in (tag.removeprefix("W/") for tag in tags)
+
+
+def _span_attributes(match):
+    """Attributes of a request's root span."""
+    return {
+        "team1": match["team1"],
+        "team2": match["team2"],
+        "match_id": match["match_id"],
+        **run_options(match),
+    }
+
+
+def _result_attributes(result):
+    """Attributes describing a finished analysis, for the request's root span."""
+    timings = result.get("timings") or {}
+    route = result.get("aggregator_route") or {}
+    return {
+        "analysis_cache": timings.get("analysis_cache"),
+        "total_ms": timings.get("total_ms"),
+        "parser_path": result.get("parser_path"),
+        "aggregator_tier": route.get("tier"),
+    }
+
+
+def _build_response(match, result, include_timings=False):
+    """
+    Formats a finished graph state as the analysis response for the Next.js frontend.
+    
+    With include_timings, the per-node timings of the request are added
+    under "timings".
+    """
+    response = {
+        "team1": match["team1"],
+        "team2": match["team2"],
+        "match_id": match["match_id"],  # NEW: The Odds API match ID
+        "commence_time": match["commence_time"],  # NEW: Match start time
+        "sport_key": match["sport_key"],  # NEW: Sport identifier
+        "analysis": {
+            "goals_prediction": result.get("goals_analysis", ""),
+            "winner_prediction": result.get("winner_analysis", ""),
+            "score_prediction": result.get("score_analysis", ""),
+            "final_analysis": result.get("final_analysis", ""),
+            "research_data": result.get("research_data", "")
+        },
+        # NEW: Include structured data for frontend visualization
+        "team1_stats": result.get("team1_stats", {"error": "Няма достатъчно информация"}),
+        "team2_stats": result.get("team2_stats", {"error": "Няма достатъчно информация"}),
+        "head_to_head": result.get("head_to_head", {"error": "Няма достатъчно информация"}),
+        "parser_path": result.get("parser_path"),  # "rules" (fast path) or "llm"
+        "aggregator_route": result.get("aggregator_route"),  # Aggregator tier used and why
+        "success": True
+    }
+    if include_timings:
+        response["timings"] = result.get("timings")
+    return response
+
 
 @api_view(['POST'])
 def analyze_teams(request):
@@ -10,6 +212,9 @@ def analyze_teams(request):
     This view receives match data from The Odds API, triggers the LangGraph agent,
     and returns the complete AI analysis with structured data.
     
+    Completed analyses are cached by match id (or team pair and kickoff time),
+    and identical concurrent requests share a single graph run.
+    
     Expected POST body (from The Odds API):
     {
         "id": "abc123...",
@@ -25,6 +230,18 @@ def analyze_teams(request):
         "team2": "Barcelona"
     }
     
+    Optional run options:
+    - "analyzer_mode": "separate" (three analyzer calls) or "combined"
+      (one call for all three predictions); default ANALYZER_MODE
+    - "aggregator_tier": "auto" (routed by agreement and priority),
+      "template", "fast" or "thinking"; default AGGREGATOR_TIER
+    - "priority": "low", "normal" (default) or "high" (never the
+      template tier; send aggregator_tier "thinking" for the thinking model)
+    
+    Optional "fields" (or ?fields=...): the payload fields to return, e.g.
+    "score_prediction,team1_stats,team2_stats"; analysis fields can be named
+    on their own or as "analysis.<name>". "success" is always returned.
+    
     Returns:
     {
         "team1": "Real Madrid",
@@ -40,75 +257,37 @@ def analyze_teams(request):
         },
         "team1_stats": {...},
         "team2_stats": {...},
-        "head_to_head": {...}
+        "head_to_head": {...},
+        "parser_path": "rules" | "llm",
+        "aggregator_route": {"tier": "fast", "model": "...", "reason": "agreement", "agreement": {...}},
+        "timings": {...}  // only with "timings": true or ?timings=1
     }
+    
+    The timings block has total_ms, analysis_cache ("miss", "hit" or
+    "shared") and, per graph node, wall_ms, upstream_calls, input_tokens,
+    output_tokens, cache_hits and cache_misses.
     """
     try:
-        # Accept The Odds API format (preferred) or legacy format
-        match_id = request.data.get('id', None)
-        sport_key = request.data.get('sport_key', None)
-        commence_time = request.data.get('commence_time', None)
-        
-        # The Odds API uses home_team/away_team
-        home_team = request.data.get('home_team')
-        away_team = request.data.get('away_team')
-        
-        # Legacy format uses team1/team2
-        team1 = request.data.get('team1')
-        team2 = request.data.get('team2')
-        
-        # Prefer The Odds API format
-        if home_team and away_team:
-            team1 = home_team
-            team2 = away_team
+        match = _parse_match(request.data)
+        fields = _requested_fields(request.data, request.query_params)
         
         # Validate input
-        if not team1 or not team2:
+        if not match["team1"] or not match["team2"]:
             return Response({
-                "error": "Both teams are required (home_team/away_team or team1/team2)"
+                "error": TEAMS_REQUIRED_ERROR
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Prepare initial state for the graph
-        initial_state: GraphState = {
-            "team1": team1,
-            "team2": team2,
-            "research_data": "",
-            "team1_stats": None,  # NEW: Will be populated by parser
-            "team2_stats": None,  # NEW: Will be populated by parser
-            "head_to_head": None,  # NEW: Will be populated by parser
-            "goals_analysis": "",
-            "winner_analysis": "",
-            "score_analysis": "",
-            "final_analysis": "",
-            "messages": []
-        }
-        
-        # Run the LangGraph workflow
+        # Run the LangGraph workflow (or reuse a cached / in-flight run)
         # This will execute: gather_data -> parse_data -> analyzers -> aggregate
-        result = analysis_graph.invoke(initial_state)
-        
-        # Format the response for the Next.js frontend
-        response_data = {
-            "team1": team1,
-            "team2": team2,
-            "match_id": match_id,  # NEW: The Odds API match ID
-            "commence_time": commence_time,  # NEW: Match start time
-            "sport_key": sport_key,  # NEW: Sport identifier
-            "analysis": {
-                "goals_prediction": result.get("goals_analysis", ""),
-                "winner_prediction": result.get("winner_analysis", ""),
-                "score_prediction": result.get("score_analysis", ""),
-                "final_analysis": result.get("final_analysis", ""),
-                "research_data": result.get("research_data", "")
-            },
-            # NEW: Include structured data for frontend visualization
-            "team1_stats": result.get("team1_stats", {"error": "Няма достатъчно информация"}),
-            "team2_stats": result.get("team2_stats", {"error": "Няма достатъчно информация"}),
-            "head_to_head": result.get("head_to_head", {"error": "Няма достатъчно информация"}),
-            "success": True
-        }
+        with span("analyze_teams", **_span_attributes(match)) as root:
+            result = run_analysis(
+                match["team1"], match["team2"], match["match_id"], match["commence_time"], **run_options(match)
+            )
+            root.set_attributes(**_result_attributes(result))
+            store_result(match, result)
         
-        return Response(response_data, status=status.HTTP_200_OK)
+        include_timings = _wants_timings(request.data, request.query_params) or bool(fields and "timings" in fields)
+        return Response(_select_fields(_build_response(match, result, include_timings), fields), status=status.HTTP_200_OK)
         
     except ValueError as e:
         # Handle validation errors
@@ -128,3 +307,389 @@ def analyze_teams(request):
             "error": f"An error occurred during analysis: {str(e)}",
             "success": False
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['POST'])
+def analyze_batch(request):
+    """
+    Analyzes a whole fixture list from The Odds API in one request.
+    
+    Expected POST body: either a JSON array of The Odds API match objects
+    (same fields as analyze_teams) or
+    {
+        "matches": [ {...}, {...} ],
+        "max_concurrency": 4,  # optional, capped by BATCH_MAX_CONCURRENCY
+        "analyzer_mode": "combined",  # optional run options, for matches that do not set their own
+        "fields": "score_prediction,team1_stats"  # optional, as in analyze_teams (or ?fields=...)
+    }
+    
+    Matches run with bounded concurrency and share duplicate work (identical
+    fixtures, per-team form searches). One failing match does not abort the batch.
+    
+    Returns:
+    {
+        "results": [
+            { ...same payload as analyze_teams... },
+            {"match_id": "...", "team1": "...", "team2": "...", "error": "...", "success": false}
+        ],
+        "total": 2,
+        "succeeded": 1,
+        "failed": 1,
+        "success": true
+    }
+    """
+    try:
+        data = request.data
+        fields = _requested_fields(data, request.query_params)
+        max_concurrency = BATCH_MAX_CONCURRENCY
+        defaults = {}
+        if isinstance(data, dict):
+            max_concurrency = int(data.get('max_concurrency', BATCH_MAX_CONCURRENCY))
+            defaults = {key: data[key] for key in RUN_OPTIONS if data.get(key)}
+            resolve_run_options(defaults)  # Invalid batch-wide options reject the whole request
+            data = data.get('matches')
+        
+        if not isinstance(data, list) or not data:
+            return Response({
+                "error": "A non-empty list of matches is required",
+                "success": False
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        if len(data) > BATCH_MAX_MATCHES:
+            return Response({
+                "error": f"At most {BATCH_MAX_MATCHES} matches per batch",
+                "success": False
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        matches, errors = [], []
+        for item in data:
+            match, error = _parse_batch_item(item, defaults)
+            matches.append(match)
+            errors.append(error)
+        valid = [match for match in matches if match and match["team1"] and match["team2"]]
+        with span("analyze_batch", matches=len(matches), valid=len(valid), max_concurrency=max_concurrency):
+            outcomes = iter(run_batch(valid, max_concurrency))
+        
+        results = []
+        for item, match, error in zip(data, matches, errors):
+            if error:
+                # One match with invalid options does not abort the batch
+                results.append({
+                    "match_id": item.get('id'),
+                    "error": f"Invalid input: {error}",
+                    "success": False
+                })
+                continue
+            if not match or not match["team1"] or not match["team2"]:
+                results.append({
+                    "match_id": match["match_id"] if match else None,
+                    "error": TEAMS_REQUIRED_ERROR,
+                    "success": False
+                })
+                continue
+            
+            outcome = next(outcomes)
+            if "error" in outcome:
+                results.append({
+                    "match_id": match["match_id"],
+                    "team1": match["team1"],
+                    "team2": match["team2"],
+                    "error": f"An error occurred during analysis: {outcome['error']}",
+                    "success": False
+                })
+            else:
+                store_result(match, outcome["result"])
+                results.append(_select_fields(_build_response(match, outcome["result"]), fields))
+        
+        succeeded = sum(1 for result in results if result["success"])
+        return Response({
+            "results": results,
+            "total": len(results),
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+            "success": True
+        }, status=status.HTTP_200_OK)
+        
+    except ValueError as e:
+        # Handle validation errors (e.g. non-numeric max_concurrency)
+        return Response({
+            "error": f"Invalid input: {str(e)}",
+            "success": False
+        }, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        # Handle any unexpected errors
+        return Response({
+            "error": f"An error occurred during batch analysis: {str(e)}",
+            "success": False
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['POST'])
+def submit_analysis_job(request):
+    """
+    Enqueues an analysis and returns immediately with a job id.
+    
+    Accepts the same body as analyze_teams. The job is run by the
+    run_analysis_workers management command; poll analysis_job_status
+    for the result.
+    
+    Returns (202 Accepted):
+    {
+        "job_id": "6f1c...",
+        "status": "queued",
+        "status_url": "/api/analyze/jobs/6f1c.../",
+        "success": true
+    }
+    """
+    try:
+        match = _parse_match(request.data)
+    except ValueError as e:
+        return Response({
+            "error": f"Invalid input: {str(e)}",
+            "success": False
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    # Validate input
+    if not match["team1"] or not match["team2"]:
+        return Response({
+            "error": TEAMS_REQUIRED_ERROR
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    job = submit_job(match)
+    return Response({
+        "job_id": str(job.pk),
+        "status": job.status,
+        "status_url": reverse('analysis_job_status', args=[job.pk]),
+        "success": True
+    }, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+def analysis_job_status(request, job_id):
+    """
+    Returns the status of a background analysis job.
+    
+    Returns:
+    {
+        "job_id": "6f1c...",
+        "status": "queued" | "running" | "done" | "failed",
+        "attempts": 1,
+        "created_at": "...",
+        "started_at": "...",
+        "finished_at": "...",
+        "result": { ...same payload as analyze_teams... },  # only when done
+        "error": "..."                                       # only when failed
+    }
+    
+    ?fields=... trims the result as in analyze_teams.
+    """
+    try:
+        fields = _requested_fields({}, request.query_params)
+    except ValueError as e:
+        return Response({
+            "error": f"Invalid input: {str(e)}",
+            "success": False
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        job = AnalysisJob.objects.get(pk=job_id)
+    except AnalysisJob.DoesNotExist:
+        return Response({
+            "error": "Job not found",
+            "success": False
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    response_data = {
+        "job_id": str(job.pk),
+        "status": job.status,
+        "attempts": job.attempts,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+    if job.status == AnalysisJob.STATUS_DONE:
+        response_data["result"] = _select_fields(_build_response(job.match, job.result), fields)
+    elif job.status == AnalysisJob.STATUS_FAILED:
+        response_data["error"] = f"An error occurred during analysis: {job.error}"
+    
+    return Response(response_data, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+def stored_analysis(request, match_id=None):
+    """
+    Returns the newest stored analysis of a match without running the graph.
+    
+    GET /api/analyses/<match_id>/                  (The Odds API match id)
+    GET /api/analyses/?home_team=...&away_team=...  (optional: commence_time)
+    
+    Returns the same payload as analyze_teams plus "stored_at" (trimmed by
+    ?fields=...), or 404 if the match has not been analyzed yet.
+    
+    Responses carry an ETag; a client polling a match sends it back in
+    If-None-Match and gets 304 Not Modified until a newer analysis is stored.
+    """
+    try:
+        fields = _requested_fields({}, request.query_params)
+    except ValueError as e:
+        return Response({
+            "error": f"Invalid input: {str(e)}",
+            "success": False
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    if match_id is None:
+        query = request.query_params
+        team1 = query.get('home_team') or query.get('team1')
+        team2 = query.get('away_team') or query.get('team2')
+        if not team1 or not team2:
+            return Response({
+                "error": TEAMS_REQUIRED_ERROR,
+                "success": False
+            }, status=status.HTTP_400_BAD_REQUEST)
+        analysis = latest_analysis(team1=team1, team2=team2, commence_time=query.get('commence_time'))
+    else:
+        analysis = latest_analysis(match_id=match_id)
+    
+    if analysis is None:
+        return Response({
+            "error": "No stored analysis for this match",
+            "success": False
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    etag = _stored_etag(analysis, fields)
+    if _etag_matches(etag, request.headers.get('If-None-Match')):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response_data = _build_response(stored_match(analysis), analysis.result)
+        response_data["stored_at"] = analysis.created_at
+        response = Response(_select_fields(response_data, fields), status=status.HTTP_200_OK)
+    response["ETag"] = etag
+    response["Cache-Control"] = "no-cache"  # Revalidate on every poll
+    return response
+
+
+@csrf_exempt
+@require_POST
+async def analyze_teams_async(request):
+    """
+    Async variant of analyze_teams for ASGI deployments.
+    
+    Accepts the same JSON body and returns the same payload, but runs the
+    graph with analysis_graph.ainvoke() so the worker is free while the
+    analysis waits on Tavily and Gemini. Serve it through
+    tipster_project/asgi.py (e.g. `uvicorn tipster_project.asgi:application`).
+    """
+    try:
+        data = json.loads(request.body or b"{}")
+        if not isinstance(data, dict):
+            raise ValueError("Request body must be a JSON object")
+        
+        match = _parse_match(data)
+        fields = _requested_fields(data, request.GET)
+        
+        # Validate input
+        if not match["team1"] or not match["team2"]:
+            return JsonResponse({
+                "error": TEAMS_REQUIRED_ERROR
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        with span("analyze_teams_async", **_span_attributes(match)) as root:
+            result = await arun_analysis(
+                match["team1"], match["team2"], match["match_id"], match["commence_time"], **run_options(match)
+            )
+            root.set_attributes(**_result_attributes(result))
+            await sync_to_async(store_result)(match, result)
+        
+        include_timings = _wants_timings(data, request.GET) or bool(fields and "timings" in fields)
+        return JsonResponse(_select_fields(_build_response(match, result, include_timings), fields), status=status.HTTP_200_OK)
+        
+    except ValueError as e:
+        # Handle validation errors (including malformed JSON)
+        return JsonResponse({
+            "error": f"Invalid input: {str(e)}",
+            "success": False
+        }, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        # Handle any unexpected errors
+        return JsonResponse({
+            "error": f"An error occurred during analysis: {str(e)}",
+            "success": False
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def _sse_event(event, payload):
+    """Formats one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+@csrf_exempt
+@require_POST
+async def analyze_teams_stream(request):
+    """
+    Streams the analysis as Server-Sent Events while the graph runs.
+    
+    Accepts the same JSON body as analyze_teams. Events are sent as soon
+    as each node completes:
+    
+    - research_data: raw Tavily research
+    - team1_stats / team2_stats / head_to_head: parsed structured data
+    - goals_prediction / winner_prediction / score_prediction: analyzer results
+    - token: aggregator output while it is being generated ({"node", "text"})
+    - final_analysis: the complete aggregated analysis
+    - complete: the same payload analyze_teams returns (trimmed by "fields")
+    - error: {"error": "...", "success": false} if the run fails
+    
+    Serve through tipster_project/asgi.py so a stream does not hold a worker thread.
+    """
+    try:
+        data = json.loads(request.body or b"{}")
+        if not isinstance(data, dict):
+            raise ValueError("Request body must be a JSON object")
+        match = _parse_match(data)
+        fields = _requested_fields(data, request.GET)
+    except ValueError as e:
+        return JsonResponse({
+            "error": f"Invalid input: {str(e)}",
+            "success": False
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    # Validate input
+    if not match["team1"] or not match["team2"]:
+        return JsonResponse({
+            "error": TEAMS_REQUIRED_ERROR
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    async def event_stream():
+        try:
+            with span("analyze_teams_stream", **_span_attributes(match)) as root:
+                async for event, payload in astream_analysis(
+                    match["team1"], match["team2"], match["match_id"], match["commence_time"], **run_options(match)
+                ):
+                    if event == "complete":
+                        root.set_attributes(**_result_attributes(payload))
+                        await sync_to_async(store_result)(match, payload)
+                        payload = _select_fields(_build_response(match, payload), fields)
+                    yield _sse_event(event, payload)
+        except Exception as e:
+            yield _sse_event("error", {
+                "error": f"An error occurred during analysis: {str(e)}",
+                "success": False
+            })
+    
+    response = StreamingHttpResponse(event_stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # Disable proxy buffering (nginx)
+    return response
+
+
+@require_GET
+def metrics(request):
+    """
+    Prometheus scrape endpoint.
+    
+    Exposes per-node and per-upstream latency histograms, error counters,
+    in-flight gauges and cache hit ratios. The values are shared by all
+    worker processes on the host (see api/agent/metrics.py), so any worker
+    can be scraped.
+    """
+    return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -3,6 +3,11 @@ ASGI config for tipster_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with an ASGI server to use the async analysis endpoint
+(/api/analyze/async/), e.g.:
+
+    uvicorn tipster_project.asgi:application --workers 4
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -48,6 +48,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.CompressionMiddleware',  # Compresses the finished body, so it runs last on the way out
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # CORS must be before CommonMiddleware
     'django.middleware.common.CommonMiddleware',
@@ -84,6 +85,8 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Web processes and analysis workers share this file; wait for locks instead of failing
+        'OPTIONS': {'timeout': 20},
     }
 }
 
@@ -159,4 +162,10 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'if-none-match',  # Conditional GET of stored analyses
+]
+
+# Let the frontend read the ETag of stored analyses
+CORS_EXPOSE_HEADERS = [
+    'etag',
 ]